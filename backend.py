@@ -1,19 +1,43 @@
 import os
 import json
+import time
+import logging
 import pandas as pd
 import yfinance as yf
-from typing import List
+from typing import Iterator, List, Optional
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlmodel import Session, select
 
-from db import engine, create_db_and_tables
-from models import StockDailyPrice, StockTranscript, StockTranscriptSummary
+from db import engine, create_db_and_tables, bulk_upsert
+from models import StockDailyPrice, StockTranscript, StockTranscriptSummary, IngestionJob
 
 load_dotenv()
 
+from prices import download_history, to_stock_daily_prices, sync_history, sync_batch, period_start
+from universe import get_ticker_index
 from transcript import TICKER_MAPPING, get_transcript_path, load_transcript, preprocess_transcript
-from transcript import extract_summary, extract_revenue_profit_highlights, extract_management_commentary, extract_guidance_outlook, extract_qna_key_points
+from transcript import SUMMARY_SECTIONS
+from summary import SUMMARY_MODE, SUMMARY_MODES, run_summary
+from llm_cache import get_cache_stats, track_usage
+from jobs import enqueue_job, get_job, list_jobs, start_ingestion_workers, stop_ingestion_workers
+from indicators import INDICATOR_NAMES, IndicatorParams, get_indicators
+from screener import screen
+from charts import RESOLUTION_AUTO, get_chart_series
+from transcript_search import SEARCH_MODES, create_transcript_search_index, search_transcripts
+from transcript_qa import ASK_TOP_K, ask, index_transcript, stored_quarters
+from transcript_metrics import METRIC_KINDS, compare_metrics, extract_metrics, read_metrics, save_metrics
+from formats import negotiate_format, price_history_response
+from metrics import PROFILE_HEADER, REQUEST_LATENCY, instrument_engine, profile_request, render_metrics, server_timing, timed
+from backtest import BacktestRequest, run_backtest, shutdown_pool
+from pdf_extract import shutdown_pool as shutdown_pdf_pool
+from executors import BACKTEST_EXECUTOR, LLM_EXECUTOR, MARKET_DATA_EXECUTOR, PDF_EXECUTOR, Overloaded, shutdown_executors
+
+logger = logging.getLogger(__name__)
+
+instrument_engine(engine)
 
 app = FastAPI()
 
@@ -21,6 +45,43 @@ app = FastAPI()
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()
+    create_transcript_search_index(engine)
+    get_ticker_index()
+    start_ingestion_workers(_ingest_transcript)
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_ingestion_workers()
+    shutdown_executors()
+    shutdown_pool()
+    shutdown_pdf_pool()
+
+
+@app.exception_handler(Overloaded)
+def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # Latency per route template; with an X-Profile header the span totals come back as Server-Timing
+    started_at = time.perf_counter()
+    with profile_request(enabled=PROFILE_HEADER.lower() in request.headers) as spans:
+        response = await call_next(request)
+    elapsed = time.perf_counter() - started_at
+
+    route = request.scope.get("route")
+    REQUEST_LATENCY.labels(request.method, route.path if route is not None else "unmatched", str(response.status_code)).observe(elapsed)
+    if spans is not None:
+        response.headers["Server-Timing"] = server_timing(spans, elapsed)
+    return response
+
+
+@app.get("/metrics")
+def get_metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 
 @app.get("/")
@@ -34,13 +95,10 @@ def _parse_df(df: pd.DataFrame) -> List[dict]:
     return parsed
 
 
-@app.get("/search/yfin")
-def search_yfin(
-    query: str = Query("HDFC", description="Search query for stock ticker"),
-    limit: int = Query(25, ge=1, le=250, description="Maximum number of results"),
-):
-    yf_lookup = yf.Lookup(query)
-    stocks_df = yf_lookup.get_stock(count=limit).reset_index()
+def _search_yfin(query: str, limit: int) -> dict:
+    with timed("yfinance", "lookup"):
+        yf_lookup = yf.Lookup(query)
+        stocks_df = yf_lookup.get_stock(count=limit).reset_index()
     parsed = _parse_df(stocks_df)
     
     return {
@@ -50,63 +108,164 @@ def search_yfin(
     }
 
 
-def get_nifty_500_stocks():
-    df = pd.read_csv("MW-NIFTY-500-27-Aug-2025.csv")
-    stock_list = df.iloc[1:]['SYMBOL \n'].values.tolist()
-    return stock_list
+@app.get("/search/yfin")
+async def search_yfin(
+    query: str = Query("HDFC", description="Search query for stock ticker"),
+    limit: int = Query(25, ge=1, le=250, description="Maximum number of results"),
+):
+    return await MARKET_DATA_EXECUTOR.run(_search_yfin, query, limit)
 
 
 @app.get("/search", response_model=list[str])
 def search(
     query: str = Query("HDFC", description="Search query for stock ticker in NIFTY 500 NSE"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of results"),
 ):
-    stock_list = get_nifty_500_stocks()
-    filtered_stock_list = [f"{s}.NS" for s in stock_list if query.lower() in s.lower()]
-    return filtered_stock_list
+    stock_list = get_ticker_index().search(query, limit=limit)
+    return [f"{s}.NS" for s in stock_list]
+
+
+def _get_history(ticker: str, period: str, interval: str) -> list[StockDailyPrice]:
+    try:
+        if interval != "1d":
+            # Only daily bars are stored, other intervals are passed through from upstream
+            history_df = download_history(ticker, interval=interval, period=period)
+            return to_stock_daily_prices(ticker, history_df)
+
+        with Session(engine) as session:
+            sdp_list = sync_history(session, ticker, period)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:  # noqa: BLE001
+        raise HTTPException(status_code=502, detail=f"Failed to fetch data from upstream: {exc}")
+
+    return sdp_list
 
 
 @app.get("/fetch", response_model=list[StockDailyPrice])
-def get_history(
+async def get_history(
+    request: Request,
+    response: Response,
     ticker: str = Query("HDFCBANK.NS", description="Stock ticker"),
     period: str = Query("3y", description="yfinance period (e.g., 3y)"),
     interval: str = Query("1d", description="yfinance interval (e.g., 1d, 1wk)"),
+    format: Optional[str] = Query(None, description="Response format: json (default), columns or arrow. Overrides the Accept header"),
 ):
     ticker = ticker.strip().upper()
+    negotiate_format(request, format)
+    sdp_list = await MARKET_DATA_EXECUTOR.run(_get_history, ticker, period, interval)
+    return price_history_response(request, response, ticker, sdp_list, format)
+
 
+def _get_chart(ticker: str, period: str, resolution: str, points: int) -> dict:
+    sdp_list = _get_history(ticker, period, "1d")
     try:
-        df = yf.download(ticker, period=period, interval=interval, progress=False, auto_adjust=False, threads=True)
-    except Exception as exc:  # noqa: BLE001
-        raise HTTPException(status_code=502, detail=f"Failed to fetch data from upstream: {exc}")
+        return get_chart_series(ticker, period, resolution, points, sdp_list)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
-    history_df = df.reset_index()
-    history_df.columns = [col[0] for col in history_df.columns]
+
+@app.get("/chart")
+async def get_chart(
+    ticker: str = Query("HDFCBANK.NS", description="Stock ticker"),
+    period: str = Query("3y", description="yfinance period (e.g., 3y)"),
+    resolution: str = Query(RESOLUTION_AUTO, description="Bar resolution: 1d, 1wk, 1mo or auto to fit the number of points"),
+    points: int = Query(1000, ge=10, le=10000, description="Maximum number of points in the close line"),
+):
+    ticker = ticker.strip().upper()
+    return await MARKET_DATA_EXECUTOR.run(_get_chart, ticker, period, resolution, points)
 
 
+def _sync_batch_lines(tickers: list[str], period: str, chunk_size: int) -> Iterator[str]:
     with Session(engine) as session:
-        sdp_list = [
-            StockDailyPrice(
-                ticker=ticker,
-                date=row["Date"],
-                adj_close=row["Adj Close"],
-                close=row["Close"],
-                high=row["High"],
-                low=row["Low"],
-                open=row["Open"],
-                volume=row["Volume"]
-            )
-            for _, row in history_df.iterrows()
-        ]
-
-        existing_sdp_list = session.exec(select(StockDailyPrice).where(StockDailyPrice.ticker == ticker)).all()
-        existing_date_list = [pd.to_datetime(sdp.date) for sdp in existing_sdp_list]
-
-        new_sdp_list = [sdp for sdp in sdp_list if pd.to_datetime(sdp.date) not in existing_date_list]
-        session.add_all(new_sdp_list)
-        session.commit()
-
-        [session.refresh(sdp) for sdp in new_sdp_list]
+        for result in sync_batch(session, tickers, period=period, chunk_size=chunk_size):
+            yield json.dumps(result) + "\n"
 
-    return sdp_list
+
+@app.get("/fetch/batch")
+async def get_history_batch(
+    tickers: list[str] = Query(..., description="Stock tickers, repeat the parameter for each ticker"),
+    period: str = Query("3y", description="yfinance period (e.g., 3y)"),
+    chunk_size: int = Query(50, ge=1, le=200, description="Tickers per upstream download"),
+):
+    try:
+        period_start(period)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    lines = MARKET_DATA_EXECUTOR.stream(_sync_batch_lines, tickers, period, chunk_size)
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+def _get_indicators(tickers: list[str], params: IndicatorParams, names: Optional[list[str]], last: Optional[int]) -> list[dict]:
+    result_list = []
+    with Session(engine) as session:
+        for ticker in tickers:
+            result = get_indicators(session, ticker, params, names=names, last=last)
+            result_list.append(result or {"ticker": ticker, "count": 0, "detail": "No stored prices, call /fetch first"})
+    return result_list
+
+
+@app.get("/indicators")
+async def get_indicators_endpoint(
+    tickers: list[str] = Query(["HDFCBANK.NS"], description="Stock tickers, repeat the parameter for each ticker"),
+    indicators: Optional[list[str]] = Query(None, description=f"Subset of {', '.join(INDICATOR_NAMES)}"),
+    last: Optional[int] = Query(None, ge=1, description="Only return the last N rows"),
+    sma: int = Query(20, ge=2, le=500, description="SMA window"),
+    ema: int = Query(20, ge=2, le=500, description="EMA span"),
+    rsi: int = Query(14, ge=2, le=500, description="RSI window"),
+    macd_fast: int = Query(12, ge=2, le=500, description="MACD fast EMA span"),
+    macd_slow: int = Query(26, ge=2, le=500, description="MACD slow EMA span"),
+    macd_signal: int = Query(9, ge=2, le=500, description="MACD signal EMA span"),
+    bollinger: int = Query(20, ge=2, le=500, description="Bollinger band window"),
+    bollinger_k: float = Query(2.0, gt=0, description="Bollinger band width in standard deviations"),
+    atr: int = Query(14, ge=2, le=500, description="ATR window"),
+    vwap: int = Query(20, ge=2, le=500, description="Rolling VWAP window"),
+    volatility: int = Query(20, ge=2, le=500, description="Rolling volatility window"),
+):
+    unknown = sorted(set(indicators or []) - set(INDICATOR_NAMES))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown indicators {unknown}")
+
+    params = IndicatorParams(
+        sma=sma, ema=ema, rsi=rsi, macd_fast=macd_fast, macd_slow=macd_slow, macd_signal=macd_signal,
+        bollinger=bollinger, bollinger_k=bollinger_k, atr=atr, vwap=vwap, volatility=volatility,
+    )
+    tickers = list(dict.fromkeys(t.strip().upper() for t in tickers))
+    return await run_in_threadpool(_get_indicators, tickers, params, indicators, last)
+
+
+def _screen(expression: Optional[str], sort: str, ascending: bool, limit: int, columns: Optional[list[str]], refresh: bool) -> dict:
+    with Session(engine) as session:
+        try:
+            return screen(session, expression, sort=sort, ascending=ascending, limit=limit, columns=columns, refresh=refresh)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.get("/screener")
+async def get_screener(
+    filter: Optional[str] = Query(None, description="Filter expression, e.g. ret_5 > 0.05 and vol_ratio_5_20 > 1"),
+    sort: str = Query("ret_5", description="Metric or expression to rank by"),
+    ascending: bool = Query(False, description="Rank in ascending order"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of results"),
+    columns: Optional[list[str]] = Query(None, description="Extra metrics to include, e.g. avg_volume_20"),
+    refresh: bool = Query(False, description="Refresh the price matrix from the database first"),
+):
+    return await run_in_threadpool(_screen, filter, sort, ascending, limit, columns, refresh)
+
+
+def _run_backtest(request: BacktestRequest) -> dict:
+    with Session(engine) as session:
+        try:
+            return run_backtest(session, request)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.post("/backtest")
+async def post_backtest(request: BacktestRequest):
+    return await BACKTEST_EXECUTOR.run(_run_backtest, request)
 
 
 @app.get("/transcript/all", response_model=list[str])
@@ -121,76 +280,319 @@ def get_transcript_list(
     return quarters
 
 
+def _search_transcripts(query: str, mode: str, ticker: Optional[str], quarter: Optional[str], speaker_type: Optional[str], limit: int, offset: int) -> list[dict]:
+    with Session(engine) as session:
+        try:
+            return search_transcripts(session, query, mode, ticker, quarter, speaker_type, limit, offset)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.get("/transcript/search")
+async def search_transcript(
+    query: str = Query(..., description="Words to search for, e.g. NIM guidance"),
+    mode: str = Query("all", description=f"Match {', '.join(SEARCH_MODES)} of the words"),
+    ticker: Optional[str] = Query(None, description="Stock ticker"),
+    quarter: Optional[str] = Query(None, description="Quarter (e.g., 2025Q1)"),
+    speaker_type: Optional[str] = Query(None, description="Management, Question or Moderator"),
+    limit: int = Query(20, ge=1, le=200, description="Maximum number of results"),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+):
+    if ticker is not None:
+        ticker = ticker.strip().upper()
+    return await run_in_threadpool(_search_transcripts, query, mode, ticker, quarter, speaker_type, limit, offset)
+
+
+def _read_transcript(ticker: str, quarter: str) -> list[StockTranscript]:
+    with Session(engine) as session:
+        return session.exec(select(StockTranscript).where(StockTranscript.ticker == ticker, StockTranscript.quarter == quarter)).all()
+
+
+def _store_transcript(ticker: str, quarter: str, pages: list[str]) -> list[StockTranscript]:
+    transcript_df = preprocess_transcript(pages)
+    transcript_df = transcript_df.assign(ticker=ticker, quarter=quarter)
+    records = transcript_df[["ticker", "quarter", "transcript_index", "speaker", "speaker_type", "transcript"]].to_dict(orient="records")
+    with Session(engine) as session:
+        bulk_upsert(session, StockTranscript, records)
+    try:
+        index_transcript(ticker, quarter, records)
+    except Exception:
+        # /transcript/ask embeds the transcript on first use instead
+        logger.exception("Embedding %s %s failed", ticker, quarter)
+    return [StockTranscript(**record) for record in records]
+
+
+def _get_transcript(ticker: str, quarter: str) -> list[StockTranscript]:
+    # Blocking variant for background workers, parses the PDF on the calling thread
+    stock_transcript_list = _read_transcript(ticker, quarter)
+    if len(stock_transcript_list) == 0:
+        pages = load_transcript(get_transcript_path(ticker, quarter))
+        stock_transcript_list = _store_transcript(ticker, quarter, pages)
+    return stock_transcript_list
+
+
 @app.get("/transcript", response_model=list[StockTranscript])
-def get_transcript(
+async def get_transcript(
     ticker: str = Query("HDFCBANK.NS", description="Stock ticker"),
     quarter: str = Query("2025Q1", description="Quarter for which to fetch the call transcript summary")
 ):
     ticker = ticker.strip().upper()
 
-    with Session(engine) as session:
-        stock_transcript_list = session.exec(select(StockTranscript).where(StockTranscript.ticker == ticker, StockTranscript.quarter == quarter)).all()
-        
-        if len(stock_transcript_list) == 0:
-            filepath = get_transcript_path(ticker, quarter)
-            reader = load_transcript(filepath)
-            transcript_df = preprocess_transcript(reader)
-            stock_transcript_list = [
-                StockTranscript(
-                    ticker=ticker,
-                    quarter=quarter,
-                    transcript_index=row["transcript_index"],
-                    speaker=row["speaker"],
-                    speaker_type=row["speaker_type"],
-                    transcript=row["transcript"],
-                )
-                for _, row in transcript_df.iterrows()
-            ]
-
-            session.add_all(stock_transcript_list)
-            session.commit()
-
-            [session.refresh(st) for st in stock_transcript_list]
+    stock_transcript_list = await run_in_threadpool(_read_transcript, ticker, quarter)
+    if len(stock_transcript_list) == 0:
+        with timed("pdf", "load_transcript"):
+            pages = await PDF_EXECUTOR.run(load_transcript, get_transcript_path(ticker, quarter))
+        stock_transcript_list = await run_in_threadpool(_store_transcript, ticker, quarter, pages)
 
     return stock_transcript_list
 
 
-@app.get("/summary", response_model=StockTranscriptSummary)
-def get_summary(
+def _stored_quarters(ticker: str) -> list[str]:
+    with Session(engine) as session:
+        return stored_quarters(session, ticker)
+
+
+def _ask_transcript(ticker: str, quarters: list[str], question: str, k: int) -> tuple[dict, dict]:
+    with track_usage() as usage:
+        with Session(engine) as session:
+            try:
+                result = ask(session, ticker, quarters, question, k)
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=str(exc))
+            except LookupError as exc:
+                raise HTTPException(status_code=404, detail=str(exc))
+    usage_dict = usage.as_dict()
+    logger.info("Question on %s %s: %s", ticker, quarters, usage_dict)
+    return result, usage_dict
+
+
+@app.get("/transcript/ask")
+async def ask_transcript(
+    response: Response,
+    question: str = Query(..., description="Question about the earnings calls, e.g. How has NIM guidance changed?"),
     ticker: str = Query("HDFCBANK.NS", description="Stock ticker"),
-    quarter: str = Query("2025Q1", description="Quarter for which to fetch the call transcript summary")
+    quarters: Optional[list[str]] = Query(None, description="Quarters to search (e.g., 2025Q1), all stored quarters if omitted"),
+    k: int = Query(ASK_TOP_K, ge=1, le=50, description="Number of transcript segments given to the model"),
 ):
     ticker = ticker.strip().upper()
+    if quarters:
+        # Quarters asked for explicitly are parsed from the PDF if needed
+        for quarter in quarters:
+            if ticker in TICKER_MAPPING and os.path.exists(get_transcript_path(ticker, quarter)):
+                await get_transcript(ticker=ticker, quarter=quarter)
+    else:
+        quarters = await run_in_threadpool(_stored_quarters, ticker)
+
+    result, usage = await LLM_EXECUTOR.run(_ask_transcript, ticker, quarters, question, k)
+    response.headers.update(_usage_headers(usage))
+    return result
+
+
+def _read_metrics(pairs: list[tuple[str, str]]) -> dict[tuple[str, str], list[dict]]:
+    with Session(engine) as session:
+        return read_metrics(session, pairs)
+
+
+def _extract_transcript_metrics(transcripts: list[tuple[str, str, pd.DataFrame]]) -> tuple[dict, dict, dict]:
+    # Each quarter is saved as soon as it is extracted, a failed quarter is retried on the next request
+    extracted, errors = {}, {}
+    with track_usage() as usage:
+        for ticker, quarter, transcript_df in transcripts:
+            try:
+                metrics = extract_metrics(transcript_df)
+            except Exception as exc:
+                logger.exception("Metric extraction for %s %s failed", ticker, quarter)
+                errors[f"{ticker} {quarter}"] = str(exc) or type(exc).__name__
+                continue
+            with Session(engine) as session:
+                save_metrics(session, ticker, quarter, metrics)
+            extracted[(ticker, quarter)] = metrics
+    usage_dict = usage.as_dict()
+    logger.info("Metric extraction for %d quarters: %s", len(transcripts), usage_dict)
+    return extracted, errors, usage_dict
+
+
+@app.get("/transcript/compare")
+async def compare_transcripts(
+    response: Response,
+    tickers: list[str] = Query(["HDFCBANK.NS"], description="Stock tickers to compare"),
+    quarters: Optional[list[str]] = Query(None, description="Quarters to compare (e.g., 2025Q1), every available quarter if omitted"),
+    metrics: Optional[list[str]] = Query(None, description="Metric names to keep, e.g. net_interest_margin"),
+    kind: Optional[str] = Query(None, description="actual or guidance"),
+):
+    tickers = [ticker.strip().upper() for ticker in tickers]
+    if kind is not None and kind not in METRIC_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported kind {kind!r}, expected one of {METRIC_KINDS}")
+    pairs = [(ticker, quarter) for ticker in tickers for quarter in (quarters or sorted(get_transcript_list(ticker)))]
+    if not pairs:
+        raise HTTPException(status_code=404, detail=f"No transcripts available for {', '.join(tickers)}")
+
+    # Quarters extracted before are database reads, only new ones cost a model call
+    metrics_by_quarter = await run_in_threadpool(_read_metrics, pairs)
+    transcripts, errors = [], {}
+    for ticker, quarter in pairs:
+        if (ticker, quarter) in metrics_by_quarter:
+            continue
+        if ticker in TICKER_MAPPING and os.path.exists(get_transcript_path(ticker, quarter)):
+            stock_transcript_list = await get_transcript(ticker=ticker, quarter=quarter)
+        else:
+            stock_transcript_list = await run_in_threadpool(_read_transcript, ticker, quarter)
+        if not stock_transcript_list:
+            errors[f"{ticker} {quarter}"] = "No transcript found"
+            continue
+        transcripts.append((ticker, quarter, pd.DataFrame([st.model_dump() for st in stock_transcript_list])))
+
+    extracted = {}
+    if transcripts:
+        extracted, extract_errors, usage = await LLM_EXECUTOR.run(_extract_transcript_metrics, transcripts)
+        errors.update(extract_errors)
+        response.headers.update(_usage_headers(usage))
+        if extract_errors and not extracted and not metrics_by_quarter:
+            raise HTTPException(status_code=502, detail={"errors": errors, "usage": usage})
+        metrics_by_quarter.update(extracted)
+
+    return {
+        "tickers": tickers,
+        "quarters": sorted({quarter for _, quarter in metrics_by_quarter}),
+        "extracted": [f"{ticker} {quarter}" for ticker, quarter in extracted],
+        "errors": errors,
+        "rows": compare_metrics(metrics_by_quarter, [name.strip().lower() for name in metrics] if metrics else None, kind),
+    }
+
+
+@app.get("/cache/llm")
+def get_llm_cache_stats():
+    return get_cache_stats()
+
+
+def _read_summary(ticker: str, quarter: str) -> Optional[StockTranscriptSummary]:
+    with Session(engine) as session:
+        return session.exec(select(StockTranscriptSummary).where(StockTranscriptSummary.ticker == ticker, StockTranscriptSummary.quarter == quarter)).first()
+
 
+def _save_summary(ticker: str, quarter: str, section_dict: dict[str, str]) -> StockTranscriptSummary:
+    # Upserted, the ingestion worker and a /summary request can finish the same quarter at once
     with Session(engine) as session:
-        stock_transcript_summary = session.exec(select(StockTranscriptSummary).where(StockTranscriptSummary.ticker == ticker, StockTranscriptSummary.quarter == quarter)).first()
-        
-        if not stock_transcript_summary:
-            stock_transcript_list = get_transcript(ticker, quarter)
-            transcript_df = pd.DataFrame([st.model_dump() for st in stock_transcript_list])
-            print(transcript_df)
-
-            summary = extract_summary(transcript_df)
-            revenue_profit_highlight_dict = extract_revenue_profit_highlights(transcript_df)
-            management_commentary = extract_management_commentary(transcript_df)
-            guidance_outlook_summary_dict = extract_guidance_outlook(transcript_df)
-            qna_key_points = extract_qna_key_points(transcript_df)
-
-            stock_transcript_summary = StockTranscriptSummary(
-                ticker=ticker,
-                quarter=quarter,
-                summary=summary,
-                revenue_profit_highlight_management=revenue_profit_highlight_dict['management'],
-                revenue_profit_highlight_qna=revenue_profit_highlight_dict['qna'],
-                management_commentary=management_commentary,
-                guidance_outlook_summary_management=guidance_outlook_summary_dict['management'],
-                guidance_outlook_summary_qna=guidance_outlook_summary_dict['qna'],
-                qna_key_points=qna_key_points
-            )
-
-            session.add(stock_transcript_summary)
-            session.commit()
-            
-            session.refresh(stock_transcript_summary)
+        bulk_upsert(session, StockTranscriptSummary, [{"ticker": ticker, "quarter": quarter, **section_dict}], update=True)
+        return session.get(StockTranscriptSummary, (ticker, quarter))
+
+
+def _usage_headers(usage: dict) -> dict[str, str]:
+    return {
+        "X-LLM-Calls": str(usage["calls"]),
+        "X-LLM-Cached-Calls": str(usage["cached_calls"]),
+        "X-LLM-Prompt-Tokens": str(usage["prompt_tokens"]),
+        "X-LLM-Output-Tokens": str(usage["output_tokens"]),
+        "X-LLM-Latency": f"{usage['elapsed_seconds']:.3f}",
+    }
+
+
+def _generate_summary(ticker: str, quarter: str, transcript_df: pd.DataFrame, mode: str = SUMMARY_MODE) -> tuple[StockTranscriptSummary, dict]:
+    section_dict = {}
+    error_dict = {}
+    with track_usage() as usage:
+        for result in run_summary(transcript_df, mode):
+            if result.error is None:
+                section_dict[result.section] = result.text
+            else:
+                error_dict[result.section] = result.error
+    usage_dict = usage.as_dict()
+    logger.info("Summary of %s %s (%s mode): %s", ticker, quarter, mode, usage_dict)
+
+    if error_dict:
+        # Partial results are returned but not cached, the next request retries the failed sections
+        status_code = 504 if all(e.startswith("Timed out") for e in error_dict.values()) else 502
+        raise HTTPException(status_code=status_code, detail={"sections": section_dict, "errors": error_dict, "usage": usage_dict})
 
+    return _save_summary(ticker, quarter, section_dict), usage_dict
+
+
+def _stream_summary_lines(ticker: str, quarter: str, transcript_df: pd.DataFrame, mode: str = SUMMARY_MODE) -> Iterator[str]:
+    section_dict = {}
+    with track_usage() as usage:
+        for result in run_summary(transcript_df, mode):
+            if result.error is None:
+                section_dict[result.section] = result.text
+            yield json.dumps(result._asdict()) + "\n"
+    usage_dict = usage.as_dict()
+    logger.info("Summary of %s %s (%s mode): %s", ticker, quarter, mode, usage_dict)
+
+    if len(section_dict) == len(SUMMARY_SECTIONS):
+        _save_summary(ticker, quarter, section_dict)
+        yield json.dumps({"status": "complete", "usage": usage_dict}) + "\n"
+    else:
+        yield json.dumps({"status": "partial", "missing": sorted(set(SUMMARY_SECTIONS) - set(section_dict)), "usage": usage_dict}) + "\n"
+
+
+@app.get("/summary", response_model=StockTranscriptSummary)
+async def get_summary(
+    response: Response,
+    ticker: str = Query("HDFCBANK.NS", description="Stock ticker"),
+    quarter: str = Query("2025Q1", description="Quarter for which to fetch the call transcript summary"),
+    stream: bool = Query(False, description="Stream each summary section as NDJSON as soon as it is ready"),
+    mode: str = Query(SUMMARY_MODE, description="sections: one model call per section, structured: one JSON call for all sections"),
+):
+    ticker = ticker.strip().upper()
+    if mode not in SUMMARY_MODES:
+        raise HTTPException(status_code=400, detail=f"Unsupported summary mode {mode!r}, expected one of {SUMMARY_MODES}")
+
+    stock_transcript_summary = await run_in_threadpool(_read_summary, ticker, quarter)
+
+    if stock_transcript_summary:
+        if not stream:
+            return stock_transcript_summary
+        cached_dict = stock_transcript_summary.model_dump(exclude={"ticker", "quarter"})
+        cached_lines = [json.dumps({"section": section, "text": text, "cached": True}) + "\n" for section, text in cached_dict.items()]
+        cached_lines.append(json.dumps({"status": "complete"}) + "\n")
+        return StreamingResponse(iter(cached_lines), media_type="application/x-ndjson")
+
+    stock_transcript_list = await get_transcript(ticker=ticker, quarter=quarter)
+    transcript_df = pd.DataFrame([st.model_dump() for st in stock_transcript_list])
+
+    if stream:
+        lines = LLM_EXECUTOR.stream(_stream_summary_lines, ticker, quarter, transcript_df, mode)
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    stock_transcript_summary, usage = await LLM_EXECUTOR.run(_generate_summary, ticker, quarter, transcript_df, mode)
+    response.headers.update(_usage_headers(usage))
     return stock_transcript_summary
+
+
+def _ingest_transcript(ticker: str, quarter: str):
+    # Parses the transcript and builds the summary so that later requests are cache hits
+    stock_transcript_list = _get_transcript(ticker, quarter)
+    if _read_summary(ticker, quarter) is None:
+        transcript_df = pd.DataFrame([st.model_dump() for st in stock_transcript_list])
+        _generate_summary(ticker, quarter, transcript_df)
+
+
+@app.post("/transcript/ingest", response_model=IngestionJob)
+def post_transcript_ingest(
+    ticker: str = Query("HDFCBANK.NS", description="Stock ticker"),
+    quarter: str = Query("2025Q1", description="Quarter of the call transcript to ingest"),
+    force: bool = Query(False, description="Re-run the job even if it already completed or failed"),
+):
+    ticker = ticker.strip().upper()
+    if ticker not in TICKER_MAPPING:
+        raise HTTPException(status_code=404, detail=f"No transcripts available for {ticker}")
+    if not os.path.exists(get_transcript_path(ticker, quarter)):
+        raise HTTPException(status_code=404, detail=f"No transcript for {ticker} {quarter}")
+    return enqueue_job(ticker, quarter, force=force)
+
+
+@app.get("/transcript/ingest", response_model=IngestionJob)
+def get_transcript_ingest(
+    ticker: str = Query("HDFCBANK.NS", description="Stock ticker"),
+    quarter: str = Query("2025Q1", description="Quarter of the call transcript"),
+):
+    job = get_job(ticker.strip().upper(), quarter)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No ingestion job found")
+    return job
+
+
+@app.get("/transcript/jobs", response_model=list[IngestionJob])
+def get_transcript_jobs(
+    status: Optional[str] = Query(None, description="Filter by job status (queued, running, done, failed)"),
+):
+    return list_jobs(status)
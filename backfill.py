@@ -0,0 +1,36 @@
+import json
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from sqlmodel import Session
+
+from db import engine, create_db_and_tables
+from prices import BATCH_CHUNK_SIZE, sync_batch
+from universe import get_nifty_500_stocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill daily prices into stockdailyprice with chunked multi-ticker downloads")
+    parser.add_argument("tickers", nargs="*", help="Tickers to backfill (e.g. HDFCBANK.NS)")
+    parser.add_argument("--nifty500", action="store_true", help="Backfill the whole NIFTY 500 universe")
+    parser.add_argument("--period", default="3y", help="yfinance period (e.g., 3y)")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_CHUNK_SIZE, help="Tickers per upstream download")
+    parser.add_argument("--force", action="store_true", help="Ignore the sync TTL")
+    args = parser.parse_args()
+
+    tickers = list(args.tickers)
+    if args.nifty500:
+        tickers.extend(f"{s}.NS" for s in get_nifty_500_stocks())
+    if not tickers:
+        parser.error("pass tickers or --nifty500")
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        for result in sync_batch(session, tickers, period=args.period, chunk_size=args.chunk_size, force=args.force):
+            print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    main()
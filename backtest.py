@@ -0,0 +1,312 @@
+import os
+import uuid
+import itertools
+import threading
+import numpy as np
+import pandas as pd
+from typing import Callable, Optional
+from concurrent.futures import ProcessPoolExecutor
+from pydantic import BaseModel, Field
+from sqlmodel import Session
+
+from executors import process_pool
+from prices import period_start
+from screener import SCREENER_DIR, ScreenerMatrix, build_matrix, get_matrix
+
+TRADING_DAYS_PER_YEAR = 252
+
+# Sweeps with at least this many strategy-ticker-days are split across worker processes
+BACKTEST_PROCESS_THRESHOLD = int(os.getenv("BACKTEST_PROCESS_THRESHOLD", str(20_000_000)))
+BACKTEST_PROCESSES = int(os.getenv("BACKTEST_PROCESSES", str(os.cpu_count() or 2)))
+
+STATS = ["total_return", "cagr", "volatility", "sharpe", "max_drawdown", "exposure", "turnover"]
+LOWER_IS_BETTER = {"volatility", "turnover"}
+
+
+def _rolling_mean(x: np.ndarray, n: int) -> np.ndarray:
+    # Column-wise mean over the last n rows, NaN until a column has n valid rows in a row
+    valid = ~np.isnan(x)
+    zero = np.zeros((1, x.shape[1]))
+    csum = np.concatenate([zero, np.cumsum(np.where(valid, x, 0.0), axis=0)])
+    ccount = np.concatenate([zero, np.cumsum(valid, axis=0)])
+    out = np.full(x.shape, np.nan)
+    if len(x) >= n:
+        window_count = ccount[n:] - ccount[:-n]
+        out[n - 1:] = np.where(window_count == n, (csum[n:] - csum[:-n]) / n, np.nan)
+    return out
+
+
+def daily_returns(close: np.ndarray) -> np.ndarray:
+    # Close-to-close returns, 0 where either close is missing
+    ret = np.zeros(close.shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ret[1:] = close[1:] / close[:-1] - 1
+    return np.nan_to_num(ret, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def sma_crossover(close: np.ndarray, fast: int = 20, slow: int = 50) -> np.ndarray:
+    # One book per ticker: long while the fast average is above the slow one
+    if fast >= slow:
+        raise ValueError(f"fast ({fast}) must be shorter than slow ({slow})")
+    with np.errstate(invalid="ignore"):
+        return (_rolling_mean(close, fast) > _rolling_mean(close, slow)).astype(np.float64)
+
+
+def momentum_rank(close: np.ndarray, lookback: int = 126, top_n: int = 10, rebalance: int = 21) -> np.ndarray:
+    # One portfolio: every `rebalance` days, equal weights in the top_n tickers by trailing return
+    targets = np.full(close.shape, np.nan)
+    days = np.arange(lookback, len(close), rebalance)
+    if len(days) == 0 or top_n <= 0:
+        targets[days] = 0.0
+        return targets
+    # Trailing returns are only needed on rebalance days
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trailing = close[days] / close[days - lookback] - 1
+    ranked = np.where(np.isnan(trailing), -np.inf, trailing)
+    picks = np.argsort(-ranked, axis=1, kind="stable")[:, :top_n]
+    valid = np.isfinite(np.take_along_axis(ranked, picks, axis=1))
+    weights = np.zeros(ranked.shape)
+    np.put_along_axis(weights, picks, valid / np.maximum(valid.sum(axis=1, keepdims=True), 1), axis=1)
+    targets[days] = weights
+    return targets
+
+
+def equal_weight(close: np.ndarray, rebalance: int = 21) -> np.ndarray:
+    # One portfolio: every `rebalance` days, equal weights in every ticker with a price
+    targets = np.full(close.shape, np.nan)
+    days = np.arange(0, len(close), rebalance)
+    listed = ~np.isnan(close[days])
+    targets[days] = listed / np.maximum(listed.sum(axis=1, keepdims=True), 1)
+    return targets
+
+
+# name -> (signal function, default parameters, True when the tickers form one portfolio)
+STRATEGIES: dict[str, tuple[Callable, dict, bool]] = {
+    "sma_crossover": (sma_crossover, {"fast": 20, "slow": 50}, False),
+    "momentum_rank": (momentum_rank, {"lookback": 126, "top_n": 10, "rebalance": 21}, True),
+    "equal_weight": (equal_weight, {"rebalance": 21}, True),
+}
+
+# Parameter combinations of a grid that are skipped instead of failing the sweep
+CONSTRAINTS: dict[str, Callable[[dict], bool]] = {
+    "sma_crossover": lambda params: params["fast"] < params["slow"],
+}
+
+
+def book_returns(positions: np.ndarray, ret: np.ndarray, cost: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Per-ticker books: the position decided at close t earns the return of t + 1
+    held = np.zeros(positions.shape)
+    held[1:] = positions[:-1]
+    trades = np.abs(np.diff(held, axis=0, prepend=0.0))
+    return held * ret - cost * trades, held, trades
+
+
+def portfolio_returns(targets: np.ndarray, ret: np.ndarray, cost: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Weights drift with prices between rebalances; NaN rows of targets mean no rebalance that day.
+    # Each day holds the last target grown by the returns since it was set, the rest is cash at 0%.
+    days = len(targets)
+    port_ret = np.zeros((days, 1))
+    gross = np.zeros((days, 1))
+    trades = np.zeros((days, 1))
+    rebalances = np.flatnonzero(~np.isnan(targets[:, 0]))
+    if len(rebalances) == 0:
+        return port_ret, gross, trades
+
+    # The return of a rebalance day is still earned by the previous target
+    segment = np.searchsorted(rebalances, np.arange(days), side="left") - 1
+    set_on = rebalances[np.maximum(segment, 0)]
+    base = targets[set_on]
+    base[segment < 0] = 0.0
+    growth = np.cumprod(1 + ret, axis=0)
+    holdings = base * (growth / growth[set_on])
+    invested = holdings.sum(axis=1)
+    value = 1 - base.sum(axis=1) + invested
+    prev_value = np.ones(days)
+    prev_value[1:] = np.where(segment[1:] == segment[:-1], value[:-1], 1.0)
+
+    drifted = holdings[rebalances] / value[rebalances, None]
+    trades[rebalances, 0] = np.abs(targets[rebalances] - drifted).sum(axis=1)
+    gross[:, 0] = invested / value
+    gross[rebalances, 0] = targets[rebalances].sum(axis=1)
+    port_ret[:, 0] = value / prev_value - 1 - cost * trades[:, 0]
+    return port_ret, gross, trades
+
+
+def compute_stats(returns: np.ndarray, exposure: np.ndarray, trades: np.ndarray, active_days: np.ndarray) -> dict[str, np.ndarray]:
+    # Column-wise summary statistics of daily return series
+    equity = np.cumprod(1 + returns, axis=0)
+    years = np.maximum(active_days, 1) / TRADING_DAYS_PER_YEAR
+    std = returns.std(axis=0, ddof=1) if len(returns) > 1 else np.zeros(returns.shape[1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(std > 0, returns.mean(axis=0) / std * np.sqrt(TRADING_DAYS_PER_YEAR), 0.0)
+        cagr = np.where(equity[-1] > 0, equity[-1] ** (1 / years) - 1, -1.0)
+    return {
+        "total_return": equity[-1] - 1,
+        "cagr": cagr,
+        "volatility": std * np.sqrt(TRADING_DAYS_PER_YEAR),
+        "sharpe": sharpe,
+        "max_drawdown": (equity / np.maximum.accumulate(equity, axis=0) - 1).min(axis=0),
+        "exposure": (exposure != 0).mean(axis=0),
+        "turnover": trades.sum(axis=0) / years,
+    }
+
+
+def run_strategy(close: np.ndarray, strategy: str, params: dict, cost_bps: float = 10.0) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    # Daily returns of each book (one per ticker, or one for the portfolio) and their stats
+    signal, _, portfolio = STRATEGIES[strategy]
+    ret = daily_returns(close)
+    cost = cost_bps / 10_000
+    if portfolio:
+        returns, exposure, trades = portfolio_returns(signal(close, **params), ret, cost)
+        active_days = np.array([len(close)])
+    else:
+        returns, exposure, trades = book_returns(signal(close, **params), ret, cost)
+        active_days = (~np.isnan(close)).sum(axis=0)
+    return returns, compute_stats(returns, exposure, trades, active_days)
+
+
+def expand_grid(strategy: str, grid: dict[str, list]) -> list[dict]:
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}, expected one of {list(STRATEGIES)}")
+    defaults = STRATEGIES[strategy][1]
+    unknown = set(grid) - set(defaults)
+    if unknown:
+        raise ValueError(f"Unknown parameters {sorted(unknown)} for {strategy}, expected {sorted(defaults)}")
+
+    names = list(defaults)
+    values = [[type(defaults[name])(v) for v in grid.get(name, [defaults[name]])] for name in names]
+    combos = [dict(zip(names, combo)) for combo in itertools.product(*values)]
+    combos = [params for params in combos if CONSTRAINTS.get(strategy, lambda _: True)(params)]
+    if not combos:
+        raise ValueError(f"No valid parameter combination in {grid} for {strategy}")
+    return combos
+
+
+def _sweep_chunk(close: np.ndarray, strategy: str, combos: list[dict], cost_bps: float) -> list[dict[str, np.ndarray]]:
+    return [run_strategy(close, strategy, params, cost_bps)[1] for params in combos]
+
+
+_worker_close: dict[str, np.ndarray] = {}
+
+
+def _sweep_chunk_from_file(path: str, strategy: str, combos: list[dict], cost_bps: float) -> list[dict[str, np.ndarray]]:
+    # Runs in a worker process; the matrix is memory-mapped once per worker and file
+    if path not in _worker_close:
+        _worker_close.clear()
+        _worker_close[path] = np.load(path, mmap_mode="r")
+    return _sweep_chunk(np.asarray(_worker_close[path]), strategy, combos, cost_bps)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = process_pool(BACKTEST_PROCESSES)
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def sweep(close: np.ndarray, strategy: str, combos: list[dict], cost_bps: float = 10.0, processes: Optional[int] = None) -> list[dict[str, np.ndarray]]:
+    # Stats for every parameter combination, large sweeps in parallel worker processes
+    processes = BACKTEST_PROCESSES if processes is None else processes
+    work = len(combos) * close.shape[0] * close.shape[1]
+    if processes <= 1 or len(combos) < 2 or work < BACKTEST_PROCESS_THRESHOLD:
+        return _sweep_chunk(close, strategy, combos, cost_bps)
+
+    # Workers read the matrix from a memory-mapped file instead of a pickled copy per task.
+    # Unique per sweep, workers cache the mapping by path and must never see a stale matrix.
+    directory = os.path.join(SCREENER_DIR, "backtest")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"close.{uuid.uuid4().hex}.npy")
+    np.save(path, np.ascontiguousarray(close))
+    try:
+        pool = _get_pool()
+        chunk_size = -(-len(combos) // processes)
+        futures = [
+            pool.submit(_sweep_chunk_from_file, path, strategy, combos[i:i + chunk_size], cost_bps)
+            for i in range(0, len(combos), chunk_size)
+        ]
+        return [stats for future in futures for stats in future.result()]
+    finally:
+        os.remove(path)
+
+
+def _select(matrix: ScreenerMatrix, tickers: list[str], start: Optional[pd.Timestamp]) -> tuple[np.ndarray, np.ndarray]:
+    columns = [matrix.tickers.index(ticker) for ticker in tickers]
+    rows = slice(None) if start is None else slice(int(np.searchsorted(matrix.dates, np.datetime64(start.date()))), None)
+    return matrix.dates[rows], np.asarray(matrix.adj_close[rows][:, columns], dtype=np.float64)
+
+
+def load_closes(session: Session, tickers: Optional[list[str]], period: str) -> tuple[np.ndarray, list[str], np.ndarray]:
+    # Dates, tickers and adjusted closes; the NIFTY 500 screener matrix is reused when it covers the tickers
+    start = period_start(period)
+    matrix = get_matrix(session)
+    tickers = matrix.tickers if not tickers else list(dict.fromkeys(t.strip().upper() for t in tickers))
+    if not set(tickers) <= set(matrix.tickers):
+        matrix = build_matrix(session, tickers)
+    dates, close = _select(matrix, tickers, start)
+    listed = ~np.all(np.isnan(close), axis=0)
+    return dates, [t for t, keep in zip(tickers, listed) if keep], close[:, listed]
+
+
+class BacktestRequest(BaseModel):
+    strategy: str = Field("sma_crossover", description=f"One of {list(STRATEGIES)}")
+    tickers: Optional[list[str]] = Field(None, description="Tickers to trade, the NIFTY 500 when omitted")
+    period: str = Field("3y", description="History to backtest over (e.g., 3y, max)")
+    grid: dict[str, list[float]] = Field(default_factory=dict, description="Values to sweep per strategy parameter, e.g. {\"fast\": [10, 20], \"slow\": [50, 100]}")
+    cost_bps: float = Field(10.0, ge=0, description="Trading cost per unit of turnover, in basis points")
+    sort: str = Field("sharpe", description=f"Stat to rank results by, one of {STATS}")
+    limit: int = Field(20, ge=1, le=1000, description="Number of ranked results to return")
+    curves: int = Field(5, ge=0, le=50, description="Number of top results to return equity curves for")
+
+
+def run_backtest(session: Session, request: BacktestRequest) -> dict:
+    if request.sort not in STATS:
+        raise ValueError(f"Unknown sort stat {request.sort!r}, expected one of {STATS}")
+    combos = expand_grid(request.strategy, request.grid)
+    dates, tickers, close = load_closes(session, request.tickers, request.period)
+    if len(dates) < 2 or not tickers:
+        raise ValueError("Not enough stored price history for the requested tickers and period")
+
+    portfolio = STRATEGIES[request.strategy][2]
+    labels = ["portfolio"] if portfolio else tickers
+    stats_list = sweep(close, request.strategy, combos, request.cost_bps)
+
+    rows = [
+        {"params": params, "book": label, **{name: float(stats[name][idx]) for name in STATS}}
+        for params, stats in zip(combos, stats_list)
+        for idx, label in enumerate(labels)
+    ]
+    descending = request.sort not in LOWER_IS_BETTER
+    rows.sort(key=lambda row: (np.isnan(row[request.sort]), -row[request.sort] if descending else row[request.sort]))
+
+    # Equity curves are recomputed for the few results returned with one
+    curves = []
+    for row in rows[:request.curves]:
+        returns, _ = run_strategy(close, request.strategy, row["params"], request.cost_bps)
+        equity = np.cumprod(1 + returns[:, labels.index(row["book"])])
+        curves.append({"params": row["params"], "book": row["book"], "equity": np.round(equity, 6).tolist()})
+
+    years = len(dates) / TRADING_DAYS_PER_YEAR
+    return {
+        "strategy": request.strategy,
+        "start": str(dates[0]),
+        "end": str(dates[-1]),
+        "tickers": len(tickers),
+        "combinations": len(combos),
+        "strategy_ticker_years": round(len(combos) * len(tickers) * years, 1),
+        "results": rows[:request.limit],
+        "dates": [str(d) for d in dates] if curves else [],
+        "curves": curves,
+    }
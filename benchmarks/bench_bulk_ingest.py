@@ -0,0 +1,96 @@
+"""Compare rows/sec of the legacy ORM ingestion against the bulk upsert path.
+
+Usage: python benchmarks/bench_bulk_ingest.py --tickers 50 --days 750
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, SQLModel, create_engine, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import bulk_upsert
+from models import StockDailyPrice
+from prices import history_to_records
+
+
+def make_history_df(days: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, days)))
+    return pd.DataFrame({
+        "Date": pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days),
+        "Adj Close": close,
+        "Close": close,
+        "High": close * 1.01,
+        "Low": close * 0.99,
+        "Open": close,
+        "Volume": rng.integers(1_000, 1_000_000, days),
+    })
+
+
+def ingest_legacy(session: Session, ticker: str, history_df: pd.DataFrame) -> int:
+    # Mirrors the original /fetch handler: iterrows, list-scan dedupe and per-row refresh
+    sdp_list = [
+        StockDailyPrice(
+            ticker=ticker,
+            date=row["Date"],
+            adj_close=row["Adj Close"],
+            close=row["Close"],
+            high=row["High"],
+            low=row["Low"],
+            open=row["Open"],
+            volume=row["Volume"]
+        )
+        for _, row in history_df.iterrows()
+    ]
+    existing_sdp_list = session.exec(select(StockDailyPrice).where(StockDailyPrice.ticker == ticker)).all()
+    existing_date_list = [pd.to_datetime(sdp.date) for sdp in existing_sdp_list]
+    new_sdp_list = [sdp for sdp in sdp_list if pd.to_datetime(sdp.date) not in existing_date_list]
+    session.add_all(new_sdp_list)
+    session.commit()
+    [session.refresh(sdp) for sdp in new_sdp_list]
+    return len(new_sdp_list)
+
+
+def ingest_bulk(session: Session, ticker: str, history_df: pd.DataFrame) -> int:
+    return bulk_upsert(session, StockDailyPrice, history_to_records(ticker, history_df))
+
+
+def run(ingest, frames: dict[str, pd.DataFrame], repeat: bool) -> float:
+    # Returns rows/sec for a cold load, optionally followed by a second pass over already stored rows
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_engine(f"sqlite:///{tmpdir}/bench.db")
+        SQLModel.metadata.create_all(engine)
+        rows = 0
+        start = time.perf_counter()
+        with Session(engine) as session:
+            for _ in range(2 if repeat else 1):
+                for ticker, history_df in frames.items():
+                    ingest(session, ticker, history_df)
+                    rows += len(history_df)
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+    return rows / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--days", type=int, default=750)
+    args = parser.parse_args()
+
+    frames = {f"SYM{i}.NS": make_history_df(args.days, seed=i) for i in range(args.tickers)}
+    print(f"{args.tickers} tickers x {args.days} days = {args.tickers * args.days} rows")
+    for repeat in (False, True):
+        label = "cold + re-ingest" if repeat else "cold"
+        legacy = run(ingest_legacy, frames, repeat)
+        bulk = run(ingest_bulk, frames, repeat)
+        print(f"{label:>16}: legacy {legacy:>10,.0f} rows/s | bulk {bulk:>10,.0f} rows/s | {bulk / legacy:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Hammer SQLite with concurrent /fetch-style writes and /transcript-style reads.
+
+Compares the legacy engine settings (rollback journal, synchronous=FULL) with the
+tuned engine from db.create_sqlite_engine (WAL, synchronous=NORMAL, mmap, cache).
+
+Usage: python benchmarks/bench_db_concurrency.py --writers 4 --readers 16 --seconds 5
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, SQLModel, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import bulk_upsert, create_sqlite_engine
+from models import StockDailyPrice, StockTranscript
+
+TICKERS = [f"SYM{i}.NS" for i in range(20)]
+QUARTERS = ["2024Q3", "2024Q4", "2025Q1", "2025Q2"]
+
+
+def seed(engine):
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for ticker in TICKERS:
+            bulk_upsert(session, StockTranscript, [
+                {"ticker": ticker, "quarter": quarter, "transcript_index": idx, "speaker": "Moderator", "speaker_type": "Moderator", "transcript": "word " * 200}
+                for quarter in QUARTERS for idx in range(1, 101)
+            ])
+
+
+def writer(engine, stop: threading.Event, latencies: list, errors: list, seed_: int):
+    # Mirrors /fetch: upsert a handful of fresh daily bars, then read the ticker's history back
+    rng = np.random.default_rng(seed_)
+    day = pd.Timestamp("2020-01-01") + pd.Timedelta(days=int(rng.integers(0, 10_000)))
+    while not stop.is_set():
+        ticker = TICKERS[rng.integers(len(TICKERS))]
+        day += pd.Timedelta(days=1)
+        records = [{"ticker": ticker, "date": day + pd.Timedelta(days=i), "adj_close": 1.0, "close": 1.0, "high": 1.0, "low": 1.0, "open": 1.0, "volume": 1} for i in range(5)]
+        start = time.perf_counter()
+        try:
+            with Session(engine) as session:
+                bulk_upsert(session, StockDailyPrice, records, update=True)
+                session.exec(select(StockDailyPrice).where(StockDailyPrice.ticker == ticker)).all()
+            latencies.append(time.perf_counter() - start)
+        except Exception as exc:  # noqa: BLE001
+            errors.append(exc)
+
+
+def reader(engine, stop: threading.Event, latencies: list, errors: list, seed_: int):
+    # Mirrors /transcript on a warm cache
+    rng = np.random.default_rng(seed_)
+    while not stop.is_set():
+        ticker = TICKERS[rng.integers(len(TICKERS))]
+        quarter = QUARTERS[rng.integers(len(QUARTERS))]
+        start = time.perf_counter()
+        try:
+            with Session(engine) as session:
+                session.exec(select(StockTranscript).where(StockTranscript.ticker == ticker, StockTranscript.quarter == quarter)).all()
+            latencies.append(time.perf_counter() - start)
+        except Exception as exc:  # noqa: BLE001
+            errors.append(exc)
+
+
+def run(label: str, args, **engine_kwargs):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_sqlite_engine(f"sqlite:///{tmpdir}/bench.db", echo=False, pool_size=args.writers + args.readers, **engine_kwargs)
+        seed(engine)
+
+        stop = threading.Event()
+        write_latencies, read_latencies, errors = [], [], []
+        threads = [threading.Thread(target=writer, args=(engine, stop, write_latencies, errors, i)) for i in range(args.writers)]
+        threads += [threading.Thread(target=reader, args=(engine, stop, read_latencies, errors, 1000 + i)) for i in range(args.readers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    for kind, latencies in (("write", write_latencies), ("read", read_latencies)):
+        ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+        print(f"{label:>7} {kind:>5}: {len(latencies) / args.seconds:>8.0f} ops/s  p50 {np.percentile(ms, 50):>7.2f} ms  p95 {np.percentile(ms, 95):>7.2f} ms  p99 {np.percentile(ms, 99):>7.2f} ms")
+    print(f"{label:>7} errors: {len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    run("legacy", args, journal_mode="DELETE", synchronous="FULL", mmap_size=0, cache_size_kib=2000)
+    run("tuned", args)
+
+
+if __name__ == "__main__":
+    main()
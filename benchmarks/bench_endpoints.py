@@ -0,0 +1,273 @@
+"""Load-test the backend endpoints offline, replaying recorded upstream fixtures with injected latency.
+
+The app is served by uvicorn in this process against a fresh database, so the first requests for
+a ticker or quarter are cold and later ones hit the database and caches. Concurrent clients pick
+endpoints by --mix weight. Results are p50/p95/p99 latency and throughput per endpoint, plus the
+peak RSS of the whole process over the run (server and clients share it, so it is not per endpoint).
+--save writes them as a JSON baseline, and --compare diffs a run against one.
+
+Usage:
+    python benchmarks/replay.py --source db
+    python benchmarks/bench_endpoints.py --clients 8 --requests 400 --latency gemini=1.0 --latency yfinance=0.3 --save benchmarks/baselines/local.json
+    python benchmarks/bench_endpoints.py --clients 8 --requests 400 --latency gemini=1.0 --latency yfinance=0.3 --compare benchmarks/baselines/local.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Everything the app writes goes to a throwaway directory, so each run starts cold
+WORK_DIR = tempfile.mkdtemp(prefix="bench_endpoints_")
+os.environ["SQLITE_FILE_NAME"] = os.path.join(WORK_DIR, "bench.db")
+os.environ["PDF_TEXT_CACHE_DIR"] = os.path.join(WORK_DIR, "pdf_text")
+os.environ["EMBEDDING_DIR"] = os.path.join(WORK_DIR, "embeddings")
+os.environ["SCREENER_DIR"] = os.path.join(WORK_DIR, "screener")
+os.environ["INGEST_WORKERS"] = "0"
+os.environ.setdefault("GEMINI_API_KEY", "stub")
+os.environ.setdefault("MISTRAL_API_KEY", "stub")
+
+import httpx
+import uvicorn
+
+from replay import DEFAULT_FIXTURES_DIR, Fixtures, InjectedLatency, install
+
+ENDPOINTS = ["search", "search_yfin", "fetch", "transcript", "summary"]
+DEFAULT_MIX = "search=4,search_yfin=1,fetch=3,transcript=2,summary=1"
+FETCH_PERIODS = ["1mo", "6mo", "1y", "3y"]
+SEARCH_QUERIES = ["HD", "HDFC", "TIT", "TITAN", "REL", "TATA", "INF", "BAJ", "ADANI", "BANK"]
+STATS = ["p50_ms", "p95_ms", "p99_ms", "throughput_rps"]
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r} in --mix, expected one of {ENDPOINTS}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def build_request(name: str, rng: random.Random, fixtures: Fixtures, transcripts: list[tuple[str, str]]) -> tuple[str, dict]:
+    if name == "search":
+        return "/search", {"query": rng.choice(SEARCH_QUERIES)}
+    if name == "search_yfin":
+        return "/search/yfin", {"query": rng.choice(SEARCH_QUERIES), "limit": 25}
+    if name == "fetch":
+        return "/fetch", {"ticker": rng.choice(fixtures.tickers), "period": rng.choice(FETCH_PERIODS)}
+    ticker, quarter = rng.choice(transcripts)
+    if name == "transcript":
+        return "/transcript", {"ticker": ticker, "quarter": quarter}
+    return "/summary", {"ticker": ticker, "quarter": quarter}
+
+
+def available_transcripts() -> list[tuple[str, str]]:
+    from transcript import TICKER_MAPPING, get_transcript_path
+
+    quarters = ["2024Q3", "2024Q4", "2025Q1", "2025Q2"]
+    return [(ticker, quarter) for ticker in TICKER_MAPPING for quarter in quarters if os.path.exists(os.path.join(ROOT_DIR, get_transcript_path(ticker, quarter)))]
+
+
+def start_server(app) -> tuple[uvicorn.Server, threading.Thread, str]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Server failed to start")
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def client(base_url: str, requests: list[tuple[str, str, dict]], next_slot, results: list):
+    with httpx.Client(base_url=base_url, timeout=600) as http:
+        while True:
+            slot = next_slot()
+            if slot is None:
+                return
+            name, path, params = requests[slot]
+            started_at = time.perf_counter()
+            try:
+                status = http.get(path, params=params).status_code
+            except httpx.HTTPError as exc:
+                status = type(exc).__name__
+            results.append((name, status, time.perf_counter() - started_at, time.perf_counter()))
+
+
+def peak_rss_mb() -> float:
+    import resource
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def summarize(results: list, elapsed: float) -> dict:
+    latencies = np.array([latency for _, _, latency, _ in results]) * 1000 if results else np.zeros(1)
+    statuses = Counter(str(status) for _, status, _, _ in results)
+    return {
+        "requests": len(results),
+        "errors": sum(count for status, count in statuses.items() if not status.startswith("2")),
+        "statuses": dict(sorted(statuses.items())),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(float(latencies.mean()), 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "max_ms": round(float(latencies.max()), 2),
+    }
+
+
+def run(args) -> dict:
+    fixtures = Fixtures(args.fixtures, shift_dates=not args.no_shift_dates)
+    latency = InjectedLatency.parse(args.latency, jitter=args.jitter, per_1k_tokens=args.gemini_per_1k_tokens, seed=args.seed)
+    restore = install(fixtures, latency)
+
+    import backend
+
+    mix = parse_mix(args.mix)
+    transcripts = available_transcripts()
+    if not transcripts:
+        mix = {name: weight for name, weight in mix.items() if name not in ("transcript", "summary")}
+    rng = random.Random(args.seed)
+    names = rng.choices(list(mix), weights=list(mix.values()), k=args.warmup + args.requests)
+    requests = [(name, *build_request(name, rng, fixtures, transcripts)) for name in names]
+
+    server, thread, base_url = start_server(backend.app)
+    try:
+        # Warm-up requests are sent one at a time and left out of the results
+        warmup = iter(range(args.warmup))
+        client(base_url, requests, lambda: next(warmup, None), [])
+
+        lock = threading.Lock()
+        cursor = iter(range(args.warmup, len(requests)))
+        results = []
+        started_at = time.perf_counter()
+        deadline = started_at + args.seconds if args.seconds else None
+
+        def next_slot():
+            with lock:
+                if deadline is not None and time.perf_counter() > deadline:
+                    return None
+                return next(cursor, None)
+
+        threads = [threading.Thread(target=client, args=(base_url, requests, next_slot, results)) for _ in range(args.clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started_at
+    finally:
+        server.should_exit = True
+        thread.join()
+        restore()
+
+    endpoints = {name: summarize([r for r in results if r[0] == name], elapsed) for name in ENDPOINTS if any(r[0] == name for r in results)}
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "clients": args.clients, "requests": args.requests, "seconds": args.seconds, "warmup": args.warmup, "mix": mix,
+            "latency": latency.means, "jitter": args.jitter, "gemini_per_1k_tokens": args.gemini_per_1k_tokens, "seed": args.seed,
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "total": summarize(results, elapsed),
+        "endpoints": endpoints,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def report(result: dict):
+    print(f"{result['total']['requests']} requests in {result['elapsed_seconds']:.1f}s with {result['config']['clients']} clients, peak RSS {result['peak_rss_mb']:.0f} MB")
+    print(f"{'endpoint':>12} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, stats in list(result["endpoints"].items()) + [("total", result["total"])]:
+        print(f"{name:>12} {stats['requests']:>8} {stats['errors']:>6} {stats['throughput_rps']:>8.1f} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+
+
+def compare(result: dict, baseline: dict, max_regression: float) -> bool:
+    # Relative change per stat; latency going up or throughput going down beyond max_regression is a regression
+    if baseline["config"] != result["config"]:
+        print("Warning: baseline was recorded with a different configuration")
+    print(f"\nAgainst baseline {baseline.get('git_commit') or '?'} from {baseline['created_at']}:")
+    regressed = False
+    for name in ["total"] + list(result["endpoints"]):
+        current = result["total"] if name == "total" else result["endpoints"][name]
+        previous = baseline["total"] if name == "total" else baseline["endpoints"].get(name)
+        if previous is None:
+            continue
+        cells = []
+        for stat in STATS:
+            change = 100 * (current[stat] - previous[stat]) / previous[stat] if previous[stat] else 0.0
+            worse = -change if stat == "throughput_rps" else change
+            flag = "!" if worse > max_regression else " "
+            regressed |= worse > max_regression
+            cells.append(f"{stat[:-3] if stat.endswith('_ms') else 'req/s'} {previous[stat]:.1f} -> {current[stat]:.1f} ({change:+.0f}%){flag}")
+        print(f"{name:>12}  " + "  ".join(cells))
+    rss_change = 100 * (result["peak_rss_mb"] - baseline["peak_rss_mb"]) / baseline["peak_rss_mb"]
+    print(f"{'peak RSS':>12}  {baseline['peak_rss_mb']:.0f} -> {result['peak_rss_mb']:.0f} MB ({rss_change:+.0f}%)")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES_DIR)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=None, help="Stop after this long even if requests are left")
+    parser.add_argument("--warmup", type=int, default=0, help="Requests sent before measuring, one at a time")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Endpoint weights, e.g. fetch=3,summary=1")
+    parser.add_argument("--latency", action="append", default=[], help="Injected upstream latency, SERVICE=SECONDS, repeatable")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency varies by up to this fraction")
+    parser.add_argument("--gemini-per-1k-tokens", type=float, default=0.0, help="Extra Gemini latency per 1k prompt tokens")
+    parser.add_argument("--no-shift-dates", action="store_true", help="Replay price history on its recorded dates")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="Write the results to this JSON baseline")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="Percent change flagged as a regression, exits 1 with --compare")
+    args = parser.parse_args()
+
+    result = run(args)
+    report(result)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Time transcript parsing for the bundled PDFs: legacy PyPDF2 path vs cached page text.
+
+A second table times page extraction with each installed text backend, inline and split across
+the page process pool (--processes).
+
+Usage: python benchmarks/bench_pdf_parse.py [--repeat 3] [--processes 4]
+"""
+import os
+import re
+import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+import pandas as pd
+from PyPDF2 import PdfReader
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import transcript
+import pdf_extract
+
+
+def preprocess_transcript_legacy(reader: PdfReader) -> pd.DataFrame:
+    # The original implementation, kept verbatim to compare timings and output
+    pages = reader.pages
+    transcript_text_list = []
+
+    transcript_begin_page_text = pages[2].extract_text()
+    anchor_index = re.search('Moderator', transcript_begin_page_text).start()
+    common_page_prefix = transcript_begin_page_text[:anchor_index].rstrip()
+    common_page_prefix_pattern = re.sub("Page [0-9]+ of [0-9]+", "Page [0-9]+ of [0-9]+", common_page_prefix)
+
+    for page in pages[2:]:
+        text = page.extract_text()
+        text = re.sub(common_page_prefix_pattern, '', text).lstrip()
+        transcript_text_list.append(text)
+
+    transcript_text = '\n' + ' \n'.join(transcript_text_list)
+
+    transcript_text = re.sub('([0-9]) ?:', r'\1*colon*', transcript_text)
+    colon_splitted_list = transcript_text.split(':')
+    colon_splitted_list = [re.sub(r'\*colon\*', ':', t) for t in colon_splitted_list]
+
+    colon_newline_splitted_list = [
+        [''.join(re.split(r'(\? |\. |\n)', t)[:-1]), re.split(r'(\? |\. |\n)', t)[-1]] if idx < (len(colon_splitted_list) - 1) else [t]
+        for idx, t in enumerate(colon_splitted_list)
+    ]
+    colon_newline_splitted_list = [t for tlist in colon_newline_splitted_list for t in tlist][1:]
+    speaker_list = colon_newline_splitted_list[::2]
+    transcription_list = colon_newline_splitted_list[1::2]
+    transcript_df = pd.DataFrame(data={
+        'transcript_index': list(range(1, len(speaker_list) + 1)),
+        'speaker': speaker_list,
+        'transcript': transcription_list
+    })
+
+    management_text = pages[1].extract_text()
+
+    transcript_df['speaker_type'] = transcript_df['speaker'].apply(lambda x: 'Management' if x.lower().replace(' ', '') in management_text.lower().replace(' ', '') else 'Question')
+    transcript_df.loc[transcript_df['speaker'].apply(lambda x: 'Moderator' in x), 'speaker'] = 'Moderator'
+    transcript_df.loc[transcript_df['speaker'].apply(lambda x: 'Moderator' in x), 'speaker_type'] = 'Moderator'
+    return transcript_df
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--processes", type=int, default=pdf_extract.PDF_PAGE_PROCESSES)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp()
+    transcript.PDF_TEXT_CACHE_DIR = cache_dir
+    filepaths = sorted(glob.glob(os.path.join(ROOT_DIR, "pdfs", "*.pdf")))
+
+    try:
+        print(f"{'file':<20} {'rows':>5} {'legacy s':>9} {'cold s':>9} {'warm ms':>9} {'match':>6}")
+        for filepath in filepaths:
+            legacy_df = preprocess_transcript_legacy(PdfReader(filepath))
+            legacy = timed(lambda: preprocess_transcript_legacy(PdfReader(filepath)), args.repeat)
+
+            def cold():
+                shutil.rmtree(cache_dir, ignore_errors=True)
+                return transcript.preprocess_transcript(transcript.load_transcript(filepath, "pypdf2"))
+
+            cold_time = timed(cold, args.repeat)
+            warm_df = transcript.preprocess_transcript(transcript.load_transcript(filepath, "pypdf2"))
+            warm = timed(lambda: transcript.preprocess_transcript(transcript.load_transcript(filepath, "pypdf2")), args.repeat)
+
+            match = legacy_df.equals(warm_df[legacy_df.columns])
+            print(f"{os.path.basename(filepath):<20} {len(warm_df):>5} {legacy:>9.3f} {cold_time:>9.3f} {warm * 1000:>9.2f} {str(match):>6}")
+
+        backends = [name for name in pdf_extract.AUTO_ORDER if name in pdf_extract.available_backends()]
+        print(f"\n{'file':<20} " + " ".join(f"{name + ' ' + mode:>16}" for name in backends for mode in ("inline s", "pool s")))
+        for filepath in filepaths:
+            cells = []
+            for name in backends:
+                inline = timed(lambda: pdf_extract.extract_text(filepath, name, processes=1), args.repeat)
+                # The first call starts the pool, the best of the repeats is with warm workers
+                pooled = timed(lambda: pdf_extract.extract_text(filepath, name, processes=args.processes), args.repeat)
+                cells += [inline, pooled]
+            print(f"{os.path.basename(filepath):<20} " + " ".join(f"{cell:>16.3f}" for cell in cells))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        pdf_extract.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Compare the per-section and structured summary modes against a stubbed Gemini client.
+
+The stub answers after a latency that grows with the prompt size, so the comparison covers
+both the number of calls and the input tokens they carry. --invalid drops fields from the
+structured reply to exercise the per-section fallback.
+
+Usage: python benchmarks/bench_summary_modes.py --pdf pdfs/titan_2025Q1.pdf --repeat 3 --invalid 1
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from types import SimpleNamespace
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# A throwaway database, so that the LLM response cache starts empty
+os.environ["SQLITE_FILE_NAME"] = os.path.join(tempfile.mkdtemp(prefix="bench_summary_"), "bench.db")
+os.environ.setdefault("GEMINI_API_KEY", "stub")
+
+import pandas as pd
+from sqlalchemy import delete
+from sqlmodel import Session
+
+import google_genai
+from db import engine, create_db_and_tables
+from models import LLMResponseCache
+from llm_cache import estimate_tokens, track_usage
+from summary import SUMMARY_MODES, run_summary
+from transcript import SECTION_QUERIES, load_transcript, preprocess_transcript
+
+
+class StubModels:
+    def __init__(self, base_latency: float, latency_per_1k_tokens: float, invalid: int):
+        self.base_latency = base_latency
+        self.latency_per_1k_tokens = latency_per_1k_tokens
+        self.invalid = invalid
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, model, contents, config=None):
+        with self._lock:
+            self.calls += 1
+        prompt_tokens = estimate_tokens(contents)
+        time.sleep(self.base_latency + self.latency_per_1k_tokens * prompt_tokens / 1000)
+
+        if config is None:
+            text = "- stub point one\n- stub point two"
+        else:
+            sections = {field: f"- stub {field}" for field in SECTION_QUERIES}
+            for field in list(sections)[:self.invalid]:
+                sections[field] = ""
+            text = json.dumps(sections)
+        usage = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=estimate_tokens(text))
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+def run_mode(transcript_df: pd.DataFrame, mode: str) -> dict:
+    with Session(engine) as session:
+        session.exec(delete(LLMResponseCache))
+        session.commit()
+
+    with track_usage() as usage:
+        sections = {result.section: result for result in run_summary(transcript_df, mode)}
+    stats = usage.as_dict()
+    stats["failed_sections"] = sorted(section for section, result in sections.items() if result.error is not None)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf", default=os.path.join(ROOT_DIR, "pdfs", "titan_2025Q1.pdf"))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--base-latency", type=float, default=0.5, help="Seconds per call")
+    parser.add_argument("--latency-per-1k-tokens", type=float, default=0.05, help="Extra seconds per 1k prompt tokens")
+    parser.add_argument("--invalid", type=int, default=0, help="Fields left empty in the structured reply")
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    transcript_df = preprocess_transcript(load_transcript(args.pdf))
+    print(f"{os.path.basename(args.pdf)}: {len(transcript_df)} speaker turns")
+
+    stub = StubModels(args.base_latency, args.latency_per_1k_tokens, args.invalid)
+    google_genai.CLIENT = SimpleNamespace(models=stub)
+
+    results = {}
+    for mode in SUMMARY_MODES:
+        runs = [run_mode(transcript_df, mode) for _ in range(args.repeat)]
+        results[mode] = runs[-1]
+        results[mode]["elapsed_seconds"] = min(run["elapsed_seconds"] for run in runs)
+        print(f"{mode:>10}: {results[mode]}")
+
+    sections, structured = results["sections"], results["structured"]
+    print(
+        f"structured vs sections: {sections['prompt_tokens'] / max(1, structured['prompt_tokens']):.1f}x fewer input tokens, "
+        f"{sections['elapsed_seconds'] / max(1e-9, structured['elapsed_seconds']):.1f}x faster"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""Record upstream responses to fixtures and replay them in-process with injected latency.
+
+The fakes replace yf.download, yf.Lookup, google_genai.fetch_response and mistral.parse_pdf, so
+every backend path runs offline. Fixture layout under --fixtures:
+
+    prices/<TICKER>.csv   daily bars as yf.download returns them
+    lookup.json           quote rows served by yf.Lookup(query).get_stock()
+    llm.json              {"responses": {prompt_hash: text}, "samples": [text, ...]}
+    ocr/<pdf stem>.json   parse_pdf output, without the page images
+
+Usage:
+    python benchmarks/replay.py --source db      # from database.db, the NIFTY 500 CSV and ./pdfs
+    python benchmarks/replay.py --source live    # from yfinance and Mistral (needs network and keys)
+"""
+import os
+import sys
+import glob
+import json
+import time
+import random
+import argparse
+import threading
+from types import SimpleNamespace
+from typing import Callable, Optional, get_args, get_origin
+
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+DEFAULT_FIXTURES_DIR = os.path.join(ROOT_DIR, "benchmarks", "fixtures")
+
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+LOOKUP_QUERIES = ["HDFC", "TITAN", "RELIANCE", "TATA", "INFY", "BANK", "ADANI", "BAJAJ"]
+SERVICES = ["yfinance", "gemini", "mistral"]
+
+
+class InjectedLatency:
+    # Sleeps for each service's mean latency, +/- jitter (a fraction of it), plus a per-1k-prompt-token cost
+
+    def __init__(self, means: Optional[dict[str, float]] = None, jitter: float = 0.0, per_1k_tokens: float = 0.0, seed: int = 0):
+        self.means = means or {}
+        self.jitter = jitter
+        self.per_1k_tokens = per_1k_tokens
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, specs: list[str], **kwargs) -> "InjectedLatency":
+        # "gemini=1.5" style specs, in seconds
+        means = {}
+        for spec in specs:
+            service, _, seconds = spec.partition("=")
+            if service not in SERVICES or not seconds:
+                raise ValueError(f"Invalid latency {spec!r}, expected SERVICE=SECONDS with SERVICE one of {SERVICES}")
+            means[service] = float(seconds)
+        return cls(means, **kwargs)
+
+    def sleep(self, service: str, prompt_tokens: int = 0):
+        with self._lock:
+            factor = 1 + self._rng.uniform(-self.jitter, self.jitter)
+        seconds = self.means.get(service, 0.0) * factor
+        if service == "gemini":
+            seconds += self.per_1k_tokens * prompt_tokens / 1000
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class Fixtures:
+    def __init__(self, path: str = DEFAULT_FIXTURES_DIR, shift_dates: bool = True):
+        if not os.path.isdir(path):
+            raise FileNotFoundError(f"No fixtures in {path}, record them with benchmarks/replay.py first")
+        self.path = path
+        self.prices = {}
+        for filepath in glob.glob(os.path.join(path, "prices", "*.csv")):
+            df = pd.read_csv(filepath, parse_dates=["Date"]).set_index("Date")
+            if shift_dates and not df.empty:
+                # Whole weeks, so that the last bar lands on the latest trading day and weekdays stay weekdays
+                weeks = (pd.Timestamp.now().normalize() - df.index.max()).days // 7
+                df.index = df.index + pd.Timedelta(weeks=weeks)
+            self.prices[os.path.basename(filepath)[:-4]] = df
+        self.lookup = _read_json(os.path.join(path, "lookup.json"), [])
+        llm = _read_json(os.path.join(path, "llm.json"), {})
+        self.llm_responses = llm.get("responses", {})
+        self.llm_samples = llm.get("samples", []) or ["- Revenue grew in the quarter.\n- Margins were stable.\n- Guidance was maintained."]
+        self.ocr_dir = os.path.join(path, "ocr")
+
+    @property
+    def tickers(self) -> list[str]:
+        return sorted(self.prices)
+
+    def history(self, ticker: str, period: Optional[str] = None, start=None, end=None) -> pd.DataFrame:
+        from prices import period_start
+
+        df = self.prices.get(ticker)
+        if df is None:
+            return pd.DataFrame(columns=PRICE_COLUMNS)
+        begin = pd.Timestamp(start) if start is not None else (period_start(period) if period else None)
+        if begin is not None:
+            df = df[df.index >= begin]
+        if end is not None:
+            df = df[df.index < pd.Timestamp(end)]
+        return df
+
+    def llm_text(self, key_hash: str) -> str:
+        if key_hash in self.llm_responses:
+            return self.llm_responses[key_hash]
+        return self.llm_samples[int(key_hash[:8], 16) % len(self.llm_samples)]
+
+    def ocr(self, filepath: str) -> dict:
+        fixture = os.path.join(self.ocr_dir, os.path.splitext(os.path.basename(filepath))[0] + ".json")
+        if os.path.exists(fixture):
+            return _read_json(fixture, {})
+        return _ocr_from_text(filepath)
+
+
+def _read_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def _ocr_from_text(filepath: str) -> dict:
+    # Stand-in OCR output shaped like Mistral's, built from the PDF's text layer
+    from transcript import extract_pages
+
+    pages = [{"index": idx, "markdown": text, "images": [], "dimensions": None} for idx, text in enumerate(extract_pages(filepath))]
+    return {"pages": pages, "model": "mistral-ocr-latest", "usage_info": {"pages_processed": len(pages)}}
+
+
+def _stub_value(annotation, samples: list[str], idx: int):
+    # Smallest value of the annotated type that passes validation, strings are taken from the samples
+    origin = get_origin(annotation)
+    if origin is list:
+        return []
+    if origin is not None and str(origin).endswith("Literal"):
+        return get_args(annotation)[0]
+    if annotation in (int, float):
+        return 0
+    if isinstance(annotation, type) and hasattr(annotation, "model_fields"):
+        return _stub_structured(annotation, samples)
+    return samples[idx % len(samples)]
+
+
+def _stub_structured(schema: type, samples: list[str]) -> dict:
+    return {name: _stub_value(field.annotation, samples, idx) for idx, (name, field) in enumerate(schema.model_fields.items())}
+
+
+def install(fixtures: Fixtures, latency: Optional[InjectedLatency] = None) -> Callable[[], None]:
+    # Patches the upstream entry points in place and returns a function that restores them
+    import yfinance as yf
+    import google_genai
+    import llm_cache
+    import mistral
+    from metrics import timed
+
+    latency = latency or InjectedLatency()
+
+    def download(tickers, period=None, start=None, end=None, **kwargs):
+        latency.sleep("yfinance")
+        if isinstance(tickers, str):
+            return fixtures.history(tickers, period, start, end)
+        frames = {ticker: fixtures.history(ticker, period, start, end) for ticker in tickers}
+        frames = {ticker: df for ticker, df in frames.items() if not df.empty}
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1).swaplevel(0, 1, axis=1)
+
+    class Lookup:
+        def __init__(self, query: str, **kwargs):
+            self.query = query.lower()
+
+        def get_stock(self, count: int = 25) -> pd.DataFrame:
+            latency.sleep("yfinance")
+            rows = [row for row in fixtures.lookup if self.query in row["symbol"].lower() or self.query in str(row.get("shortName", "")).lower()]
+            return pd.DataFrame(rows[:count], columns=["symbol", "shortName", "exchange", "quoteType"]).set_index("symbol")
+
+    def fetch_response(prompt: str, model: str = google_genai.DEFAULT_MODEL, response_schema: Optional[type] = None):
+        prompt_tokens = llm_cache.estimate_tokens(prompt)
+        with timed("gemini", "generate_content"):
+            latency.sleep("gemini", prompt_tokens)
+        key_hash = llm_cache.prompt_hash(llm_cache.response_cache_key(prompt, response_schema))
+        text = fixtures.llm_text(key_hash)
+        if response_schema is not None and key_hash not in fixtures.llm_responses:
+            text = json.dumps(_stub_structured(response_schema, fixtures.llm_samples))
+        usage = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=llm_cache.estimate_tokens(text))
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def parse_pdf(filepath: str, json: bool = True) -> dict:
+        with timed("mistral", "ocr"):
+            latency.sleep("mistral")
+            return fixtures.ocr(filepath)
+
+    patches = [
+        (yf, "download", download),
+        (yf, "Lookup", Lookup),
+        (google_genai, "fetch_response", fetch_response),
+        (llm_cache, "fetch_response", fetch_response),
+        (mistral, "parse_pdf", parse_pdf),
+    ]
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, fake in patches:
+        setattr(module, name, fake)
+
+    def restore():
+        for module, name, original in originals:
+            setattr(module, name, original)
+
+    return restore
+
+
+def record_from_db(out_dir: str, db_path: str):
+    # Offline fixtures: prices and any cached model replies from a database file, quotes from the NIFTY 500 CSV
+    import sqlite3
+    from universe import load_ticker_index
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    prices_df = pd.read_sql_query("SELECT ticker, date, open, high, low, close, adj_close, volume FROM stockdailyprice ORDER BY ticker, date", conn, parse_dates=["date"])
+    for ticker, df in prices_df.groupby("ticker"):
+        _write_prices(out_dir, ticker, df.drop(columns="ticker").rename(columns={
+            "date": "Date", "open": "Open", "high": "High", "low": "Low", "close": "Close", "adj_close": "Adj Close", "volume": "Volume",
+        }))
+
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    responses = {}
+    if "llmresponsecache" in tables:
+        responses = dict(conn.execute("SELECT prompt_hash, response FROM llmresponsecache"))
+    samples = []
+    if "stocktranscriptsummary" in tables:
+        for row in conn.execute("SELECT * FROM stocktranscriptsummary"):
+            samples.extend(value for value in row[2:] if value)
+    conn.close()
+    _write_json(os.path.join(out_dir, "llm.json"), {"responses": responses, "samples": samples})
+
+    index = load_ticker_index(os.path.join(ROOT_DIR, "MW-NIFTY-500-27-Aug-2025.csv"))
+    _write_json(os.path.join(out_dir, "lookup.json"), [
+        {"symbol": f"{symbol}.NS", "shortName": name, "exchange": "NSI", "quoteType": "equity"}
+        for symbol, name in zip(index.symbols, index.names)
+    ])
+    print(f"Recorded {prices_df['ticker'].nunique()} tickers, {len(responses)} model replies, {len(samples)} sample replies, {len(index.symbols)} quotes")
+
+
+def record_live(out_dir: str, tickers: list[str], queries: list[str], ocr: bool):
+    import yfinance as yf
+
+    for ticker in tickers:
+        df = yf.download(ticker, period="max", interval="1d", progress=False, auto_adjust=False)
+        df.columns = [col[0] if isinstance(col, tuple) else col for col in df.columns]
+        _write_prices(out_dir, ticker, df.reset_index())
+
+    rows = {}
+    for query in queries:
+        for row in yf.Lookup(query).get_stock(count=250).reset_index().to_dict(orient="records"):
+            rows[row["symbol"]] = {key: row.get(key) for key in ("symbol", "shortName", "exchange", "quoteType")}
+    _write_json(os.path.join(out_dir, "lookup.json"), list(rows.values()))
+
+    if ocr:
+        import mistral
+
+        for filepath in sorted(glob.glob(os.path.join(ROOT_DIR, "pdfs", "*.pdf"))):
+            response = mistral.parse_pdf(filepath)
+            for page in response.get("pages", []):
+                page["images"] = []
+            _write_json(os.path.join(out_dir, "ocr", os.path.splitext(os.path.basename(filepath))[0] + ".json"), response)
+    print(f"Recorded {len(tickers)} tickers and {len(rows)} quotes")
+
+
+def _write_prices(out_dir: str, ticker: str, df: pd.DataFrame):
+    os.makedirs(os.path.join(out_dir, "prices"), exist_ok=True)
+    df[["Date"] + PRICE_COLUMNS].to_csv(os.path.join(out_dir, "prices", f"{ticker}.csv"), index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", choices=["db", "live"], default="db")
+    parser.add_argument("--out", default=DEFAULT_FIXTURES_DIR)
+    parser.add_argument("--db", default=os.path.join(ROOT_DIR, "database.db"), help="Database to record from with --source db")
+    parser.add_argument("--tickers", nargs="+", default=["HDFCBANK.NS", "TITAN.NS", "RELIANCE.NS"], help="Tickers to download with --source live")
+    parser.add_argument("--queries", nargs="+", default=LOOKUP_QUERIES, help="Lookup queries to record with --source live")
+    parser.add_argument("--ocr", action="store_true", help="Also OCR every PDF in ./pdfs with Mistral (--source live)")
+    args = parser.parse_args()
+
+    if args.source == "db":
+        record_from_db(args.out, args.db)
+    else:
+        record_live(args.out, args.tickers, args.queries, args.ocr)
+
+
+if __name__ == "__main__":
+    main()
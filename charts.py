@@ -0,0 +1,136 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+
+from models import StockDailyPrice
+from metrics import count_cache
+
+RESOLUTION_AUTO = "auto"
+
+# Bucket of each resolution, as a pandas period frequency (None keeps daily bars)
+RESOLUTIONS = {
+    "1d": None,
+    "1wk": "W-FRI",
+    "1mo": "M",
+}
+
+# Number of (ticker, period, resolution, points) series kept in memory
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "256"))
+
+_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def prices_to_df(sdp_list: list[StockDailyPrice]) -> pd.DataFrame:
+    df = pd.DataFrame(
+        [(sdp.date, sdp.open, sdp.high, sdp.low, sdp.close, sdp.adj_close, sdp.volume) for sdp in sdp_list],
+        columns=["date", "open", "high", "low", "close", "adj_close", "volume"],
+    )
+    df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+def resample_ohlcv(df: pd.DataFrame, resolution: str) -> pd.DataFrame:
+    # Bars are labelled with the first trading day of their bucket
+    freq = RESOLUTIONS[resolution]
+    if freq is None or df.empty:
+        return df.reset_index(drop=True)
+
+    buckets = df["date"].dt.to_period(freq)
+    return df.groupby(buckets, sort=True).agg(
+        date=("date", "first"),
+        open=("open", "first"),
+        high=("high", "max"),
+        low=("low", "min"),
+        close=("close", "last"),
+        adj_close=("adj_close", "last"),
+        volume=("volume", "sum"),
+    ).reset_index(drop=True)
+
+
+def choose_resolution(df: pd.DataFrame, points: int) -> str:
+    # Finest resolution whose bar count fits in the requested number of points
+    for resolution in RESOLUTIONS:
+        freq = RESOLUTIONS[resolution]
+        bars = len(df) if freq is None else df["date"].dt.to_period(freq).nunique()
+        if bars <= points:
+            return resolution
+    return list(RESOLUTIONS)[-1]
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets: indices of the points that best keep the visual shape of the line
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        # The next bucket is represented by its average point
+        avg_x = x[end:next_end].mean() if next_end > end else x[-1]
+        avg_y = y[end:next_end].mean() if next_end > end else y[-1]
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def _columns(df: pd.DataFrame, fields: list[str]) -> dict:
+    columns = {field: df[field].tolist() for field in fields}
+    columns["date"] = [d.date().isoformat() for d in df["date"]]
+    return columns
+
+
+def build_chart_series(df: pd.DataFrame, resolution: str, points: int) -> dict:
+    if resolution == RESOLUTION_AUTO:
+        resolution = choose_resolution(df, points)
+    bars = resample_ohlcv(df, resolution)
+
+    # The close line keeps daily detail, reduced to at most `points` points
+    x = df["date"].to_numpy(dtype="datetime64[s]").astype(np.float64)
+    y = df["close"].to_numpy(dtype=np.float64)
+    line = df.iloc[lttb(x, y, points)]
+
+    return {
+        "resolution": resolution,
+        "rows": len(df),
+        "bars": _columns(bars, ["date", "open", "high", "low", "close", "volume"]),
+        "line": _columns(line, ["date", "close"]),
+    }
+
+
+def get_chart_series(ticker: str, period: str, resolution: str, points: int, sdp_list: list[StockDailyPrice]) -> dict:
+    # Cached per (ticker, period, resolution, points), invalidated when the stored rows change
+    if resolution != RESOLUTION_AUTO and resolution not in RESOLUTIONS:
+        raise ValueError(f"Unsupported resolution {resolution!r}, expected one of {[RESOLUTION_AUTO] + list(RESOLUTIONS)}")
+
+    key = (ticker, period, resolution, points)
+    version = (len(sdp_list), sdp_list[-1].date, sdp_list[-1].close) if sdp_list else None
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            _cache.move_to_end(key)
+            count_cache("chart", hit=True)
+            return cached[1]
+    count_cache("chart", hit=False)
+
+    series = {"ticker": ticker, "period": period, **build_chart_series(prices_to_df(sdp_list), resolution, points)}
+
+    with _cache_lock:
+        _cache[key] = (version, series)
+        _cache.move_to_end(key)
+        while len(_cache) > CHART_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return series
@@ -1,11 +1,81 @@
 import os
-from sqlmodel import SQLModel, create_engine
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 sqlite_file_name = os.getenv('SQLITE_FILE_NAME')
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, echo=True, connect_args=connect_args)
+SQLITE_ECHO = os.getenv("SQLITE_ECHO", "false").lower() in ("1", "true", "yes")
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "10"))
+SQLITE_MAX_OVERFLOW = int(os.getenv("SQLITE_MAX_OVERFLOW", "20"))
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", str(64 * 1024)))
+
+
+def create_sqlite_engine(
+    url: str = sqlite_url,
+    echo: bool = SQLITE_ECHO,
+    pool_size: int = SQLITE_POOL_SIZE,
+    max_overflow: int = SQLITE_MAX_OVERFLOW,
+    busy_timeout: float = SQLITE_BUSY_TIMEOUT,
+    journal_mode: str = SQLITE_JOURNAL_MODE,
+    synchronous: str = SQLITE_SYNCHRONOUS,
+    mmap_size: int = SQLITE_MMAP_SIZE,
+    cache_size_kib: int = SQLITE_CACHE_SIZE_KIB,
+) -> Engine:
+    # WAL lets readers run alongside a writer, NORMAL sync is durable enough with WAL
+    connect_args = {"check_same_thread": False, "timeout": busy_timeout}
+    sqlite_engine = create_engine(
+        url,
+        echo=echo,
+        connect_args=connect_args,
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+    )
+
+    @event.listens_for(sqlite_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA mmap_size={mmap_size}")
+        cursor.execute(f"PRAGMA cache_size=-{cache_size_kib}")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    return sqlite_engine
+
+
+engine = create_sqlite_engine()
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+
+
+def bulk_upsert(session: Session, model: type[SQLModel], records: list[dict], update: bool = False) -> int:
+    # Insert all records with one executemany statement, skipping or overwriting primary key conflicts
+    if not records:
+        return 0
+
+    table = model.__table__
+    pk_cols = [col.name for col in table.primary_key.columns]
+    stmt = sqlite_insert(table)
+    if update:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=pk_cols,
+            set_={col.name: stmt.excluded[col.name] for col in table.columns if col.name not in pk_cols},
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=pk_cols)
+
+    session.execute(stmt, records)
+    session.commit()
+    return len(records)
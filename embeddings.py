@@ -0,0 +1,213 @@
+import os
+import re
+import zlib
+import hashlib
+import threading
+import numpy as np
+from typing import Optional
+
+from metrics import count_cache, timed
+
+# hashing: dependency-free local CPU embedding; sentence_transformers: local model; gemini: embedding API
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "")
+EMBEDDING_DIR = os.getenv("EMBEDDING_DIR", "./.cache/embeddings")
+
+# Indexes with at least this many segments get an inverted-file (IVF) index, smaller ones are scanned
+ANN_MIN_ROWS = int(os.getenv("ANN_MIN_ROWS", "1024"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+class HashingEmbedder:
+    # Feature-hashed unigrams and bigrams with sublinear term frequency, L2-normalized
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = TOKEN_PATTERN.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            if not features:
+                continue
+            # crc32 rather than hash(), which is salted per process
+            buckets = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+            # The top bit picks the sign so colliding features tend to cancel rather than pile up
+            np.add.at(vectors[row], buckets % self.dim, np.where(buckets >> 31, -1.0, 1.0))
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        return _normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    # Optional dependency, only imported when this backend is selected
+
+    name = "sentence_transformers"
+
+    def __init__(self, model: str = ""):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model or "all-MiniLM-L6-v2", device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        return _normalize(self.model.encode(texts, batch_size=64, convert_to_numpy=True).astype(np.float32))
+
+
+class GeminiEmbedder:
+    name = "gemini"
+    batch_size = 100
+
+    def __init__(self, model: str = ""):
+        self.model = model or "gemini-embedding-001"
+        self.dim = None
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        import google_genai
+
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            with timed("gemini", "embed_content"):
+                result = google_genai.CLIENT.models.embed_content(model=self.model, contents=texts[start:start + self.batch_size])
+            vectors.extend(embedding.values for embedding in result.embeddings)
+        return _normalize(np.asarray(vectors, dtype=np.float32))
+
+
+EMBEDDERS = {
+    HashingEmbedder.name: HashingEmbedder,
+    SentenceTransformerEmbedder.name: SentenceTransformerEmbedder,
+    GeminiEmbedder.name: GeminiEmbedder,
+}
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            if EMBEDDING_BACKEND not in EMBEDDERS:
+                raise ValueError(f"Unknown embedding backend {EMBEDDING_BACKEND!r}, expected one of {list(EMBEDDERS)}")
+            embedder_cls = EMBEDDERS[EMBEDDING_BACKEND]
+            _embedder = embedder_cls(EMBEDDING_MODEL) if EMBEDDING_MODEL and embedder_cls is not HashingEmbedder else embedder_cls()
+        return _embedder
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    # Spherical k-means on unit vectors, returns centroids and the list each vector belongs to
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)]
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(k):
+            members = vectors[assignments == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+def content_hash(ids: list[int], texts: list[str]) -> str:
+    # Digest of the indexed segments in id order, any edited turn changes it
+    digest = hashlib.sha256()
+    for idx, text in sorted(zip((int(i) for i in ids), texts)):
+        digest.update(f"{idx}\0{text}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SegmentIndex:
+    # Unit-norm float32 vectors of one ticker/quarter, keyed by transcript_index
+
+    def __init__(self, ids: np.ndarray, vectors: np.ndarray, backend: str, centroids: Optional[np.ndarray] = None, assignments: Optional[np.ndarray] = None, content_hash: str = ""):
+        self.ids = ids
+        self.vectors = vectors
+        self.backend = backend
+        self.centroids = centroids
+        self.assignments = assignments
+        self.content_hash = content_hash
+
+    @classmethod
+    def build(cls, ids: list[int], vectors: np.ndarray, backend: str, content_hash: str = "") -> "SegmentIndex":
+        ids = np.asarray(ids, dtype=np.int32)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(vectors) < ANN_MIN_ROWS:
+            return cls(ids, vectors, backend, content_hash=content_hash)
+        centroids, assignments = _kmeans(vectors, int(np.sqrt(len(vectors))))
+        return cls(ids, vectors, backend, centroids, assignments.astype(np.int32), content_hash)
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = ANN_NPROBE) -> tuple[np.ndarray, np.ndarray]:
+        # Cosine similarity; with an IVF index only the nprobe closest lists are scanned
+        candidates = np.arange(len(self.ids))
+        if self.centroids is not None:
+            lists = np.argsort(-(self.centroids @ query))[:nprobe]
+            candidates = np.flatnonzero(np.isin(self.assignments, lists))
+        scores = self.vectors[candidates] @ query
+        top = np.argsort(-scores, kind="stable")[:k]
+        return self.ids[candidates[top]], scores[top]
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {"ids": self.ids, "vectors": self.vectors, "backend": np.array(self.backend), "content_hash": np.array(self.content_hash)}
+        if self.centroids is not None:
+            arrays.update(centroids=self.centroids, assignments=self.assignments)
+        # Unique per writer, concurrent first requests for one quarter may both build its index
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SegmentIndex":
+        with np.load(path) as data:
+            return cls(
+                data["ids"], data["vectors"], str(data["backend"]),
+                data["centroids"] if "centroids" in data else None,
+                data["assignments"] if "assignments" in data else None,
+                str(data["content_hash"]) if "content_hash" in data else "",
+            )
+
+
+def index_path(ticker: str, quarter: str) -> str:
+    return os.path.join(EMBEDDING_DIR, get_embedder().name, f"{ticker}_{quarter}.npz")
+
+
+_indexes: dict[str, tuple[float, SegmentIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def build_segment_index(ticker: str, quarter: str, ids: list[int], texts: list[str]) -> SegmentIndex:
+    # Embeds every speaker turn once and persists the index next to the others
+    embedder = get_embedder()
+    index = SegmentIndex.build(ids, embedder.embed(texts), embedder.name, content_hash(ids, texts))
+    index.save(index_path(ticker, quarter))
+    return index
+
+
+def get_segment_index(ticker: str, quarter: str) -> Optional[SegmentIndex]:
+    path = index_path(ticker, quarter)
+    if not os.path.exists(path):
+        count_cache("embedding_index", hit=False)
+        return None
+    mtime = os.path.getmtime(path)
+    with _indexes_lock:
+        cached = _indexes.get(path)
+        if cached is not None and cached[0] == mtime:
+            count_cache("embedding_index", hit=True)
+            return cached[1]
+    index = SegmentIndex.load(path)
+    with _indexes_lock:
+        _indexes[path] = (mtime, index)
+    count_cache("embedding_index", hit=True)
+    return index
+
+
+def embed_query(text: str) -> np.ndarray:
+    return get_embedder().embed([text])[0]
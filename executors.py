@@ -0,0 +1,167 @@
+import os
+import asyncio
+import multiprocessing
+import threading
+from contextvars import copy_context
+from typing import Any, AsyncIterator, Callable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+
+# Start method of worker processes. The server forks from a process full of threads (executors, ingestion
+# workers, the SQLAlchemy pool), and a forked child can deadlock on a lock that was copied while held.
+PROCESS_START_METHOD = os.getenv("PROCESS_START_METHOD", "forkserver")
+
+
+def process_pool(max_workers: int) -> ProcessPoolExecutor:
+    method = PROCESS_START_METHOD if PROCESS_START_METHOD in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+
+
+class Overloaded(Exception):
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} executor is at capacity, retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    # A worker pool that rejects new work once max_workers + max_pending tasks are admitted,
+    # instead of queueing without limit
+
+    def __init__(self, name: str, max_workers: int, max_pending: int, process: bool = False, retry_after: int = 1):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.process = process
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._admitted = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self) -> Executor:
+        # Pools are created lazily so that importing this module never spawns workers
+        with self._lock:
+            if self._executor is None:
+                if self.process:
+                    self._executor = process_pool(self.max_workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            return self._executor
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise Overloaded(self.name, self.retry_after)
+        with self._lock:
+            self._admitted += 1
+
+    def _release(self):
+        with self._lock:
+            self._admitted -= 1
+        self._slots.release()
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        self._acquire()
+        if not self.process:
+            # Threads run in a copy of the caller's context, so request-scoped profiling follows the work
+            fn, args = copy_context().run, (fn, *args)
+        try:
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is held until the work itself finishes, even if the caller goes away
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def stream(self, gen_fn: Callable[..., Iterator], *args, **kwargs) -> AsyncIterator:
+        # Drains a blocking generator on a worker thread; admission happens now, before any response is sent
+        if self.process:
+            raise ValueError("stream() needs a thread pool executor")
+        self._acquire()
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        end_of_stream = object()
+
+        def produce():
+            try:
+                for item in gen_fn(*args, **kwargs):
+                    loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+            except BaseException as exc:  # noqa: BLE001
+                loop.call_soon_threadsafe(queue.put_nowait, (None, exc))
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, (end_of_stream, None))
+                self._release()
+
+        try:
+            self._get_executor().submit(copy_context().run, produce)
+        except BaseException:
+            self._release()
+            raise
+
+        async def consume():
+            while True:
+                item, exc = await queue.get()
+                if exc is not None:
+                    raise exc
+                if item is end_of_stream:
+                    return
+                yield item
+
+        return consume()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# yfinance downloads and lookups
+MARKET_DATA_EXECUTOR = BoundedExecutor(
+    "market_data",
+    max_workers=int(os.getenv("MARKET_DATA_WORKERS", "8")),
+    max_pending=int(os.getenv("MARKET_DATA_MAX_PENDING", "32")),
+)
+
+# PDF transcript loads; page extraction fans out to pdf_extract's process pool, OCR waits on the network
+PDF_EXECUTOR = BoundedExecutor(
+    "pdf",
+    max_workers=int(os.getenv("PDF_WORKERS", "2")),
+    max_pending=int(os.getenv("PDF_MAX_PENDING", "8")),
+)
+
+# Summary generations, each fans out to SUMMARY_CONCURRENCY model calls of its own
+LLM_EXECUTOR = BoundedExecutor(
+    "llm",
+    max_workers=int(os.getenv("LLM_WORKERS", "4")),
+    max_pending=int(os.getenv("LLM_MAX_PENDING", "8")),
+    retry_after=30,
+)
+
+# Backtest requests; large parameter sweeps fan out further to backtest's own process pool
+BACKTEST_EXECUTOR = BoundedExecutor(
+    "backtest",
+    max_workers=int(os.getenv("BACKTEST_WORKERS", "2")),
+    max_pending=int(os.getenv("BACKTEST_MAX_PENDING", "4")),
+    retry_after=10,
+)
+
+EXECUTORS = [MARKET_DATA_EXECUTOR, PDF_EXECUTOR, LLM_EXECUTOR, BACKTEST_EXECUTOR]
+
+
+def shutdown_executors():
+    for executor in EXECUTORS:
+        executor.shutdown()
@@ -0,0 +1,112 @@
+import io
+import gzip
+import json
+import pyarrow as pa
+from typing import Optional
+from fastapi import HTTPException, Request, Response
+
+from models import StockDailyPrice
+
+FORMAT_JSON = "json"
+FORMAT_COLUMNS = "columns"
+FORMAT_ARROW = "arrow"
+
+MEDIA_TYPES = {
+    FORMAT_JSON: "application/json",
+    FORMAT_COLUMNS: "application/vnd.stock.columns+json",
+    FORMAT_ARROW: "application/vnd.apache.arrow.stream",
+}
+
+ENCODINGS = ["zstd", "gzip"]
+
+# Every /fetch response varies on these, shared caches must not serve one format for another
+VARY = "Accept, Accept-Encoding"
+
+PRICE_FIELDS = ["date", "open", "high", "low", "close", "adj_close", "volume"]
+
+PRICE_SCHEMA = pa.schema([
+    ("ticker", pa.dictionary(pa.int32(), pa.string())),
+    ("date", pa.timestamp("s")),
+    ("open", pa.float64()),
+    ("high", pa.float64()),
+    ("low", pa.float64()),
+    ("close", pa.float64()),
+    ("adj_close", pa.float64()),
+    ("volume", pa.int64()),
+])
+
+
+def negotiate_format(request: Request, format: Optional[str] = None) -> str:
+    # An explicit ?format= wins over the Accept header, plain JSON is the default
+    if format is not None:
+        if format not in MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unsupported format {format!r}, expected one of {sorted(MEDIA_TYPES)}")
+        return format
+
+    accept = request.headers.get("accept", "")
+    for fmt in (FORMAT_ARROW, FORMAT_COLUMNS):
+        if MEDIA_TYPES[fmt] in accept:
+            return fmt
+    return FORMAT_JSON
+
+
+def negotiate_encoding(request: Request) -> Optional[str]:
+    accept_encoding = [e.split(";")[0].strip() for e in request.headers.get("accept-encoding", "").split(",")]
+    return next((encoding for encoding in ENCODINGS if encoding in accept_encoding), None)
+
+
+def prices_to_table(sdp_list: list[StockDailyPrice]) -> pa.Table:
+    columns = {field: [getattr(sdp, field) for sdp in sdp_list] for field in ["ticker"] + PRICE_FIELDS}
+    return pa.Table.from_pydict(
+        {"ticker": pa.array(columns["ticker"], pa.string()).dictionary_encode(), **{f: columns[f] for f in PRICE_FIELDS}},
+        schema=PRICE_SCHEMA,
+    )
+
+
+def to_columns_json(ticker: str, sdp_list: list[StockDailyPrice]) -> bytes:
+    # Ticker once, one array per field instead of one object per row
+    columns = {field: [getattr(sdp, field) for sdp in sdp_list] for field in PRICE_FIELDS}
+    columns["date"] = [d.isoformat() for d in columns["date"]]
+    return json.dumps({"ticker": ticker, "count": len(sdp_list), "columns": columns}, separators=(",", ":")).encode("utf-8")
+
+
+def to_arrow_ipc(table: pa.Table, compression: Optional[str] = None) -> bytes:
+    sink = io.BytesIO()
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def compress_body(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    if encoding == "zstd":
+        return pa.compress(body, codec="zstd", asbytes=True)
+    return body
+
+
+def price_history_response(request: Request, response: Response, ticker: str, sdp_list: list[StockDailyPrice], format: Optional[str] = None):
+    # response is the endpoint's own, its headers are kept when the default JSON is returned as a list
+    fmt = negotiate_format(request, format)
+    encoding = negotiate_encoding(request)
+    if fmt == FORMAT_JSON and encoding is None:
+        response.headers["Vary"] = VARY
+        return sdp_list
+
+    headers = {"Vary": VARY}
+    if fmt == FORMAT_ARROW:
+        # Arrow compresses its own buffers, readers decompress transparently
+        body = to_arrow_ipc(prices_to_table(sdp_list), compression=encoding and "zstd")
+        return Response(content=body, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+    if fmt == FORMAT_COLUMNS:
+        body = to_columns_json(ticker, sdp_list)
+    else:
+        body = json.dumps([sdp.model_dump(mode="json") for sdp in sdp_list], separators=(",", ":")).encode("utf-8")
+
+    if encoding is not None:
+        body = compress_body(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=MEDIA_TYPES[fmt], headers=headers)
+
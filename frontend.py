@@ -1,5 +1,6 @@
 import requests
 import pandas as pd
+import pyarrow as pa
 import streamlit as st
 import plotly.express as px
 
@@ -14,14 +15,78 @@ st.header("Search a stock ticker from NIFTY 500 from NSE")
 base_api_url = 'http://127.0.0.1:8000'
 search_api_url = f'{base_api_url}/search'
 fetch_api_url = f'{base_api_url}/fetch'
+chart_api_url = f'{base_api_url}/chart'
 transcript_all_api_url = f'{base_api_url}/transcript/all'
 transcript_api_url = f'{base_api_url}/transcript'
 summary_api_url = f'{base_api_url}/summary'
 
-search_query = st.text_input("Search:", value="", key="search_input")
-search_api_query_url = f'{search_api_url}?query={search_query}'
-resp = requests.get(search_api_query_url)
-ticker_list = resp.json()
+# Seconds each kind of API response is reused across reruns before it is fetched again
+SEARCH_TTL = 3600
+PRICE_TTL = 300
+TRANSCRIPT_LIST_TTL = 600
+TRANSCRIPT_TTL = 3600
+SUMMARY_TTL = 3600
+
+# Queries shorter than this are not sent to the backend
+MIN_SEARCH_LENGTH = 2
+
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    # One keep-alive connection pool shared by every rerun and browser session
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=2)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def api_get(url: str, **params) -> requests.Response:
+    # Failed calls raise, so they are never cached and the next rerun retries them
+    resp = get_http_session().get(url, params=params, timeout=300)
+    resp.raise_for_status()
+    return resp
+
+
+@st.cache_data(ttl=SEARCH_TTL, max_entries=1000, show_spinner=False)
+def search_tickers(query: str) -> list[str]:
+    return api_get(search_api_url, query=query).json()
+
+
+@st.cache_data(ttl=PRICE_TTL, max_entries=100, show_spinner=False)
+def fetch_prices(ticker: str, period: str) -> pd.DataFrame:
+    # Arrow IPC stream, already sorted by date on the server
+    resp = api_get(fetch_api_url, ticker=ticker, period=period, format='arrow')
+    sdp_df = pa.ipc.open_stream(resp.content).read_all().to_pandas()
+    sdp_df = sdp_df[['ticker', 'date', 'open', 'high', 'low', 'close', 'adj_close', 'volume']]
+    sdp_df['date'] = sdp_df['date'].dt.date
+    return sdp_df
+
+
+@st.cache_data(ttl=PRICE_TTL, max_entries=100, show_spinner=False)
+def fetch_chart(ticker: str, points: int) -> dict:
+    return api_get(chart_api_url, ticker=ticker, points=points).json()
+
+
+@st.cache_data(ttl=TRANSCRIPT_LIST_TTL, max_entries=100, show_spinner=False)
+def list_quarters(ticker: str) -> list[str]:
+    return sorted(api_get(transcript_all_api_url, ticker=ticker).json(), reverse=True)
+
+
+@st.cache_data(ttl=TRANSCRIPT_TTL, max_entries=50, show_spinner=False)
+def fetch_transcript(ticker: str, quarter: str) -> pd.DataFrame:
+    return pd.DataFrame(api_get(transcript_api_url, ticker=ticker, quarter=quarter).json())
+
+
+@st.cache_data(ttl=SUMMARY_TTL, max_entries=50, show_spinner="Summarizing the call transcript...")
+def fetch_summary(ticker: str, quarter: str) -> dict:
+    return api_get(summary_api_url, ticker=ticker, quarter=quarter).json()
+
+
+search_input = st.text_input("Search:", value="", key="search_input")
+# Normalized so that case and whitespace variants of a query share one cached backend call
+search_query = ' '.join(search_input.split()).lower()
+ticker_list = search_tickers(search_query) if len(search_query) >= MIN_SEARCH_LENGTH else []
 
 if search_query and ticker_list:
     selected_ticker = st.selectbox(
@@ -31,24 +96,24 @@ if search_query and ticker_list:
         key="autocomplete_select_ticker",
     )
     if selected_ticker:
+        # Chart-ready series: bars resampled and the close line downsampled on the server.
+        # Fetched first so the full chart period is synced before the short table request.
+        chart = fetch_chart(selected_ticker, 800)
+
         st.write(f"**{selected_ticker}: Latest 5 days of stock price**")
-        fetch_api_query_url = f'{fetch_api_url}?ticker={selected_ticker}'
-        resp = requests.get(fetch_api_query_url)
-        sdp_list = resp.json()
-        sdp_df = pd.DataFrame(sdp_list)
-        sdp_df = sdp_df[['ticker', 'date', 'open', 'high', 'low', 'close', 'adj_close', 'volume']]
-        sdp_df['date'] = pd.to_datetime(sdp_df['date']).dt.date
-        sdp_df = sdp_df.sort_values('date').reset_index(drop=True)
+        # A month of rows is enough for the table, the chart has its own downsampled series
+        sdp_df = fetch_prices(selected_ticker, '1mo')
         st.write(sdp_df.tail().iloc[::-1].reset_index(drop=True))
 
-        st.write(f"**{selected_ticker}: Price-Volume Daily Chart**")
-        fig = plot_price_volume_chart(sdp_df)
+        bars_df = pd.DataFrame(chart['bars'])
+        line_df = pd.DataFrame(chart['line'])
+        resolution_label = {'1d': 'Daily', '1wk': 'Weekly', '1mo': 'Monthly'}[chart['resolution']]
+        st.write(f"**{selected_ticker}: Price-Volume {resolution_label} Chart**")
+        fig = plot_price_volume_chart(bars_df, line_df)
         st.plotly_chart(fig)
 
         st.write(f"**{selected_ticker}: Transcripts summary available**")
-        transcript_all_api_query_url = f'{transcript_all_api_url}?ticker={selected_ticker}'
-        resp = requests.get(transcript_all_api_query_url)
-        quarter_list = sorted(resp.json(), reverse=True)
+        quarter_list = list_quarters(selected_ticker)
 
         if len(quarter_list) > 0:
             selected_quarter = st.selectbox(
@@ -59,10 +124,7 @@ if search_query and ticker_list:
             )
 
             if selected_quarter:
-                transcript_api_query_url = f'{transcript_api_url}?ticker={selected_ticker}&quarter={selected_quarter}'
-                resp = requests.get(transcript_api_query_url)
-                st_list = resp.json()
-                st_df = pd.DataFrame(st_list)
+                st_df = fetch_transcript(selected_ticker, selected_quarter)
 
                 st.download_button(
                     "Download transcript in csv",
@@ -79,9 +141,7 @@ if search_query and ticker_list:
                     st.session_state["summary_fetched"] = False
 
                 if st.session_state['summary_fetched'] or st.button("Fetch Summary"):
-                    summary_api_query_url = f'{summary_api_url}?ticker={selected_ticker}&quarter={selected_quarter}'
-                    resp = requests.get(summary_api_query_url)
-                    summary_dict = resp.json()
+                    summary_dict = fetch_summary(selected_ticker, selected_quarter)
                     st.session_state["ticker"] = selected_ticker
                     st.session_state["quarter"] = selected_quarter
                     st.session_state["summary_fetched"] = True
@@ -98,7 +158,9 @@ if search_query and ticker_list:
                         st.write(summary_dict[selected_summary_key])
         else:
             st.write("No transcripts available.")
-elif search_query and not ticker_list:
+elif len(search_query) >= MIN_SEARCH_LENGTH and not ticker_list:
     st.write("No matching suggestions found.")
+elif search_query:
+    st.write(f"Type at least {MIN_SEARCH_LENGTH} characters to see suggestions.")
 else:
     st.write("Start typing to see suggestions.")
@@ -1,12 +1,25 @@
 import os
+from typing import Optional
 from google import genai
 
+from metrics import timed
+
 # The client gets the API key from the environment variable `GEMINI_API_KEY`.
 CLIENT = genai.Client()
 
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+
+def fetch_response(prompt: str, model: str = DEFAULT_MODEL, response_schema: Optional[type] = None) -> genai.types.GenerateContentResponse:
+    with timed("gemini", "generate_content"):
+        if response_schema is None:
+            return CLIENT.models.generate_content(
+                model=model, contents=prompt
+            )
 
-def fetch_response(prompt: str, model: str = "gemini-2.5-flash") -> genai.types.GenerateContentResponse:
-    response = CLIENT.models.generate_content(
-        model=model, contents=prompt
-    )
+        # Constrained decoding: the model replies with JSON matching the schema
+        response = CLIENT.models.generate_content(
+            model=model, contents=prompt,
+            config={"response_mime_type": "application/json", "response_schema": response_schema},
+        )
     return response
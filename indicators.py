@@ -0,0 +1,308 @@
+import os
+import math
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Optional
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from models import StockDailyPrice
+
+TRADING_DAYS_PER_YEAR = 252
+
+# Number of (ticker, params) series kept in memory, params come from the query string
+INDICATOR_CACHE_SIZE = int(os.getenv("INDICATOR_CACHE_SIZE", "256"))
+
+INDICATOR_NAMES = [
+    "sma", "ema", "rsi", "macd", "macd_signal", "macd_hist",
+    "bb_upper", "bb_middle", "bb_lower", "atr", "vwap", "volatility",
+]
+
+
+@dataclass(frozen=True)
+class IndicatorParams:
+    sma: int = 20
+    ema: int = 20
+    rsi: int = 14
+    macd_fast: int = 12
+    macd_slow: int = 26
+    macd_signal: int = 9
+    bollinger: int = 20
+    bollinger_k: float = 2.0
+    atr: int = 14
+    vwap: int = 20
+    volatility: int = 20
+
+
+def rolling_mean(x: np.ndarray, n: int) -> np.ndarray:
+    out = np.full_like(x, np.nan)
+    if len(x) >= n:
+        csum = np.cumsum(np.concatenate(([0.0], x)))
+        out[n - 1:] = (csum[n:] - csum[:-n]) / n
+    return out
+
+
+def rolling_sum(x: np.ndarray, n: int) -> np.ndarray:
+    return rolling_mean(x, n) * n
+
+
+def rolling_std(x: np.ndarray, n: int, ddof: int = 0) -> np.ndarray:
+    out = np.full_like(x, np.nan)
+    if len(x) >= n:
+        out[n - 1:] = sliding_window_view(x, n).std(axis=1, ddof=ddof)
+    return out
+
+
+def ewm(x: np.ndarray, alpha: float) -> np.ndarray:
+    # Recursive y[t] = (1 - alpha) * y[t-1] + alpha * x[t], seeded with x[0]
+    return pd.Series(x).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+
+def span_alpha(span: int) -> float:
+    return 2.0 / (span + 1)
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    return np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+def compute_indicators(high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray, params: IndicatorParams) -> dict[str, np.ndarray]:
+    # Vectorized pass over the full history, all inputs are contiguous float64 arrays
+    n = len(close)
+    result = {}
+
+    result["sma"] = rolling_mean(close, params.sma)
+    result["ema"] = ewm(close, span_alpha(params.ema))
+
+    delta = np.diff(close, prepend=np.nan)
+    gain = np.clip(np.nan_to_num(delta), 0, None)[1:]
+    loss = np.clip(-np.nan_to_num(delta), 0, None)[1:]
+    rsi = np.full(n, np.nan)
+    if n > 1:
+        avg_gain = ewm(gain, 1.0 / params.rsi)
+        avg_loss = ewm(loss, 1.0 / params.rsi)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi[1:] = np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+        rsi[:params.rsi] = np.nan
+    result["rsi"] = rsi
+
+    macd = ewm(close, span_alpha(params.macd_fast)) - ewm(close, span_alpha(params.macd_slow))
+    macd_signal = ewm(macd, span_alpha(params.macd_signal))
+    result["macd"] = macd
+    result["macd_signal"] = macd_signal
+    result["macd_hist"] = macd - macd_signal
+
+    bb_middle = rolling_mean(close, params.bollinger)
+    bb_width = params.bollinger_k * rolling_std(close, params.bollinger)
+    result["bb_upper"] = bb_middle + bb_width
+    result["bb_middle"] = bb_middle
+    result["bb_lower"] = bb_middle - bb_width
+
+    atr = ewm(true_range(high, low, close), 1.0 / params.atr)
+    atr[:params.atr - 1] = np.nan
+    result["atr"] = atr
+
+    typical_price = (high + low + close) / 3.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result["vwap"] = rolling_sum(typical_price * volume, params.vwap) / rolling_sum(volume, params.vwap)
+
+    log_returns = np.log(close / np.concatenate(([np.nan], close[:-1])))
+    result["volatility"] = rolling_std(log_returns, params.volatility, ddof=1) * math.sqrt(TRADING_DAYS_PER_YEAR)
+
+    return result
+
+
+class IndicatorState:
+    # Running sums and last recursive values, enough to extend every series by one bar in O(1)
+
+    def __init__(self, high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray, result: dict[str, np.ndarray], params: IndicatorParams):
+        self.params = params
+        self.prev_close = float(close[-1])
+        self.ema = float(result["ema"][-1])
+        self.ema_fast = float(ewm(close, span_alpha(params.macd_fast))[-1])
+        self.ema_slow = float(ewm(close, span_alpha(params.macd_slow))[-1])
+        self.macd_signal = float(result["macd_signal"][-1])
+        self.atr = float(ewm(true_range(high, low, close), 1.0 / params.atr)[-1])
+
+        delta = np.diff(close)
+        self.avg_gain = float(ewm(np.clip(delta, 0, None), 1.0 / params.rsi)[-1]) if len(delta) else None
+        self.avg_loss = float(ewm(np.clip(-delta, 0, None), 1.0 / params.rsi)[-1]) if len(delta) else None
+        self.count = len(close)
+
+        self.sma_window = deque(close[-params.sma:].tolist(), maxlen=params.sma)
+        self.sma_sum = float(np.sum(self.sma_window))
+        self.bb_window = deque(close[-params.bollinger:].tolist(), maxlen=params.bollinger)
+        self.bb_sum = float(np.sum(self.bb_window))
+        self.bb_sumsq = float(np.sum(np.square(self.bb_window)))
+
+        pv = ((high + low + close) / 3.0 * volume)[-params.vwap:]
+        self.vwap_window = deque(zip(pv.tolist(), volume[-params.vwap:].tolist()), maxlen=params.vwap)
+        self.vwap_pv = float(np.sum(pv))
+        self.vwap_v = float(np.sum(volume[-params.vwap:]))
+
+        log_returns = np.log(close[1:] / close[:-1])[-params.volatility:]
+        self.ret_window = deque(log_returns.tolist(), maxlen=params.volatility)
+        self.ret_sum = float(np.sum(log_returns))
+        self.ret_sumsq = float(np.sum(np.square(log_returns)))
+
+    @staticmethod
+    def _push(window: deque, value, sums: list[float], terms) -> list[float]:
+        if len(window) == window.maxlen:
+            sums = [s - t for s, t in zip(sums, terms(window[0]))]
+        window.append(value)
+        return [s + t for s, t in zip(sums, terms(value))]
+
+    def update(self, high: float, low: float, close: float, volume: float) -> dict[str, float]:
+        p = self.params
+        out = {}
+        self.count += 1
+
+        self.sma_sum, = self._push(self.sma_window, close, [self.sma_sum], lambda v: (v,))
+        out["sma"] = self.sma_sum / p.sma if len(self.sma_window) == p.sma else math.nan
+
+        self.ema += span_alpha(p.ema) * (close - self.ema)
+        out["ema"] = self.ema
+
+        delta = close - self.prev_close
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        if self.avg_gain is None:
+            self.avg_gain, self.avg_loss = gain, loss
+        else:
+            self.avg_gain += (gain - self.avg_gain) / p.rsi
+            self.avg_loss += (loss - self.avg_loss) / p.rsi
+        if self.count <= p.rsi:
+            out["rsi"] = math.nan
+        else:
+            out["rsi"] = 100.0 if self.avg_loss == 0 else 100.0 - 100.0 / (1.0 + self.avg_gain / self.avg_loss)
+
+        self.ema_fast += span_alpha(p.macd_fast) * (close - self.ema_fast)
+        self.ema_slow += span_alpha(p.macd_slow) * (close - self.ema_slow)
+        macd = self.ema_fast - self.ema_slow
+        self.macd_signal += span_alpha(p.macd_signal) * (macd - self.macd_signal)
+        out["macd"], out["macd_signal"], out["macd_hist"] = macd, self.macd_signal, macd - self.macd_signal
+
+        self.bb_sum, self.bb_sumsq = self._push(self.bb_window, close, [self.bb_sum, self.bb_sumsq], lambda v: (v, v * v))
+        if len(self.bb_window) == p.bollinger:
+            mean = self.bb_sum / p.bollinger
+            std = math.sqrt(max(self.bb_sumsq / p.bollinger - mean * mean, 0.0))
+            out["bb_upper"], out["bb_middle"], out["bb_lower"] = mean + p.bollinger_k * std, mean, mean - p.bollinger_k * std
+        else:
+            out["bb_upper"] = out["bb_middle"] = out["bb_lower"] = math.nan
+
+        true_range = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.atr += (true_range - self.atr) / p.atr
+        out["atr"] = self.atr if self.count >= p.atr else math.nan
+
+        pv = (high + low + close) / 3.0 * volume
+        self.vwap_pv, self.vwap_v = self._push(self.vwap_window, (pv, volume), [self.vwap_pv, self.vwap_v], lambda v: v)
+        out["vwap"] = self.vwap_pv / self.vwap_v if len(self.vwap_window) == p.vwap and self.vwap_v else math.nan
+
+        log_return = math.log(close / self.prev_close)
+        self.ret_sum, self.ret_sumsq = self._push(self.ret_window, log_return, [self.ret_sum, self.ret_sumsq], lambda v: (v, v * v))
+        if len(self.ret_window) == p.volatility:
+            variance = (self.ret_sumsq - self.ret_sum * self.ret_sum / p.volatility) / (p.volatility - 1)
+            out["volatility"] = math.sqrt(max(variance, 0.0) * TRADING_DAYS_PER_YEAR)
+        else:
+            out["volatility"] = math.nan
+
+        self.prev_close = close
+        return out
+
+
+# Fields of the last cached bar that must be unchanged for the series to be extended in place
+BAR_FIELDS = ("open", "high", "low", "close", "adj_close", "volume")
+
+
+def _bar(row: StockDailyPrice) -> tuple:
+    return tuple(getattr(row, field) for field in BAR_FIELDS)
+
+
+class IndicatorSeries:
+    def __init__(self, rows: list[StockDailyPrice], params: IndicatorParams):
+        high, low, close, volume = (np.ascontiguousarray([getattr(r, f) for r in rows], dtype=np.float64) for f in ("high", "low", "adj_close", "volume"))
+        result = compute_indicators(high, low, close, volume, params)
+        self.dates = [r.date for r in rows]
+        self.close = close.tolist()
+        self.columns = {name: result[name].tolist() for name in INDICATOR_NAMES}
+        self.state = IndicatorState(high, low, close, volume, result, params)
+        self.last_bar = _bar(rows[-1])
+
+    @property
+    def last_date(self):
+        return self.dates[-1]
+
+    def append(self, row: StockDailyPrice):
+        values = self.state.update(row.high, row.low, row.adj_close, float(row.volume))
+        self.dates.append(row.date)
+        self.close.append(row.adj_close)
+        self.last_bar = _bar(row)
+        for name in INDICATOR_NAMES:
+            self.columns[name].append(values[name])
+
+    def to_dict(self, ticker: str, names: Optional[list[str]] = None, last: Optional[int] = None) -> dict:
+        start = -last if last else 0
+        names = names or INDICATOR_NAMES
+        columns = {"date": [d.isoformat() for d in self.dates[start:]], "adj_close": self.close[start:]}
+        for name in names:
+            columns[name] = [None if math.isnan(v) else v for v in self.columns[name][start:]]
+        return {"ticker": ticker, "count": len(columns["date"]), "columns": columns}
+
+
+_cache: "OrderedDict[tuple[str, IndicatorParams], IndicatorSeries]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _get_indicator_series(session: Session, ticker: str, params: IndicatorParams) -> Optional[IndicatorSeries]:
+    # Extends the cached series with newly stored bars, recomputing only if older rows changed
+    row_count = session.exec(select(func.count()).select_from(StockDailyPrice).where(StockDailyPrice.ticker == ticker)).one()
+    if row_count == 0:
+        return None
+
+    key = (ticker, params)
+    with _lock:
+        series = _cache.get(key)
+        if series is not None:
+            _cache.move_to_end(key)
+    if series is not None and row_count >= len(series.dates):
+        tail_rows = session.exec(
+            select(StockDailyPrice)
+            .where(StockDailyPrice.ticker == ticker, StockDailyPrice.date >= series.last_date)
+            .order_by(StockDailyPrice.date)
+        ).all()
+        is_append_only = (
+            len(tail_rows) > 0
+            and tail_rows[0].date == series.last_date
+            and _bar(tail_rows[0]) == series.last_bar
+            and len(series.dates) + len(tail_rows) - 1 == row_count
+        )
+        if is_append_only:
+            with _lock:
+                # Checked again under the lock, a concurrent request may already have appended these rows
+                if series.last_date == tail_rows[0].date and series.last_bar == _bar(tail_rows[0]) and len(series.dates) + len(tail_rows) - 1 == row_count:
+                    for row in tail_rows[1:]:
+                        series.append(row)
+                    return series
+                if series.last_date == tail_rows[-1].date and len(series.dates) == row_count:
+                    return series
+
+    rows = session.exec(select(StockDailyPrice).where(StockDailyPrice.ticker == ticker).order_by(StockDailyPrice.date)).all()
+    series = IndicatorSeries(rows, params)
+    with _lock:
+        _cache[key] = series
+        _cache.move_to_end(key)
+        while len(_cache) > INDICATOR_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return series
+
+
+def get_indicators(session: Session, ticker: str, params: IndicatorParams = IndicatorParams(), names: Optional[list[str]] = None, last: Optional[int] = None) -> Optional[dict]:
+    series = _get_indicator_series(session, ticker, params)
+    if series is None:
+        return None
+    with _lock:
+        return series.to_dict(ticker, names=names, last=last)
@@ -0,0 +1,181 @@
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from db import bulk_upsert, engine
+from models import IngestionJob
+from transcript import TICKER_MAPPING
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "4"))
+INGEST_BACKOFF_SECONDS = float(os.getenv("INGEST_BACKOFF_SECONDS", "30"))
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "5"))
+# Seconds between scans of the pdfs directory, 0 disables the watcher
+INGEST_WATCH_SECONDS = float(os.getenv("INGEST_WATCH_SECONDS", "60"))
+PDF_DIR = "./pdfs/"
+
+FILE_TICKER_MAPPING = {file_ticker: ticker for ticker, file_ticker in TICKER_MAPPING.items()}
+
+_stop_event = threading.Event()
+_wake_event = threading.Event()
+_threads: list[threading.Thread] = []
+
+
+def enqueue_job(ticker: str, quarter: str, force: bool = False) -> IngestionJob:
+    # Deduplicated by (ticker, quarter): an existing job is returned as is, only force re-runs a done or failed one.
+    # The watcher re-enqueues every PDF, a failed job must stay failed once it ran out of attempts.
+    now = datetime.now()
+    with Session(engine) as session:
+        # Insert-or-ignore and conditional update, the watcher and POST /transcript/ingest can enqueue the same job at once
+        bulk_upsert(session, IngestionJob, [{
+            "ticker": ticker, "quarter": quarter, "status": JOB_QUEUED, "attempts": 0, "last_error": None,
+            "created_at": now, "updated_at": now, "next_run_at": now,
+        }])
+        if force:
+            session.exec(
+                update(IngestionJob)
+                .where(IngestionJob.ticker == ticker, IngestionJob.quarter == quarter, IngestionJob.status.in_([JOB_DONE, JOB_FAILED]))
+                .values(status=JOB_QUEUED, attempts=0, last_error=None, updated_at=now, next_run_at=now)
+            )
+            session.commit()
+        job = session.get(IngestionJob, (ticker, quarter))
+
+    if job.status == JOB_QUEUED:
+        _wake_event.set()
+    return job
+
+
+def get_job(ticker: str, quarter: str) -> Optional[IngestionJob]:
+    with Session(engine) as session:
+        return session.get(IngestionJob, (ticker, quarter))
+
+
+def list_jobs(status: Optional[str] = None) -> list[IngestionJob]:
+    with Session(engine) as session:
+        query = select(IngestionJob)
+        if status is not None:
+            query = query.where(IngestionJob.status == status)
+        return session.exec(query.order_by(IngestionJob.created_at)).all()
+
+
+def claim_next_job() -> Optional[IngestionJob]:
+    # The conditional UPDATE makes sure only one worker picks up a given job
+    with Session(engine) as session:
+        candidates = session.exec(
+            select(IngestionJob)
+            .where(IngestionJob.status == JOB_QUEUED, IngestionJob.next_run_at <= datetime.now())
+            .order_by(IngestionJob.next_run_at)
+            .limit(INGEST_WORKERS + 1)
+        ).all()
+        for job in candidates:
+            result = session.exec(
+                update(IngestionJob)
+                .where(IngestionJob.ticker == job.ticker, IngestionJob.quarter == job.quarter, IngestionJob.status == JOB_QUEUED)
+                .values(status=JOB_RUNNING, attempts=IngestionJob.attempts + 1, updated_at=datetime.now())
+            )
+            session.commit()
+            if result.rowcount == 1:
+                session.refresh(job)
+                return job
+    return None
+
+
+def finish_job(job: IngestionJob, error: Optional[str] = None):
+    now = datetime.now()
+    with Session(engine) as session:
+        job = session.get(IngestionJob, (job.ticker, job.quarter))
+        job.updated_at = now
+        job.last_error = error
+        if error is None:
+            job.status = JOB_DONE
+        elif job.attempts >= INGEST_MAX_ATTEMPTS:
+            job.status = JOB_FAILED
+        else:
+            job.status = JOB_QUEUED
+            job.next_run_at = now + timedelta(seconds=INGEST_BACKOFF_SECONDS * 2 ** (job.attempts - 1))
+        session.add(job)
+        session.commit()
+
+
+def run_pending_jobs(process_job: Callable[[str, str], None]) -> int:
+    # Processes every job that is due right now, returns how many ran
+    count = 0
+    while not _stop_event.is_set():
+        job = claim_next_job()
+        if job is None:
+            break
+        try:
+            process_job(job.ticker, job.quarter)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Ingestion of %s %s failed", job.ticker, job.quarter)
+            finish_job(job, error=f"{type(exc).__name__}: {exc}")
+        else:
+            finish_job(job)
+        count += 1
+    return count
+
+
+def scan_pdf_dir(pdf_dir: str = PDF_DIR) -> list[IngestionJob]:
+    # Enqueue a job for every transcript PDF of a known ticker
+    job_list = []
+    for fname in sorted(os.listdir(pdf_dir)):
+        if not fname.lower().endswith(".pdf") or "_" not in fname:
+            continue
+        file_ticker, quarter = fname[:-4].split("_", 1)
+        ticker = FILE_TICKER_MAPPING.get(file_ticker.lower())
+        if ticker is not None:
+            job_list.append(enqueue_job(ticker, quarter))
+    return job_list
+
+
+def _worker_loop(process_job: Callable[[str, str], None]):
+    while not _stop_event.is_set():
+        if run_pending_jobs(process_job) == 0:
+            _wake_event.wait(INGEST_POLL_SECONDS)
+            _wake_event.clear()
+
+
+def _watcher_loop():
+    while not _stop_event.is_set():
+        try:
+            scan_pdf_dir()
+        except Exception:  # noqa: BLE001
+            logger.exception("Scanning %s failed", PDF_DIR)
+        _stop_event.wait(INGEST_WATCH_SECONDS)
+
+
+def start_ingestion_workers(process_job: Callable[[str, str], None], workers: int = INGEST_WORKERS):
+    if workers <= 0 or _threads:
+        return
+
+    # Jobs left running by a previous process are picked up again
+    with Session(engine) as session:
+        session.exec(update(IngestionJob).where(IngestionJob.status == JOB_RUNNING).values(status=JOB_QUEUED))
+        session.commit()
+
+    _stop_event.clear()
+    for idx in range(workers):
+        _threads.append(threading.Thread(target=_worker_loop, args=(process_job,), name=f"ingest-worker-{idx}", daemon=True))
+    if INGEST_WATCH_SECONDS > 0:
+        _threads.append(threading.Thread(target=_watcher_loop, name="ingest-watcher", daemon=True))
+    for thread in _threads:
+        thread.start()
+
+
+def stop_ingestion_workers(timeout: float = 5.0):
+    _stop_event.set()
+    _wake_event.set()
+    for thread in _threads:
+        thread.join(timeout)
+    _threads.clear()
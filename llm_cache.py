@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func
+from sqlmodel import Session, select
+
+from db import engine
+from models import LLMResponseCache
+from google_genai import DEFAULT_MODEL, fetch_response
+from metrics import count_cache
+
+LLM_CACHE_MAX_AGE = timedelta(days=float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30")))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Rough size of a token in characters, used where the model does not report token counts
+CHARS_PER_TOKEN = 4
+
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+
+
+class LLMUsage:
+    # Token and latency totals of the model calls made while tracking, rolled up into the enclosing tracker
+
+    def __init__(self, parent: Optional["LLMUsage"] = None):
+        self.parent = parent
+        self.calls = 0
+        self.cached_calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.model_seconds = 0.0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, cached: bool, prompt_tokens: int = 0, output_tokens: int = 0, seconds: float = 0.0):
+        with self._lock:
+            self.calls += 1
+            self.cached_calls += int(cached)
+            self.prompt_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+            self.model_seconds += seconds
+        if self.parent is not None:
+            self.parent.record(cached, prompt_tokens, output_tokens, seconds)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "cached_calls": self.cached_calls,
+                "prompt_tokens": self.prompt_tokens,
+                "output_tokens": self.output_tokens,
+                "model_seconds": round(self.model_seconds, 3),
+                "elapsed_seconds": round(time.monotonic() - self.started_at, 3),
+            }
+
+
+_usage: ContextVar[Optional[LLMUsage]] = ContextVar("llm_usage", default=None)
+
+
+@contextmanager
+def track_usage() -> Iterator[LLMUsage]:
+    # Worker threads only see the tracker when submitted through contextvars.copy_context().run
+    usage = LLMUsage(parent=_usage.get())
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def _record_usage(cached: bool, prompt_tokens: int = 0, output_tokens: int = 0, seconds: float = 0.0):
+    usage = _usage.get()
+    if usage is not None:
+        usage.record(cached, prompt_tokens, output_tokens, seconds)
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def response_cache_key(prompt: str, response_schema: Optional[type] = None) -> str:
+    # Structured replies are cached apart from free-text replies to the same prompt
+    if response_schema is None:
+        return prompt
+    return f"{prompt}\n\n{json.dumps(response_schema.model_json_schema(), sort_keys=True)}"
+
+
+def _count(key: str, n: int = 1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+def get_cached_response(prompt: str, model: str = DEFAULT_MODEL) -> Optional[str]:
+    with Session(engine) as session:
+        entry = session.get(LLMResponseCache, (model, prompt_hash(prompt)))
+        if entry is None or datetime.now() - entry.created_at > LLM_CACHE_MAX_AGE:
+            return None
+        entry.hits += 1
+        entry.accessed_at = datetime.now()
+        session.add(entry)
+        session.commit()
+        return entry.response
+
+
+def put_cached_response(prompt: str, response: str, model: str = DEFAULT_MODEL):
+    now = datetime.now()
+    with Session(engine) as session:
+        session.merge(LLMResponseCache(
+            model=model,
+            prompt_hash=prompt_hash(prompt),
+            response=response,
+            size=len(response.encode("utf-8")),
+            created_at=now,
+            accessed_at=now,
+        ))
+        session.commit()
+    evict()
+
+
+def evict() -> int:
+    # Drop entries older than the max age, then least recently used ones until under the size budget
+    with Session(engine) as session:
+        evicted = session.exec(delete(LLMResponseCache).where(LLMResponseCache.created_at < datetime.now() - LLM_CACHE_MAX_AGE)).rowcount
+
+        total_size = session.exec(select(func.coalesce(func.sum(LLMResponseCache.size), 0))).one()
+        if total_size > LLM_CACHE_MAX_BYTES:
+            entries = session.exec(select(LLMResponseCache.model, LLMResponseCache.prompt_hash, LLMResponseCache.size).order_by(LLMResponseCache.accessed_at)).all()
+            for model, hash_, size in entries:
+                if total_size <= LLM_CACHE_MAX_BYTES:
+                    break
+                session.exec(delete(LLMResponseCache).where(LLMResponseCache.model == model, LLMResponseCache.prompt_hash == hash_))
+                total_size -= size
+                evicted += 1
+        session.commit()
+
+    _count("evictions", evicted)
+    return evicted
+
+
+def fetch_text(prompt: str, model: str = DEFAULT_MODEL, response_schema: Optional[type] = None) -> str:
+    # Same as fetch_response(...).text, but identical (model, prompt) pairs only reach the model once
+    cache_key = response_cache_key(prompt, response_schema)
+    cached = get_cached_response(cache_key, model)
+    count_cache("llm", hit=cached is not None)
+    if cached is not None:
+        _count("hits")
+        _record_usage(cached=True)
+        return cached
+
+    _count("misses")
+    started_at = time.monotonic()
+    response = fetch_response(prompt=prompt, model=model, response_schema=response_schema)
+    text = response.text
+    usage_metadata = getattr(response, "usage_metadata", None)
+    _record_usage(
+        cached=False,
+        prompt_tokens=getattr(usage_metadata, "prompt_token_count", None) or estimate_tokens(prompt),
+        output_tokens=getattr(usage_metadata, "candidates_token_count", None) or estimate_tokens(text or ""),
+        seconds=time.monotonic() - started_at,
+    )
+    if text:
+        put_cached_response(cache_key, text, model)
+    return text
+
+
+def get_cache_stats() -> dict:
+    with Session(engine) as session:
+        entries, total_size = session.exec(select(func.count(), func.coalesce(func.sum(LLMResponseCache.size), 0)).select_from(LLMResponseCache)).one()
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats.update(entries=entries, bytes=total_size, hit_ratio=stats["hits"] / lookups if lookups else 0.0)
+    return stats
@@ -0,0 +1,131 @@
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from executors import EXECUTORS
+
+# Request header that asks for a span breakdown in the Server-Timing response header
+PROFILE_HEADER = "X-Profile"
+
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time until the response headers are sent",
+    ["method", "route", "status"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_call_duration_seconds", "Calls to yfinance, Gemini and PDF parsing",
+    ["service", "operation"], buckets=UPSTREAM_BUCKETS,
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_call_errors_total", "Upstream calls that raised",
+    ["service", "operation"],
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "SQLite statements, by leading keyword",
+    ["operation"], buckets=DB_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups",
+    ["cache", "result"],
+)
+
+_cache_counts: dict[str, list[int]] = {}
+_cache_lock = threading.Lock()
+
+# Per-request span totals, name -> [count, seconds]; None unless the request asked for a profile
+_profile: ContextVar[Optional[dict[str, list]]] = ContextVar("profile", default=None)
+
+
+@contextmanager
+def profile_request(enabled: bool) -> Iterator[Optional[dict[str, list]]]:
+    # Worker threads only add to the profile when they run in a copy of the request's context
+    spans = {} if enabled else None
+    token = _profile.set(spans)
+    try:
+        yield spans
+    finally:
+        _profile.reset(token)
+
+
+def add_span(name: str, seconds: float):
+    spans = _profile.get()
+    if spans is not None:
+        total = spans.setdefault(name, [0, 0.0])
+        total[0] += 1
+        total[1] += seconds
+
+
+@contextmanager
+def timed(service: str, operation: str):
+    started_at = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        UPSTREAM_ERRORS.labels(service, operation).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started_at
+        UPSTREAM_LATENCY.labels(service, operation).observe(elapsed)
+        add_span(service, elapsed)
+
+
+def count_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+    with _cache_lock:
+        counts = _cache_counts.setdefault(cache, [0, 0])
+        counts[0 if hit else 1] += 1
+
+
+def server_timing(spans: dict[str, list], total: float) -> str:
+    entries = [f'{name};dur={seconds * 1000:.1f};desc="{count}x"' for name, (count, seconds) in sorted(spans.items())]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def instrument_engine(engine: Engine):
+    # Times every statement on the engine's connections
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started_at"].pop()
+        operation = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+        DB_QUERY_LATENCY.labels(operation).observe(elapsed)
+        add_span("db", elapsed)
+
+
+class AppCollector:
+    # Values derived at scrape time: cache hit ratios and executor occupancy
+
+    def collect(self):
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Share of cache lookups that hit", labels=["cache"])
+        with _cache_lock:
+            for cache, (hits, misses) in sorted(_cache_counts.items()):
+                ratio.add_metric([cache], hits / (hits + misses) if hits + misses else 0.0)
+        yield ratio
+
+        admitted = GaugeMetricFamily("executor_admitted_tasks", "Tasks running or waiting in each executor", labels=["executor"])
+        rejected = GaugeMetricFamily("executor_rejected_tasks", "Tasks turned away since start", labels=["executor"])
+        for executor in EXECUTORS:
+            stats = executor.stats()
+            admitted.add_metric([executor.name], stats["admitted"])
+            rejected.add_metric([executor.name], stats["rejected"])
+        yield admitted
+        yield rejected
+
+
+REGISTRY.register(AppCollector())
+
+
+def render_metrics() -> tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,39 +1,79 @@
 import os
 import json
+import hashlib
 from pathlib import Path
 from mistralai import Mistral, DocumentURLChunk, ImageURLChunk, TextChunk
 
+from metrics import count_cache, timed
+
 CLIENT = Mistral(api_key=os.getenv("MISTRAL_API_KEY"))
 
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", "./.cache/ocr")
+
+
+def file_hash(filepath: str) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _ocr_cache_path(filepath: str, include_images: bool) -> str:
+    # Keyed by content, a renamed or re-downloaded file is not sent again
+    suffix = "_images" if include_images else ""
+    return os.path.join(OCR_CACHE_DIR, f"{file_hash(filepath)}{suffix}.json")
+
+
+def _read_cache(cache_path: str) -> dict:
+    with open(cache_path, encoding="utf-8") as f:
+        return json.load(f)
+
 
-def parse_pdf(filepath: str, json: bool = True) -> dict:
+def _write_cache(cache_path: str, response_dict: dict):
+    os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(response_dict, f)
+    os.replace(tmp_path, cache_path)
+
+
+def parse_pdf(filepath: str, json: bool = True, include_images: bool = False) -> dict:
     # Verify PDF file exists
     pdf_file = Path(filepath)
     assert pdf_file.is_file()
 
-    # Upload PDF file to Mistral's OCR service
-    uploaded_file = CLIENT.files.upload(
-        file={
-            "file_name": pdf_file.stem,
-            "content": pdf_file.read_bytes(),
-        },
-        purpose="ocr",
-    )
-
-    # Get URL for the uploaded file
-    signed_url = CLIENT.files.get_signed_url(file_id=uploaded_file.id, expiry=1)
-
-    # Process PDF with OCR, including embedded images
-    pdf_response = CLIENT.ocr.process(
-        document=DocumentURLChunk(document_url=signed_url.url),
-        model="mistral-ocr-latest",
-        include_image_base64=True
-    )
+    # Dict results are cached per file hash, image payloads only when asked for
+    cache_path = _ocr_cache_path(filepath, include_images)
+    if json:
+        count_cache("ocr", hit=os.path.exists(cache_path))
+        if os.path.exists(cache_path):
+            return _read_cache(cache_path)
+
+    with timed("mistral", "ocr"):
+        # Upload PDF file to Mistral's OCR service
+        uploaded_file = CLIENT.files.upload(
+            file={
+                "file_name": pdf_file.stem,
+                "content": pdf_file.read_bytes(),
+            },
+            purpose="ocr",
+        )
+
+        # Get URL for the uploaded file
+        signed_url = CLIENT.files.get_signed_url(file_id=uploaded_file.id, expiry=1)
+
+        # Process PDF with OCR, embedded images only when requested
+        pdf_response = CLIENT.ocr.process(
+            document=DocumentURLChunk(document_url=signed_url.url),
+            model="mistral-ocr-latest",
+            include_image_base64=include_images
+        )
 
     if json:
         # Convert response to JSON format
-        response_dict = json.loads(pdf_response.model_dump_json())
-
+        response_dict = pdf_response.model_dump(mode="json")
+        _write_cache(cache_path, response_dict)
         return response_dict
     else:
         return pdf_response
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 from sqlmodel import SQLModel
 from sqlalchemy import PrimaryKeyConstraint
 
@@ -45,3 +46,43 @@ class StockTranscriptSummary(SQLModel, table=True):
     __table_args__ = (
         PrimaryKeyConstraint("ticker", "quarter"),
     )
+
+
+class StockTranscriptMetrics(SQLModel, table=True):
+    ticker: str
+    quarter: str
+    metrics: str  # JSON list of transcript_metrics.TranscriptMetric
+    created_at: datetime
+
+    __table_args__ = (
+        PrimaryKeyConstraint("ticker", "quarter"),
+    )
+
+
+class LLMResponseCache(SQLModel, table=True):
+    model: str
+    prompt_hash: str
+    response: str
+    size: int
+    hits: int = 0
+    created_at: datetime
+    accessed_at: datetime
+
+    __table_args__ = (
+        PrimaryKeyConstraint("model", "prompt_hash"),
+    )
+
+
+class IngestionJob(SQLModel, table=True):
+    ticker: str
+    quarter: str
+    status: str
+    attempts: int = 0
+    last_error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    next_run_at: datetime
+
+    __table_args__ = (
+        PrimaryKeyConstraint("ticker", "quarter"),
+    )
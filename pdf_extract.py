@@ -0,0 +1,180 @@
+import os
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from PyPDF2 import PdfReader
+
+from executors import process_pool
+
+logger = logging.getLogger(__name__)
+
+# auto: the fastest text backend installed, with OCR for pages that come back empty
+PDF_BACKEND = os.getenv("PDF_BACKEND", "auto")
+
+# Worker processes for page extraction, and the page count below which a file is parsed inline
+PDF_PAGE_PROCESSES = int(os.getenv("PDF_PAGE_PROCESSES", str(os.cpu_count() or 2)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+
+
+class PyPDF2Backend:
+    # Pure Python, slow enough per page that splitting a file across processes pays off
+
+    name = "pypdf2"
+    parallel = True
+
+    def page_count(self, filepath: str) -> int:
+        return len(PdfReader(filepath).pages)
+
+    def extract(self, filepath: str, start: int, end: int) -> list[str]:
+        pages = PdfReader(filepath).pages
+        return [pages[idx].extract_text() for idx in range(start, end)]
+
+
+class PyMuPDFBackend:
+    # Native MuPDF, an optional dependency; a whole transcript takes ~0.1s so it runs inline
+
+    name = "pymupdf"
+    parallel = False
+
+    def __init__(self):
+        import pymupdf
+        self.pymupdf = pymupdf
+
+    def page_count(self, filepath: str) -> int:
+        with self.pymupdf.open(filepath) as doc:
+            return doc.page_count
+
+    def extract(self, filepath: str, start: int, end: int) -> list[str]:
+        with self.pymupdf.open(filepath) as doc:
+            return [doc[idx].get_text() for idx in range(start, end)]
+
+
+class MistralOCRBackend:
+    # Remote OCR of the whole file, for scanned pages without a text layer
+
+    name = "mistral"
+    parallel = False
+
+    def page_count(self, filepath: str) -> int:
+        return len(self.extract_all(filepath))
+
+    def extract(self, filepath: str, start: int, end: int) -> list[str]:
+        return self.extract_all(filepath)[start:end]
+
+    def extract_all(self, filepath: str) -> list[str]:
+        import mistral
+
+        pages = sorted(mistral.parse_pdf(filepath)["pages"], key=lambda page: page["index"])
+        return [page["markdown"] for page in pages]
+
+
+PDF_BACKENDS = {
+    PyMuPDFBackend.name: PyMuPDFBackend,
+    PyPDF2Backend.name: PyPDF2Backend,
+    MistralOCRBackend.name: MistralOCRBackend,
+}
+
+# Text backends tried by auto, fastest first
+AUTO_ORDER = [PyMuPDFBackend.name, PyPDF2Backend.name]
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: str):
+    # Raises ImportError when the backend's package is not installed
+    if name not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend {name!r}, expected auto or one of {list(PDF_BACKENDS)}")
+    with _backends_lock:
+        if name not in _backends:
+            try:
+                _backends[name] = PDF_BACKENDS[name]()
+            except ImportError as exc:
+                _backends[name] = exc
+        backend = _backends[name]
+    if isinstance(backend, ImportError):
+        raise backend
+    return backend
+
+
+def available_backends() -> list[str]:
+    names = []
+    for name in PDF_BACKENDS:
+        try:
+            get_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def resolve_backend(name: str = PDF_BACKEND) -> str:
+    # The backend auto stands for, or name itself when it is installed
+    if name != "auto":
+        get_backend(name)
+        return name
+    for candidate in AUTO_ORDER:
+        if candidate in available_backends():
+            return candidate
+    raise RuntimeError("No PDF text backend available")
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = process_pool(PDF_PAGE_PROCESSES)
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_range(name: str, filepath: str, start: int, end: int) -> list[str]:
+    # Runs in a worker process, each worker opens the file itself
+    return get_backend(name).extract(filepath, start, end)
+
+
+def extract_text(filepath: str, name: str, processes: int = PDF_PAGE_PROCESSES) -> list[str]:
+    # Every page of the file, split into one contiguous page range per worker when it pays off
+    backend = get_backend(name)
+    count = backend.page_count(filepath)
+    if not backend.parallel or processes <= 1 or count < PDF_PARALLEL_MIN_PAGES:
+        return backend.extract(filepath, 0, count)
+
+    size = -(-count // processes)
+    futures = [_get_pool().submit(_extract_range, name, filepath, start, min(start + size, count)) for start in range(0, count, size)]
+    return [text for future in futures for text in future.result()]
+
+
+def has_ocr() -> bool:
+    return bool(os.getenv("MISTRAL_API_KEY"))
+
+
+def extract_pdf_pages(filepath: str, backend: str = PDF_BACKEND) -> list[str]:
+    name = resolve_backend(backend)
+    pages = extract_text(filepath, name)
+    empty = [idx for idx, text in enumerate(pages) if not (text or "").strip()]
+    if backend != "auto" or not empty or name == MistralOCRBackend.name:
+        return pages
+
+    # Scanned pages have no text layer, only those pages are taken from OCR
+    if not has_ocr():
+        logger.warning("%d empty pages in %s and no MISTRAL_API_KEY for OCR", len(empty), filepath)
+        return pages
+    logger.info("OCR for %d empty pages in %s", len(empty), filepath)
+    ocr_pages = get_backend(MistralOCRBackend.name).extract_all(filepath)
+    for idx in empty:
+        if idx < len(ocr_pages):
+            pages[idx] = ocr_pages[idx]
+    return pages
@@ -1,24 +1,33 @@
 import pandas as pd
+from typing import Optional
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
 
+# Above this many points the close line is drawn with WebGL instead of SVG
+WEBGL_THRESHOLD = 1000
 
-def plot_price_volume_chart(df: pd.DataFrame):
+
+def plot_price_volume_chart(df: pd.DataFrame, line_df: Optional[pd.DataFrame] = None):
+    # df holds the volume bars, line_df the (possibly downsampled) close line, defaulting to df
     date_col = 'date'
     primary_y_col = 'close'
     secondary_y_col = 'volume'
 
+    if line_df is None:
+        line_df = df
+
     secondary_ylim = df[secondary_y_col].max() * 4
 
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
+    line_trace = go.Scattergl if len(line_df) > WEBGL_THRESHOLD else go.Scatter
     fig.add_trace(
-        go.Line(x=df[date_col], y=df[primary_y_col], name="Daily Closing Price"),
+        line_trace(x=line_df[date_col], y=line_df[primary_y_col], mode="lines", name="Closing Price"),
         secondary_y=False, # Explicitly assign to primary Y-axis
     )
 
     fig.add_trace(
-        go.Bar(x=df[date_col], y=df[secondary_y_col], name="Daily Volume"),
+        go.Bar(x=df[date_col], y=df[secondary_y_col], name="Volume"),
         secondary_y=True, # Assign to secondary Y-axis
     )
 
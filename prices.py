@@ -0,0 +1,303 @@
+import re
+import math
+import pandas as pd
+import yfinance as yf
+from datetime import datetime, timedelta
+from typing import Callable, Iterator, Optional
+from sqlmodel import Session, func, select
+
+from db import bulk_upsert
+from models import StockDailyPrice
+from metrics import count_cache, timed
+
+# Calendar-day gap between two stored trading days above which we assume rows are missing.
+# Weekends plus the longest NSE holiday stretch stay well below this.
+MAX_TRADING_GAP = pd.Timedelta(days=7)
+
+# Number of tickers requested from yfinance in a single multi-ticker download.
+BATCH_CHUNK_SIZE = 50
+
+# A ticker synced within this window is served straight from the database.
+SYNC_TTL = timedelta(minutes=15)
+
+# Relative change of a re-fetched settled bar above which the stored history counts as restated
+RESTATE_TOLERANCE = 1e-4
+
+PRICE_COLUMNS = {
+    "Date": "date",
+    "Adj Close": "adj_close",
+    "Close": "close",
+    "High": "high",
+    "Low": "low",
+    "Open": "open",
+    "Volume": "volume",
+}
+
+PERIOD_PATTERN = re.compile(r"^(\d+)(d|wk|mo|y)$")
+
+# Per ticker: when it was last synced and the period start that sync reached back to (None for max)
+_last_synced: dict[str, tuple[datetime, Optional[pd.Timestamp]]] = {}
+
+# Per ticker: the first bar upstream has, once a sync found nothing before it (listed after the period start)
+_first_bar: dict[str, pd.Timestamp] = {}
+
+# Per ticker: (previous bar, next bar) gaps a sync fetched and found still empty, e.g. trading suspensions
+_known_gaps: dict[str, set[tuple[pd.Timestamp, pd.Timestamp]]] = {}
+
+
+def period_start(period: str, now: Optional[pd.Timestamp] = None) -> Optional[pd.Timestamp]:
+    # Translate a yfinance period string into the first date it covers, None for "max"
+    now = (now or pd.Timestamp.now()).normalize()
+    period = period.strip().lower()
+    if period == "max":
+        return None
+    if period == "ytd":
+        return now.replace(month=1, day=1)
+
+    match = PERIOD_PATTERN.match(period)
+    if not match:
+        raise ValueError(f"Unsupported period {period!r}")
+    count, unit = int(match.group(1)), match.group(2)
+    offsets = {
+        "d": pd.DateOffset(days=count),
+        "wk": pd.DateOffset(weeks=count),
+        "mo": pd.DateOffset(months=count),
+        "y": pd.DateOffset(years=count),
+    }
+    return now - offsets[unit]
+
+
+def find_gaps(dates: list[pd.Timestamp]) -> list[tuple[pd.Timestamp, pd.Timestamp]]:
+    # (previous bar, next bar) pairs of sorted dates further apart than MAX_TRADING_GAP
+    return [(prev_date, next_date) for prev_date, next_date in zip(dates[:-1], dates[1:]) if next_date - prev_date > MAX_TRADING_GAP]
+
+
+def find_missing_ranges(dates: list[pd.Timestamp], start: Optional[pd.Timestamp], now: Optional[pd.Timestamp] = None, first_bar: Optional[pd.Timestamp] = None, known_gaps: Optional[set] = None) -> list[tuple[Optional[pd.Timestamp], pd.Timestamp]]:
+    # Return [start, end) windows that are not covered by the stored dates
+    now = (now or pd.Timestamp.now()).normalize()
+    end = now + pd.Timedelta(days=1)
+    if len(dates) == 0:
+        return [(start, end)]
+
+    dates = sorted(pd.to_datetime(dates))
+    one_day = pd.Timedelta(days=1)
+    missing_ranges = []
+
+    # Nothing exists upstream before first_bar, so a ticker listed after start has no head gap
+    head = start if start is None or first_bar is None else max(start, first_bar)
+    if head is not None and dates[0] - head > MAX_TRADING_GAP:
+        missing_ranges.append((start, dates[0]))
+
+    # Gaps upstream had nothing for last time are not asked for again
+    for prev_date, next_date in find_gaps(dates):
+        if (prev_date, next_date) not in (known_gaps or ()):
+            missing_ranges.append((prev_date + one_day, next_date))
+
+    # The last stored bar is always re-fetched, it may have been a partial intraday bar. The window
+    # starts one bar earlier so it overlaps a settled bar that is_restated can compare.
+    missing_ranges.append((dates[-2] if len(dates) > 1 else dates[-1], end))
+
+    return missing_ranges
+
+
+def download_history(ticker: str, interval: str = "1d", **kwargs) -> pd.DataFrame:
+    with timed("yfinance", "download"):
+        df = yf.download(ticker, interval=interval, progress=False, auto_adjust=False, threads=True, **kwargs)
+    if df is None or df.empty:
+        return pd.DataFrame(columns=["Date", "Adj Close", "Close", "High", "Low", "Open", "Volume"])
+
+    history_df = df.reset_index()
+    history_df.columns = [col[0] if isinstance(col, tuple) else col for col in history_df.columns]
+    history_df = history_df.rename(columns={"Datetime": "Date"})
+    return history_df
+
+
+def history_to_records(ticker: str, history_df: pd.DataFrame) -> list[dict]:
+    # Column-wise conversion of a yfinance frame into stockdailyprice rows
+    df = history_df.dropna(subset=["Close"]).rename(columns=PRICE_COLUMNS)[list(PRICE_COLUMNS.values())]
+    df.insert(0, "ticker", ticker)
+    df["date"] = pd.to_datetime(df["date"])
+    df["volume"] = df["volume"].fillna(0).astype("int64")
+    return df.to_dict(orient="records")
+
+
+def to_stock_daily_prices(ticker: str, history_df: pd.DataFrame) -> list[StockDailyPrice]:
+    return [StockDailyPrice(**record) for record in history_to_records(ticker, history_df)]
+
+
+def upsert_history(session: Session, ticker: str, history_df: pd.DataFrame, update: bool = True) -> int:
+    return bulk_upsert(session, StockDailyPrice, history_to_records(ticker, history_df), update=update)
+
+
+def get_stored_dates(session: Session, ticker: str, start: Optional[pd.Timestamp]) -> list[pd.Timestamp]:
+    query = select(StockDailyPrice.date).where(StockDailyPrice.ticker == ticker)
+    if start is not None:
+        query = query.where(StockDailyPrice.date >= start)
+    return [pd.Timestamp(d) for d in session.exec(query).all()]
+
+
+def overlap_date(dates: list[pd.Timestamp]) -> Optional[pd.Timestamp]:
+    # The settled bar the tail window of find_missing_ranges starts on
+    return sorted(dates)[-2] if len(dates) > 1 else None
+
+
+def is_restated(session: Session, ticker: str, history_df: pd.DataFrame, date: Optional[pd.Timestamp]) -> bool:
+    # yfinance restates Close and Adj Close after splits and dividends, a changed settled bar means
+    # every stored bar of the ticker is on the old basis
+    if date is None or history_df.empty:
+        return False
+    stored = session.get(StockDailyPrice, (ticker, date.to_pydatetime()))
+    fetched = history_df[pd.to_datetime(history_df["Date"]).dt.normalize() == date.normalize()]
+    if stored is None or fetched.empty or pd.isna(fetched["Close"].iloc[-1]):
+        return False
+    return not (
+        math.isclose(fetched["Close"].iloc[-1], stored.close, rel_tol=RESTATE_TOLERANCE)
+        and math.isclose(fetched["Adj Close"].iloc[-1], stored.adj_close, rel_tol=RESTATE_TOLERANCE)
+    )
+
+
+def restated_window(session: Session, ticker: str) -> dict:
+    # Everything stored for the ticker, re-downloaded on the new basis
+    first_date = session.exec(select(func.min(StockDailyPrice.date)).where(StockDailyPrice.ticker == ticker)).one()
+    end = pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+    return {"start": pd.Timestamp(first_date).date(), "end": end.date()}
+
+
+def is_fresh(ticker: str, start: Optional[pd.Timestamp] = None) -> bool:
+    # A recent sync only counts when it covered start, a 1mo sync says nothing about the 3y window
+    last_synced = _last_synced.get(ticker)
+    if last_synced is None or datetime.now() - last_synced[0] >= SYNC_TTL:
+        return False
+    synced_start = last_synced[1]
+    return synced_start is None or (start is not None and synced_start <= start)
+
+
+def mark_synced(session: Session, ticker: str, start: Optional[pd.Timestamp]):
+    # Called right after a sync fetched every missing window since start
+    _last_synced[ticker] = (datetime.now(), start)
+    dates = sorted(get_stored_dates(session, ticker, start))
+    if not dates:
+        return
+    # Gaps still there after fetching them mean upstream has no bars there
+    gaps = find_gaps(dates)
+    if gaps:
+        _known_gaps.setdefault(ticker, set()).update(gaps)
+    if start is not None and dates[0] - start > MAX_TRADING_GAP:
+        _first_bar[ticker] = dates[0]
+
+
+def sync_history(session: Session, ticker: str, period: str = "3y", force: bool = False) -> list[StockDailyPrice]:
+    # Download only the windows missing from stockdailyprice, then serve the period from the database
+    start = period_start(period)
+    stored_dates = get_stored_dates(session, ticker, start)
+
+    needs_sync = force or not is_fresh(ticker, start) or len(stored_dates) == 0
+    count_cache("price_sync", hit=not needs_sync)
+    if needs_sync:
+        overlap = overlap_date(stored_dates)
+        for range_start, range_end in find_missing_ranges(stored_dates, start, first_bar=_first_bar.get(ticker), known_gaps=_known_gaps.get(ticker)):
+            if range_start is None:
+                history_df = download_history(ticker, period="max")
+            else:
+                history_df = download_history(ticker, start=range_start.date(), end=range_end.date())
+            if range_start == overlap and is_restated(session, ticker, history_df, overlap):
+                history_df = download_history(ticker, **restated_window(session, ticker))
+            upsert_history(session, ticker, history_df)
+        mark_synced(session, ticker, start)
+
+    query = select(StockDailyPrice).where(StockDailyPrice.ticker == ticker)
+    if start is not None:
+        query = query.where(StockDailyPrice.date >= start)
+    return session.exec(query.order_by(StockDailyPrice.date)).all()
+
+
+def split_batch_df(df: pd.DataFrame, tickers: list[str]) -> dict[str, pd.DataFrame]:
+    # A multi-ticker yf.download returns (field, ticker) MultiIndex columns, split them into one frame per ticker
+    if df is None or df.empty:
+        return {}
+
+    if not isinstance(df.columns, pd.MultiIndex):
+        df = pd.concat({tickers[0]: df}, axis=1).swaplevel(0, 1, axis=1)
+
+    history_df_dict = {}
+    available_tickers = set(df.columns.get_level_values(1))
+    for ticker in tickers:
+        if ticker not in available_tickers:
+            continue
+        history_df = df.xs(ticker, axis=1, level=1).dropna(how="all")
+        if history_df.empty:
+            continue
+        history_df = history_df.reset_index()
+        history_df.columns = [str(col) for col in history_df.columns]
+        history_df_dict[ticker] = history_df.rename(columns={"Datetime": "Date", "index": "Date"})
+    return history_df_dict
+
+
+def download_batch(tickers: list[str], downloader: Callable = yf.download, **kwargs) -> dict[str, pd.DataFrame]:
+    with timed("yfinance", "download_batch"):
+        df = downloader(tickers, interval="1d", progress=False, auto_adjust=False, threads=True, group_by="column", **kwargs)
+    return split_batch_df(df, tickers)
+
+
+def sync_batch(session: Session, tickers: list[str], period: str = "3y", chunk_size: int = BATCH_CHUNK_SIZE, force: bool = False, downloader: Callable = yf.download) -> Iterator[dict]:
+    # Sync many tickers with one upstream request per chunk, yielding a status dict per ticker as each chunk lands
+    start = period_start(period)
+    tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers if ticker.strip()))
+
+    for chunk_start in range(0, len(tickers), chunk_size):
+        chunk = tickers[chunk_start:chunk_start + chunk_size]
+
+        # One window per chunk, wide enough to cover the earliest gap of any stale ticker in it
+        stale_tickers = []
+        range_starts = []
+        overlaps = {}
+        for ticker in chunk:
+            stored_dates = get_stored_dates(session, ticker, start)
+            if not force and is_fresh(ticker, start) and len(stored_dates) > 0:
+                yield {"ticker": ticker, "status": "fresh", "rows": 0}
+                continue
+            missing_ranges = find_missing_ranges(stored_dates, start, first_bar=_first_bar.get(ticker), known_gaps=_known_gaps.get(ticker))
+            if missing_ranges:
+                stale_tickers.append(ticker)
+                overlaps[ticker] = overlap_date(stored_dates)
+                range_starts.extend(range_start for range_start, _ in missing_ranges)
+            else:
+                _last_synced[ticker] = (datetime.now(), start)
+                yield {"ticker": ticker, "status": "fresh", "rows": 0}
+
+        if not stale_tickers:
+            continue
+
+        if any(range_start is None for range_start in range_starts):
+            window = {"period": period}
+        else:
+            end = pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+            window = {"start": min(range_starts).date(), "end": end.date()}
+
+        try:
+            history_df_dict = download_batch(stale_tickers, downloader=downloader, **window)
+        except Exception as exc:  # noqa: BLE001
+            for ticker in stale_tickers:
+                yield {"ticker": ticker, "status": "error", "detail": f"Failed to fetch data from upstream: {exc}"}
+            continue
+
+        for ticker in stale_tickers:
+            history_df = history_df_dict.get(ticker)
+            if history_df is None:
+                yield {"ticker": ticker, "status": "empty", "rows": 0}
+                continue
+            if is_restated(session, ticker, history_df, overlaps[ticker]):
+                try:
+                    history_df = download_batch([ticker], downloader=downloader, **restated_window(session, ticker)).get(ticker, history_df)
+                except Exception as exc:  # noqa: BLE001
+                    yield {"ticker": ticker, "status": "error", "detail": f"Failed to fetch data from upstream: {exc}"}
+                    continue
+            rows = upsert_history(session, ticker, history_df)
+            mark_synced(session, ticker, start)
+            yield {
+                "ticker": ticker,
+                "status": "ok",
+                "rows": rows,
+                "first_date": pd.Timestamp(history_df["Date"].min()).date().isoformat(),
+                "last_date": pd.Timestamp(history_df["Date"].max()).date().isoformat(),
+            }
@@ -0,0 +1,83 @@
+import os
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_cache import CHARS_PER_TOKEN, estimate_tokens, fetch_text
+
+# Largest prompt sent in one call, longer contexts are summarized chunk by chunk first
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "24000"))
+
+# Size of each chunk in the map step
+PROMPT_CHUNK_TOKENS = int(os.getenv("PROMPT_CHUNK_TOKENS", "8000"))
+
+# Maximum number of map calls in flight for one prompt
+MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+
+# Reduce rounds before the notes are sent as they are, whatever their size
+MAX_REDUCE_DEPTH = 3
+
+MANAGEMENT_HEADER = "This is the text from earnings transcript as told by management."
+QNA_HEADER = "This is the QnA text from earnings transcript between management and analysts."
+NOTES_HEADER = "These are notes taken from consecutive parts of an earnings transcript."
+
+MAP_QUERY = (
+    "Extract every point from this part of the transcript that is relevant to the task below, "
+    "as short bullet points with the figures quoted. Reply with 'None' if nothing is relevant.\n\nTask: {query}"
+)
+
+# A context is a header followed by the transcript lines it introduces
+Context = tuple[str, list[str]]
+
+
+def build_prompt(contexts: list[Context], query: str) -> str:
+    blocks = [f"{header}\n\n" + "\n".join(lines) for header, lines in contexts]
+    return "\n\n".join(blocks + [query])
+
+
+def chunk_lines(lines: list[str], max_tokens: int) -> list[list[str]]:
+    # Greedy packing of whole lines, a single line over the limit is split on its own
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks, chunk, chunk_tokens = [], [], 0
+    for line in lines:
+        pieces = [line[i:i + max_chars] for i in range(0, len(line), max_chars)] or [line]
+        for piece in pieces:
+            tokens = estimate_tokens(piece) + 1
+            if chunk and chunk_tokens + tokens > max_tokens:
+                chunks.append(chunk)
+                chunk, chunk_tokens = [], 0
+            chunk.append(piece)
+            chunk_tokens += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _map_chunks(contexts: list[Context], query: str, chunk_tokens: int, concurrency: int) -> list[str]:
+    prompts = []
+    for header, lines in contexts:
+        chunks = chunk_lines(lines, chunk_tokens)
+        for idx, chunk in enumerate(chunks):
+            prompts.append(build_prompt([(f"{header} (part {idx + 1} of {len(chunks)})", chunk)], MAP_QUERY.format(query=query)))
+
+    # Each call runs in a copy of the caller's context so usage tracking follows it
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="summary-map") as executor:
+        futures = [executor.submit(copy_context().run, fetch_text, prompt) for prompt in prompts]
+        return [future.result() for future in futures]
+
+
+def summarize(
+    contexts: list[Context],
+    query: str,
+    budget: int = PROMPT_TOKEN_BUDGET,
+    chunk_tokens: int = PROMPT_CHUNK_TOKENS,
+    concurrency: int = MAP_CONCURRENCY,
+    depth: int = 0,
+) -> str:
+    # One call when the prompt fits the budget, otherwise map over chunks and reduce the notes
+    prompt = build_prompt(contexts, query)
+    if estimate_tokens(prompt) <= budget or depth >= MAX_REDUCE_DEPTH:
+        return fetch_text(prompt=prompt)
+
+    notes = _map_chunks(contexts, query, min(chunk_tokens, budget), concurrency)
+    notes = [note for note in notes if note and note.strip().lower() != "none"]
+    return summarize([(NOTES_HEADER, notes)], query, budget, chunk_tokens, concurrency, depth + 1)
@@ -0,0 +1,286 @@
+import os
+import re
+import ast
+import json
+import time
+import operator
+import warnings
+import threading
+import numpy as np
+import pandas as pd
+from typing import Optional
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from models import StockDailyPrice
+from universe import get_nifty_500_stocks
+
+SCREENER_DIR = os.getenv("SCREENER_DIR", "./.cache/screener")
+
+# Seconds between two incremental refreshes of the matrix from stockdailyprice
+SCREENER_REFRESH_SECONDS = float(os.getenv("SCREENER_REFRESH_SECONDS", "60"))
+
+# A ticker without a bar in this many trailing dates of the matrix is left out of screens
+SCREENER_STALE_ROWS = int(os.getenv("SCREENER_STALE_ROWS", "5"))
+
+TRADING_DAYS_PER_YEAR = 252
+
+METRIC_PATTERNS = {
+    "ret": re.compile(r"^ret_(\d+)$"),
+    "vol_ratio": re.compile(r"^vol_ratio_(\d+)_(\d+)$"),
+    "avg_volume": re.compile(r"^avg_volume_(\d+)$"),
+}
+
+COMPARE_OPS = {
+    ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Lt: operator.lt,
+    ast.LtE: operator.le, ast.Eq: operator.eq, ast.NotEq: operator.ne,
+}
+BINARY_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+}
+
+
+class ScreenerMatrix:
+    # Dense date x ticker matrices of adjusted closes and volumes, NaN where a ticker has no bar
+
+    def __init__(self, dates: np.ndarray, tickers: list[str], adj_close: np.ndarray, volume: np.ndarray):
+        self.dates = dates
+        self.tickers = tickers
+        self.adj_close = adj_close
+        self.volume = volume
+
+    @property
+    def stored_rows_before_last(self) -> int:
+        return int(np.count_nonzero(~np.isnan(self.adj_close[:-1])))
+
+
+def _load_rows(session: Session, tickers: list[str], since: Optional[np.datetime64] = None) -> pd.DataFrame:
+    query = select(StockDailyPrice.ticker, StockDailyPrice.date, StockDailyPrice.adj_close, StockDailyPrice.volume).where(StockDailyPrice.ticker.in_(tickers))
+    if since is not None:
+        query = query.where(StockDailyPrice.date >= pd.Timestamp(since).to_pydatetime())
+    df = pd.DataFrame(session.exec(query).all(), columns=["ticker", "date", "adj_close", "volume"])
+    df["date"] = pd.to_datetime(df["date"]).dt.normalize()
+    return df
+
+
+def _pivot(df: pd.DataFrame, tickers: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    adj_close = df.pivot_table(index="date", columns="ticker", values="adj_close", aggfunc="last").reindex(columns=tickers)
+    volume = df.pivot_table(index="date", columns="ticker", values="volume", aggfunc="last").reindex(index=adj_close.index, columns=tickers)
+    return (
+        adj_close.index.values.astype("datetime64[D]"),
+        np.ascontiguousarray(adj_close.to_numpy(dtype=np.float64)),
+        np.ascontiguousarray(volume.to_numpy(dtype=np.float64)),
+    )
+
+
+def build_matrix(session: Session, tickers: list[str]) -> ScreenerMatrix:
+    dates, adj_close, volume = _pivot(_load_rows(session, tickers), tickers)
+    return ScreenerMatrix(dates, tickers, adj_close, volume)
+
+
+def refresh_matrix(session: Session, matrix: Optional[ScreenerMatrix], tickers: list[str]) -> ScreenerMatrix:
+    # Re-reads only the last stored date onwards, unless older rows were added or the universe changed
+    if matrix is None or matrix.tickers != tickers or len(matrix.dates) == 0:
+        return build_matrix(session, tickers)
+
+    last_date = matrix.dates[-1]
+    stored_rows_before_last = session.exec(
+        select(func.count()).select_from(StockDailyPrice)
+        .where(StockDailyPrice.ticker.in_(tickers), StockDailyPrice.date < pd.Timestamp(last_date).to_pydatetime())
+    ).one()
+    if stored_rows_before_last != matrix.stored_rows_before_last:
+        return build_matrix(session, tickers)
+
+    tail_df = _load_rows(session, tickers, since=last_date)
+    if tail_df.empty:
+        return matrix
+    tail_dates, tail_adj_close, tail_volume = _pivot(tail_df, tickers)
+    return ScreenerMatrix(
+        np.concatenate([matrix.dates[:-1], tail_dates]),
+        tickers,
+        np.concatenate([matrix.adj_close[:-1], tail_adj_close]),
+        np.concatenate([matrix.volume[:-1], tail_volume]),
+    )
+
+
+def save_matrix(matrix: ScreenerMatrix, directory: str = SCREENER_DIR):
+    # Files are swapped in atomically, memory maps of the previous version stay valid
+    os.makedirs(directory, exist_ok=True)
+    for name in ("adj_close", "volume"):
+        tmp_path = os.path.join(directory, f"{name}.{os.getpid()}.tmp.npy")
+        np.save(tmp_path, getattr(matrix, name))
+        os.replace(tmp_path, os.path.join(directory, f"{name}.npy"))
+    meta = {"dates": [str(d) for d in matrix.dates], "tickers": matrix.tickers}
+    tmp_path = os.path.join(directory, f"meta.{os.getpid()}.tmp.json")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+
+def load_matrix(directory: str = SCREENER_DIR) -> Optional[ScreenerMatrix]:
+    meta_path = os.path.join(directory, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    adj_close = np.load(os.path.join(directory, "adj_close.npy"), mmap_mode="r")
+    volume = np.load(os.path.join(directory, "volume.npy"), mmap_mode="r")
+    dates = np.array(meta["dates"], dtype="datetime64[D]")
+    if adj_close.shape != (len(dates), len(meta["tickers"])):
+        return None
+    return ScreenerMatrix(dates, meta["tickers"], adj_close, volume)
+
+
+class MetricFrame:
+    # Lazily computes per-ticker metrics as of each ticker's own last bar, so a ticker synced a day
+    # ahead of the rest does not turn everyone else's metrics into NaN
+
+    def __init__(self, matrix: ScreenerMatrix):
+        self.matrix = matrix
+        self.values: dict[str, np.ndarray] = {}
+        valid = ~np.isnan(matrix.adj_close)
+        last_rows = len(valid) - 1 - np.argmax(valid[::-1], axis=0) if len(valid) else np.zeros(len(matrix.tickers), dtype=np.int64)
+        recent = valid[-SCREENER_STALE_ROWS:].any(axis=0) if SCREENER_STALE_ROWS > 0 else valid.any(axis=0)
+        self.last_rows = np.where(recent, last_rows, -1)
+
+    def _window(self, data: np.ndarray, n: int) -> np.ndarray:
+        # The n rows up to each ticker's last bar, NaN before the first stored date
+        if n < 1 or n > len(data):
+            raise ValueError(f"Window {n} exceeds the {len(data)} stored dates")
+        rows = self.last_rows[None, :] - np.arange(n - 1, -1, -1)[:, None]
+        window = np.asarray(data)[np.maximum(rows, 0), np.arange(data.shape[1])]
+        return np.where((rows >= 0) & (self.last_rows >= 0), window, np.nan)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name in self.values:
+            return self.values[name]
+
+        close, volume = self.matrix.adj_close, self.matrix.volume
+        # Tickers without bars in a window come out as NaN
+        with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            if name == "close":
+                value = self._window(close, 1)[0]
+            elif name == "volume":
+                value = self._window(volume, 1)[0]
+            elif name == "high52_dist":
+                value = self["close"] / np.nanmax(self._window(close, min(TRADING_DAYS_PER_YEAR, len(close))), axis=0) - 1
+            elif name == "low52_dist":
+                value = self["close"] / np.nanmin(self._window(close, min(TRADING_DAYS_PER_YEAR, len(close))), axis=0) - 1
+            elif METRIC_PATTERNS["ret"].match(name):
+                n = int(METRIC_PATTERNS["ret"].match(name).group(1))
+                value = self["close"] / self._window(close, n + 1)[0] - 1
+            elif METRIC_PATTERNS["vol_ratio"].match(name):
+                short, long = map(int, METRIC_PATTERNS["vol_ratio"].match(name).groups())
+                value = np.nanmean(self._window(volume, short), axis=0) / np.nanmean(self._window(volume, long), axis=0)
+            elif METRIC_PATTERNS["avg_volume"].match(name):
+                n = int(METRIC_PATTERNS["avg_volume"].match(name).group(1))
+                value = np.nanmean(self._window(volume, n), axis=0)
+            else:
+                raise ValueError(f"Unknown metric {name!r}")
+
+        self.values[name] = value
+        return value
+
+
+def evaluate_expression(expression: str, metrics: MetricFrame) -> np.ndarray:
+    # Restricted evaluator: metric names, numbers, arithmetic, comparisons and and/or/not
+    def visit(node):
+        if isinstance(node, ast.Expression):
+            return visit(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            # As numpy scalars, so constant arithmetic like 1/0 follows the same rules as the metrics
+            return np.float64(node.value)
+        if isinstance(node, ast.Name):
+            return metrics[node.id]
+        if isinstance(node, ast.BoolOp):
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            result = visit(node.values[0])
+            for value in node.values[1:]:
+                result = combine(result, visit(value))
+            return result
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return np.logical_not(visit(node.operand))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -visit(node.operand)
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPS:
+            return BINARY_OPS[type(node.op)](visit(node.left), visit(node.right))
+        if isinstance(node, ast.Compare):
+            result, left = True, visit(node.left)
+            for op, comparator in zip(node.ops, node.comparators):
+                if type(op) not in COMPARE_OPS:
+                    raise ValueError(f"Unsupported comparison in {expression!r}")
+                right = visit(comparator)
+                result = np.logical_and(result, COMPARE_OPS[type(op)](left, right))
+                left = right
+            return result
+        raise ValueError(f"Unsupported syntax in {expression!r}")
+
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as exc:
+        raise ValueError(f"Invalid expression {expression!r}: {exc.msg}")
+    try:
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            return visit(tree)
+    except ArithmeticError as exc:
+        raise ValueError(f"Invalid expression {expression!r}: {exc}")
+
+
+_matrix: Optional[ScreenerMatrix] = None
+_last_refreshed = 0.0
+_lock = threading.Lock()
+
+
+def get_matrix(session: Session, force: bool = False) -> ScreenerMatrix:
+    global _matrix, _last_refreshed
+
+    with _lock:
+        if _matrix is None:
+            _matrix = load_matrix()
+        if force or _matrix is None or time.monotonic() - _last_refreshed > SCREENER_REFRESH_SECONDS:
+            tickers = [f"{s}.NS" for s in get_nifty_500_stocks()]
+            refreshed = refresh_matrix(session, _matrix, tickers)
+            if refreshed is not _matrix:
+                save_matrix(refreshed)
+                _matrix = load_matrix() or refreshed
+            _last_refreshed = time.monotonic()
+        return _matrix
+
+
+def screen(session: Session, expression: Optional[str] = None, sort: str = "ret_5", ascending: bool = False, limit: int = 50, columns: Optional[list[str]] = None, refresh: bool = False) -> dict:
+    # Evaluates the filter for every ticker at once and ranks the matches by the sort expression
+    matrix = get_matrix(session, force=refresh)
+    if len(matrix.dates) == 0:
+        return {"as_of": None, "universe": len(matrix.tickers), "matched": 0, "results": []}
+
+    metrics = MetricFrame(matrix)
+    mask = np.ones(len(matrix.tickers), dtype=bool)
+    if expression:
+        mask = np.broadcast_to(np.asarray(evaluate_expression(expression, metrics), dtype=bool), mask.shape)
+
+    sort_values = np.broadcast_to(np.asarray(evaluate_expression(sort, metrics), dtype=np.float64), mask.shape)
+    mask = mask & ~np.isnan(sort_values)
+    idx = np.flatnonzero(mask)
+    order = np.argsort(sort_values[idx], kind="stable")
+    if not ascending:
+        order = order[::-1]
+    idx = idx[order][:limit]
+
+    for name in columns or []:
+        metrics[name]
+    names = list(dict.fromkeys(["close"] + list(metrics.values)))
+    results = []
+    for i in idx:
+        row = {"ticker": matrix.tickers[i], "score": float(sort_values[i])}
+        for name in names:
+            value = float(metrics[name][i])
+            row[name] = None if np.isnan(value) else value
+        results.append(row)
+
+    return {
+        "as_of": str(matrix.dates[-1]),
+        "universe": len(matrix.tickers),
+        "matched": int(mask.sum()),
+        "results": results,
+    }
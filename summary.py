@@ -0,0 +1,120 @@
+import os
+import time
+import logging
+import pandas as pd
+from contextvars import copy_context
+from typing import Callable, Iterator, NamedTuple, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from transcript import SUMMARY_SECTIONS, SummarySections, build_structured_prompt, parse_structured_summary
+from llm_cache import estimate_tokens, fetch_text, track_usage
+from prompts import PROMPT_TOKEN_BUDGET
+
+logger = logging.getLogger(__name__)
+
+# sections: one model call per field; structured: one JSON-schema call for all fields
+SUMMARY_MODE_SECTIONS = "sections"
+SUMMARY_MODE_STRUCTURED = "structured"
+SUMMARY_MODES = [SUMMARY_MODE_SECTIONS, SUMMARY_MODE_STRUCTURED]
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", SUMMARY_MODE_SECTIONS)
+
+# Maximum number of model calls in flight for one summary
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+
+# Seconds a single section may run before it is reported as timed out
+SUMMARY_SECTION_TIMEOUT = float(os.getenv("SUMMARY_SECTION_TIMEOUT", "120"))
+
+
+class SectionResult(NamedTuple):
+    section: str
+    text: Optional[str] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    usage: Optional[dict] = None
+
+
+def run_summary_sections(
+    transcript_df: pd.DataFrame,
+    sections: Optional[dict[str, Callable[[pd.DataFrame], str]]] = None,
+    concurrency: int = SUMMARY_CONCURRENCY,
+    timeout: float = SUMMARY_SECTION_TIMEOUT,
+) -> Iterator[SectionResult]:
+    # Run every section on a bounded thread pool and yield results in completion order
+    sections = SUMMARY_SECTIONS if sections is None else sections
+    started_at: dict[str, float] = {}
+    section_usage: dict[str, dict] = {}
+
+    def run_section(section: str, extract: Callable[[pd.DataFrame], str]) -> str:
+        started_at[section] = time.monotonic()
+        with track_usage() as usage:
+            try:
+                return extract(transcript_df)
+            finally:
+                section_usage[section] = usage.as_dict()
+
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="summary")
+    # Each section runs in a copy of the caller's context so its usage also counts towards the caller's tracker
+    future_to_section = {executor.submit(copy_context().run, run_section, section, extract): section for section, extract in sections.items()}
+    pending = set(future_to_section)
+
+    try:
+        while pending:
+            now = time.monotonic()
+            deadlines = [started_at[future_to_section[f]] + timeout for f in pending if future_to_section[f] in started_at]
+            wait_timeout = max(0.0, min(deadlines) - now) if deadlines else timeout
+            done, pending = wait(pending, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                section = future_to_section[future]
+                elapsed = time.monotonic() - started_at.get(section, now)
+                try:
+                    yield SectionResult(section, text=future.result(), elapsed=elapsed, usage=section_usage.get(section))
+                except Exception as exc:  # noqa: BLE001
+                    yield SectionResult(section, error=f"{type(exc).__name__}: {exc}", elapsed=elapsed, usage=section_usage.get(section))
+
+            # A timed-out call keeps its worker thread busy, but nobody waits for it anymore
+            now = time.monotonic()
+            for future in list(pending):
+                section = future_to_section[future]
+                if section in started_at and now - started_at[section] >= timeout:
+                    pending.discard(future)
+                    future.cancel()
+                    yield SectionResult(section, error=f"Timed out after {timeout:.0f}s", elapsed=now - started_at[section])
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_structured_summary(
+    transcript_df: pd.DataFrame,
+    concurrency: int = SUMMARY_CONCURRENCY,
+    timeout: float = SUMMARY_SECTION_TIMEOUT,
+) -> Iterator[SectionResult]:
+    # Sends the transcript once for every field; fields that fail validation fall back to their own call
+    prompt = build_structured_prompt(transcript_df)
+    if estimate_tokens(prompt) > PROMPT_TOKEN_BUDGET:
+        # Too long for one call, the per-section path map-reduces each section instead
+        yield from run_summary_sections(transcript_df, concurrency=concurrency, timeout=timeout)
+        return
+
+    structured = {"structured": lambda _: fetch_text(prompt=prompt, response_schema=SummarySections)}
+    (result,) = list(run_summary_sections(transcript_df, structured, concurrency=1, timeout=timeout))
+    if result.error is None:
+        section_dict, error_dict = parse_structured_summary(result.text)
+    else:
+        section_dict, error_dict = {}, {section: result.error for section in SUMMARY_SECTIONS}
+
+    for section, text in section_dict.items():
+        yield SectionResult(section, text=text, elapsed=result.elapsed)
+
+    if error_dict:
+        logger.warning("Structured summary fell back to per-section calls for %s", error_dict)
+        fallback = {section: SUMMARY_SECTIONS[section] for section in error_dict}
+        yield from run_summary_sections(transcript_df, fallback, concurrency=concurrency, timeout=timeout)
+
+
+def run_summary(transcript_df: pd.DataFrame, mode: str = SUMMARY_MODE, **kwargs) -> Iterator[SectionResult]:
+    if mode == SUMMARY_MODE_STRUCTURED:
+        return run_structured_summary(transcript_df, **kwargs)
+    if mode == SUMMARY_MODE_SECTIONS:
+        return run_summary_sections(transcript_df, **kwargs)
+    raise ValueError(f"Unsupported summary mode {mode!r}, expected one of {SUMMARY_MODES}")
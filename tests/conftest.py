@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set before any app module is imported: tests never touch the real database or Gemini
+os.environ["SQLITE_FILE_NAME"] = os.path.join(tempfile.mkdtemp(prefix="stock_tests_"), "test.db")
+os.environ.setdefault("GEMINI_API_KEY", "stub")
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+import backtest
+
+
+def random_closes(days: int, tickers: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (days, tickers)), axis=0))
+    close[: days // 4, 0] = np.nan  # listed late
+    return close
+
+
+@pytest.fixture
+def process_sweeps(tmp_path, monkeypatch):
+    # Every sweep goes through the worker processes
+    monkeypatch.setattr(backtest, "SCREENER_DIR", str(tmp_path))
+    monkeypatch.setattr(backtest, "BACKTEST_PROCESS_THRESHOLD", 0)
+    yield
+    backtest.shutdown_pool()
+
+
+@pytest.mark.parametrize("strategy,grid", [
+    ("sma_crossover", {"fast": [5, 10], "slow": [20, 40]}),
+    ("momentum_rank", {"lookback": [20, 60], "top_n": [2, 3]}),
+])
+def test_parallel_sweep_matches_serial(process_sweeps, strategy, grid):
+    combos = backtest.expand_grid(strategy, grid)
+    # A second matrix of the same shape must not be served from the first sweep's mapping
+    for seed in (0, 1):
+        close = random_closes(300, 6, seed)
+        serial = backtest.sweep(close, strategy, combos, processes=1)
+        parallel = backtest.sweep(close, strategy, combos, processes=2)
+        assert len(parallel) == len(serial) == len(combos)
+        for serial_stats, parallel_stats in zip(serial, parallel):
+            for name in backtest.STATS:
+                np.testing.assert_array_equal(parallel_stats[name], serial_stats[name])
+
+
+def test_portfolio_returns_drift_between_rebalances():
+    # 50/50 on day 0, A gains 10% on days 1 and 2, then back to 50/50 on day 3
+    ret = np.array([[0.0, 0.0], [0.1, 0.0], [0.1, 0.0], [0.0, 0.0]])
+    targets = np.full(ret.shape, np.nan)
+    targets[0] = targets[3] = 0.5
+    port_ret, gross, trades = backtest.portfolio_returns(targets, ret, cost=0.01)
+
+    equity = np.cumprod(1 + port_ret[:, 0] + 0.01 * trades[:, 0])
+    np.testing.assert_allclose(equity[2], 0.5 * 1.1 ** 2 + 0.5)
+    drifted = 0.5 * 1.1 ** 2 / (0.5 * 1.1 ** 2 + 0.5)
+    np.testing.assert_allclose(trades[:, 0], [1.0, 0.0, 0.0, 2 * (drifted - 0.5)])
+    np.testing.assert_allclose(gross[:, 0], 1.0)
+    np.testing.assert_allclose(port_ret[0, 0], -0.01)
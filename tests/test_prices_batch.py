@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+from sqlmodel import Session, SQLModel, select
+
+import prices
+from db import create_sqlite_engine
+from models import StockDailyPrice
+
+FIELDS = ["Adj Close", "Close", "High", "Low", "Open", "Volume"]
+
+
+def batch_frame(tickers: list[str], start: str = "2025-01-01", days: int = 5) -> pd.DataFrame:
+    # Shaped like yf.download(group_by="column"): (field, ticker) columns over a Date index
+    dates = pd.bdate_range(start, periods=days, name="Date")
+    columns = pd.MultiIndex.from_product([FIELDS, tickers], names=["Price", "Ticker"])
+    df = pd.DataFrame(index=dates, columns=columns, dtype=float)
+    for offset, ticker in enumerate(tickers):
+        for field in FIELDS:
+            df[(field, ticker)] = [100.0 * (offset + 1) + day for day in range(days)]
+    return df
+
+
+class FakeDownloader:
+    def __init__(self, listed: list[str]):
+        self.listed = listed
+        self.calls = []
+
+    def __call__(self, tickers, **kwargs):
+        self.calls.append((list(tickers), kwargs))
+        return batch_frame([ticker for ticker in tickers if ticker in self.listed])
+
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'prices.db'}")
+    SQLModel.metadata.create_all(engine)
+    prices._last_synced.clear()
+    prices._first_bar.clear()
+    prices._known_gaps.clear()
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def test_split_batch_df_splits_per_ticker():
+    history_df_dict = prices.split_batch_df(batch_frame(["AAA.NS", "BBB.NS"]), ["AAA.NS", "BBB.NS", "CCC.NS"])
+
+    assert set(history_df_dict) == {"AAA.NS", "BBB.NS"}
+    for offset, ticker in enumerate(["AAA.NS", "BBB.NS"]):
+        history_df = history_df_dict[ticker]
+        assert list(history_df.columns) == ["Date"] + FIELDS
+        assert history_df["Close"].tolist() == [100.0 * (offset + 1) + day for day in range(5)]
+
+
+def test_split_batch_df_single_ticker_frame():
+    # One ticker comes back with flat columns
+    df = batch_frame(["AAA.NS"]).droplevel(1, axis=1)
+    history_df_dict = prices.split_batch_df(df, ["AAA.NS"])
+
+    assert list(history_df_dict) == ["AAA.NS"]
+    assert len(history_df_dict["AAA.NS"]) == 5
+
+
+def test_sync_batch_reports_missing_tickers(session):
+    downloader = FakeDownloader(listed=["AAA.NS", "BBB.NS"])
+    results = list(prices.sync_batch(session, ["aaa.ns", "BBB.NS", "CCC.NS", "AAA.NS"], period="max", chunk_size=2, downloader=downloader))
+
+    statuses = {result["ticker"]: result["status"] for result in results}
+    assert statuses == {"AAA.NS": "ok", "BBB.NS": "ok", "CCC.NS": "empty"}
+    assert [tickers for tickers, _ in downloader.calls] == [["AAA.NS", "BBB.NS"], ["CCC.NS"]]
+
+    for offset, ticker in enumerate(["AAA.NS", "BBB.NS"]):
+        rows = session.exec(select(StockDailyPrice).where(StockDailyPrice.ticker == ticker).order_by(StockDailyPrice.date)).all()
+        assert [row.close for row in rows] == [100.0 * (offset + 1) + day for day in range(5)]
+    assert session.exec(select(StockDailyPrice).where(StockDailyPrice.ticker == "CCC.NS")).all() == []
+
+
+def test_sync_batch_upstream_error(session):
+    def failing_downloader(tickers, **kwargs):
+        raise ConnectionError("rate limited")
+
+    results = list(prices.sync_batch(session, ["AAA.NS", "BBB.NS"], period="max", downloader=failing_downloader))
+
+    assert [result["status"] for result in results] == ["error", "error"]
+    assert "rate limited" in results[0]["detail"]
@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+from sqlmodel import Session, SQLModel, select
+
+import prices
+from db import create_sqlite_engine
+from models import StockDailyPrice
+
+LISTED = pd.Timestamp("2025-01-01")
+
+
+class FakeHistory:
+    # Business-day bars from LISTED to today, optionally with a suspension, priced as base * factor
+    def __init__(self, factor: float = 1.0, suspended: tuple = ()):
+        self.factor = factor
+        self.suspended = suspended
+        self.calls = []
+
+    def __call__(self, ticker, **kwargs):
+        self.calls.append(kwargs)
+        today = pd.Timestamp.now().normalize()
+        start = max(pd.Timestamp(kwargs.get("start", LISTED)), LISTED)
+        end = pd.Timestamp(kwargs.get("end", today + pd.Timedelta(days=1)))
+        dates = pd.bdate_range(start, end - pd.Timedelta(days=1), name="Date")
+        if self.suspended:
+            dates = dates[(dates < self.suspended[0]) | (dates > self.suspended[1])]
+        close = [100.0 * self.factor + (date - LISTED).days for date in dates]
+        return pd.DataFrame({"Adj Close": close, "Close": close, "High": close, "Low": close, "Open": close, "Volume": 10}, index=dates)
+
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_sqlite_engine(f"sqlite:///{tmp_path / 'prices.db'}")
+    SQLModel.metadata.create_all(engine)
+    prices._last_synced.clear()
+    prices._first_bar.clear()
+    prices._known_gaps.clear()
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def expire(ticker: str):
+    synced_at, start = prices._last_synced[ticker]
+    prices._last_synced[ticker] = (synced_at - prices.SYNC_TTL, start)
+
+
+def test_restated_history_is_downloaded_again(session, monkeypatch):
+    history = FakeHistory()
+    monkeypatch.setattr(prices.yf, "download", history)
+    prices.sync_history(session, "ABC.NS", "3y")
+
+    # A 1:2 split restates every bar upstream
+    history.factor = 0.5
+    expire("ABC.NS")
+    rows = prices.sync_history(session, "ABC.NS", "3y")
+
+    assert rows[0].close == 50.0
+    assert history.calls[-1]["start"] == LISTED.date()
+
+
+def test_unchanged_history_only_fetches_the_tail(session, monkeypatch):
+    history = FakeHistory()
+    monkeypatch.setattr(prices.yf, "download", history)
+    prices.sync_history(session, "ABC.NS", "3y")
+    calls = len(history.calls)
+
+    expire("ABC.NS")
+    prices.sync_history(session, "ABC.NS", "3y")
+
+    assert len(history.calls) == calls + 1
+    assert pd.Timestamp(history.calls[-1]["start"]) >= pd.Timestamp.now().normalize() - pd.Timedelta(days=7)
+
+
+def test_suspension_gap_is_not_requested_again(session, monkeypatch):
+    history = FakeHistory(suspended=(pd.Timestamp("2025-03-01"), pd.Timestamp("2025-03-31")))
+    monkeypatch.setattr(prices.yf, "download", history)
+    prices.sync_history(session, "ABC.NS", "3y")
+    # A sync that still finds the gap, afterwards upstream is not asked for it
+    expire("ABC.NS")
+    prices.sync_history(session, "ABC.NS", "3y")
+    calls = len(history.calls)
+
+    expire("ABC.NS")
+    prices.sync_history(session, "ABC.NS", "3y")
+
+    assert len(history.calls) == calls + 1
+    assert pd.Timestamp(history.calls[-1]["start"]) > pd.Timestamp("2025-04-01")
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+import screener
+
+
+def make_matrix(days: int = 30, extra_day: bool = True) -> screener.ScreenerMatrix:
+    # Three rising tickers; with extra_day the last one already has a bar for one more date
+    dates = np.arange(np.datetime64("2025-01-01"), np.datetime64("2025-01-01") + days + 1)
+    close = np.array([[100.0 + day, 200.0 + 2 * day, 50.0 + day] for day in range(days + 1)])
+    volume = np.full(close.shape, 1000.0)
+    if extra_day:
+        close[-1, :2] = volume[-1, :2] = np.nan
+    else:
+        dates, close, volume = dates[:-1], close[:-1], volume[:-1]
+    return screener.ScreenerMatrix(dates, ["AAA.NS", "BBB.NS", "CCC.NS"], close, volume)
+
+
+@pytest.fixture
+def use_matrix(monkeypatch):
+    def use(matrix):
+        monkeypatch.setattr(screener, "get_matrix", lambda session, force=False: matrix)
+    return use
+
+
+def test_metrics_as_of_each_tickers_last_bar():
+    metrics = screener.MetricFrame(make_matrix())
+
+    np.testing.assert_allclose(metrics["close"], [129.0, 258.0, 80.0])
+    np.testing.assert_allclose(metrics["ret_5"], [129 / 124 - 1, 258 / 248 - 1, 80 / 75 - 1])
+    np.testing.assert_allclose(metrics["avg_volume_10"], 1000.0)
+
+
+def test_screen_keeps_tickers_behind_the_latest_date(use_matrix):
+    use_matrix(make_matrix())
+    result = screener.screen(None, "ret_5 > 0")
+
+    assert result["matched"] == 3
+    assert {row["ticker"] for row in result["results"]} == {"AAA.NS", "BBB.NS", "CCC.NS"}
+
+
+def test_stale_tickers_are_left_out(use_matrix):
+    matrix = make_matrix(extra_day=False)
+    matrix.adj_close[-screener.SCREENER_STALE_ROWS:, 0] = np.nan
+    use_matrix(matrix)
+
+    assert {row["ticker"] for row in screener.screen(None, "ret_5 > 0")["results"]} == {"BBB.NS", "CCC.NS"}
+
+
+def test_window_longer_than_history(use_matrix):
+    use_matrix(make_matrix())
+    with pytest.raises(ValueError, match="exceeds"):
+        screener.screen(None, "ret_100 > 0")
+
+
+@pytest.mark.parametrize("expression,matched", [("1/0 > 0", 3), ("0/0 > 0", 0), ("ret_5 > 1/0", 0)])
+def test_constant_division_by_zero(use_matrix, expression, matched):
+    # inf and NaN like numpy, not a ZeroDivisionError
+    use_matrix(make_matrix())
+    assert screener.screen(None, expression)["matched"] == matched
+
+
+def test_constant_only_filter(use_matrix):
+    use_matrix(make_matrix())
+    assert screener.screen(None, "2 > 1")["matched"] == 3
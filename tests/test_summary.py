@@ -0,0 +1,132 @@
+import json
+import time
+import threading
+import pandas as pd
+import pytest
+from types import SimpleNamespace
+from sqlalchemy import delete
+from sqlmodel import Session
+
+import llm_cache
+import summary
+from db import create_db_and_tables, engine
+from models import LLMResponseCache
+from transcript import SECTION_QUERIES, SUMMARY_SECTIONS
+
+
+class StubFetch:
+    # Stands in for google_genai.fetch_response, answers depend only on the prompt
+    def __init__(self, latency: float = 0.02, empty_fields: tuple = ()):
+        self.latency = latency
+        self.empty_fields = empty_fields
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, model=None, response_schema=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if response_schema is None:
+            text = f"- point on {llm_cache.prompt_hash(prompt)[:8]}"
+        else:
+            text = json.dumps({field: "" if field in self.empty_fields else f"- structured {field}" for field in SECTION_QUERIES})
+        return SimpleNamespace(text=text, usage_metadata=None)
+
+
+@pytest.fixture
+def stub_fetch(monkeypatch):
+    create_db_and_tables()
+    with Session(engine) as session:
+        session.exec(delete(LLMResponseCache))
+        session.commit()
+    stub = StubFetch()
+    monkeypatch.setattr(llm_cache, "fetch_response", stub)
+    return stub
+
+
+@pytest.fixture
+def transcript_df():
+    turns = [
+        ("Moderator", "Moderator", "Welcome to the call."),
+        ("A. Manager", "Management", "Revenue grew 20% and margins expanded."),
+        ("A. Manager", "Management", "We expect 15% growth next year."),
+        ("B. Analyst", "Question", "What drove the margin expansion?"),
+        ("A. Manager", "Management", "Mix and lower gold prices."),
+    ]
+    return pd.DataFrame({
+        "transcript_index": range(1, len(turns) + 1),
+        "speaker": [t[0] for t in turns],
+        "speaker_type": [t[1] for t in turns],
+        "transcript": [t[2] for t in turns],
+    })
+
+
+def sleeping_sections(count: int, seconds: float, in_flight: list, peak: list) -> dict:
+    lock = threading.Lock()
+
+    def section(_):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(seconds)
+        with lock:
+            in_flight[0] -= 1
+        return "ok"
+
+    return {f"s{i}": section for i in range(count)}
+
+
+def test_concurrency_limit(transcript_df):
+    in_flight, peak = [0], [0]
+    results = list(summary.run_summary_sections(transcript_df, sleeping_sections(6, 0.05, in_flight, peak), concurrency=2))
+
+    assert peak[0] == 2
+    assert sorted(r.section for r in results) == [f"s{i}" for i in range(6)]
+    assert all(r.error is None for r in results)
+
+
+def test_slow_section_times_out(transcript_df):
+    sections = {"fast": lambda _: "done", "slow": lambda _: time.sleep(2) or "late"}
+    started_at = time.monotonic()
+    results = {r.section: r for r in summary.run_summary_sections(transcript_df, sections, concurrency=2, timeout=0.2)}
+
+    assert time.monotonic() - started_at < 1.5
+    assert results["fast"].text == "done"
+    assert results["slow"].text is None and results["slow"].error.startswith("Timed out")
+
+
+def test_failing_section_keeps_the_others(transcript_df):
+    def fail(_):
+        raise RuntimeError("quota exceeded")
+
+    sections = {"ok": lambda _: "text", "broken": fail}
+    results = {r.section: r for r in summary.run_summary_sections(transcript_df, sections)}
+
+    assert results["ok"].text == "text"
+    assert results["broken"].error == "RuntimeError: quota exceeded"
+
+
+def test_parallel_matches_sequential(transcript_df, stub_fetch):
+    parallel = {r.section: r.text for r in summary.run_summary_sections(transcript_df, concurrency=4)}
+    assert stub_fetch.calls == len(SUMMARY_SECTIONS)
+
+    with Session(engine) as session:
+        session.exec(delete(LLMResponseCache))
+        session.commit()
+    sequential = {r.section: r.text for r in summary.run_summary_sections(transcript_df, concurrency=1)}
+
+    assert stub_fetch.calls == 2 * len(SUMMARY_SECTIONS)
+    assert parallel == sequential
+    assert set(parallel) == set(SUMMARY_SECTIONS) and all(parallel.values())
+
+
+def test_structured_falls_back_per_section(transcript_df, stub_fetch):
+    stub_fetch.empty_fields = ("qna_key_points",)
+    results = {r.section: r for r in summary.run_summary(transcript_df, summary.SUMMARY_MODE_STRUCTURED)}
+
+    assert set(results) == set(SUMMARY_SECTIONS)
+    assert all(r.error is None for r in results.values())
+    assert results["summary"].text == "- structured summary"
+    assert results["qna_key_points"].text.startswith("- point on")
+    # One structured call, then one per-section call for the invalid field
+    assert stub_fetch.calls == 2
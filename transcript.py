@@ -1,162 +1,260 @@
 import os
 import re
+import json
+import hashlib
 import pandas as pd
+from typing import Optional, Union
+from pydantic import Field, ValidationError, create_model
 from PyPDF2 import PdfReader
 
-from google_genai import fetch_response
+from metrics import count_cache, timed
+from pdf_extract import PDF_BACKEND, extract_pdf_pages, has_ocr, resolve_backend
+from prompts import MANAGEMENT_HEADER, QNA_HEADER, Context, build_prompt, summarize
 
 TICKER_MAPPING = {
     "HDFCBANK.NS": "hdfc",
     "TITAN.NS": "titan"
 }
 
+PDF_TEXT_CACHE_DIR = os.getenv("PDF_TEXT_CACHE_DIR", "./.cache/pdf_text")
+
+MODERATOR_PATTERN = re.compile('Moderator')
+PAGE_NUMBER_PATTERN = re.compile("Page [0-9]+ of [0-9]+")
+DIGIT_COLON_PATTERN = re.compile('([0-9]) ?:')
+
+
 def get_transcript_path(ticker: str, quarter: str) -> str:
     filepath = f"./pdfs/{TICKER_MAPPING[ticker]}_{quarter}.pdf"
     return filepath
 
 
-def load_transcript(filepath: str) -> PdfReader:
+def _page_cache_path(filepath: str, backend: str) -> str:
+    stat = os.stat(filepath)
+    key = f"{os.path.abspath(filepath)}:{stat.st_mtime_ns}:{stat.st_size}:{backend}"
+    return os.path.join(PDF_TEXT_CACHE_DIR, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+
+def extract_pages(filepath: str, backend: str = PDF_BACKEND) -> list[str]:
+    # Decode each PDF once, page texts are cached on disk keyed by path, mtime, size and backend
     if not os.path.exists(filepath):
         raise FileNotFoundError(f'File Path {filepath} not found.')
-    reader = PdfReader(filepath)
-    return reader
+
+    # Whether auto could fall back to OCR is part of the key, pages left empty before MISTRAL_API_KEY was set get filled once it is
+    ocr = "ocr" if backend == "auto" and has_ocr() else "no-ocr"
+    cache_path = _page_cache_path(filepath, f"{backend}:{resolve_backend(backend)}:{ocr}")
+    count_cache("pdf_text", hit=os.path.exists(cache_path))
+    if os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    with timed("pdf", "extract_text"):
+        page_texts = extract_pdf_pages(filepath, backend)
+
+    os.makedirs(PDF_TEXT_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(page_texts, f)
+    os.replace(tmp_path, cache_path)
+    return page_texts
 
 
-def preprocess_transcript(reader: PdfReader) -> pd.DataFrame:
-    pages = reader.pages
-    transcript_text_list = []
+def load_transcript(filepath: str, backend: str = PDF_BACKEND) -> list[str]:
+    return extract_pages(filepath, backend)
 
-    transcript_begin_page_text = pages[2].extract_text()
-    anchor_index = re.search('Moderator', transcript_begin_page_text).start()
+
+def _split_last_turn(text: str) -> tuple[str, str]:
+    # Split at the end of the last "? ", ". " or newline, the remainder is the next speaker's name
+    end = max(
+        text.rfind("? ") + 2 if "? " in text else 0,
+        text.rfind(". ") + 2 if ". " in text else 0,
+        text.rfind("\n") + 1,
+    )
+    return text[:end], text[end:]
+
+
+def preprocess_transcript(pages: Union[list[str], PdfReader]) -> pd.DataFrame:
+    if isinstance(pages, PdfReader):
+        pages = [page.extract_text() for page in pages.pages]
+
+    transcript_begin_page_text = pages[2]
+    anchor_index = MODERATOR_PATTERN.search(transcript_begin_page_text).start()
     common_page_prefix = transcript_begin_page_text[:anchor_index].rstrip()
-    common_page_prefix_pattern = re.sub("Page [0-9]+ of [0-9]+", "Page [0-9]+ of [0-9]+", common_page_prefix)
-    
-    for page in pages[2:]:
-        text = page.extract_text()
-        # text = r'\n \n'.join(text.split('\n \n')[1:])
-        # text = text.replace(common_page_prefix, '')
-        text = re.sub(common_page_prefix_pattern, '', text).lstrip()
-        # print(text)
-        transcript_text_list.append(text)
-    
-    transcript_text = '\n' + ' \n'.join(transcript_text_list)
-
-    transcript_text = re.sub('([0-9]) ?:', r'\1*colon*', transcript_text)
-    colon_splitted_list = transcript_text.split(':')
-    colon_splitted_list = [re.sub('\*colon\*', ':', t) for t in colon_splitted_list]
-
-    colon_newline_splitted_list = [
-        # ['\n'.join(t.split('\n')[:-1]), t.split('\n')[-1]] if idx < (len(colon_splitted_list) - 1)  else [t]
-        [''.join(re.split('(\? |\. |\n)', t)[:-1]), re.split('(\? |\. |\n)', t)[-1]] if idx < (len(colon_splitted_list) - 1)  else [t]
-        for idx, t in enumerate(colon_splitted_list)
-    ]
-    colon_newline_splitted_list = [t for tlist in colon_newline_splitted_list for t in tlist][1:]
-    speaker_list = colon_newline_splitted_list[::2]
-    transcription_list = colon_newline_splitted_list[1::2]
+    common_page_prefix_pattern = re.compile(PAGE_NUMBER_PATTERN.sub("Page [0-9]+ of [0-9]+", common_page_prefix))
+
+    transcript_text = '\n' + ' \n'.join(common_page_prefix_pattern.sub('', text).lstrip() for text in pages[2:])
+
+    # Colons after digits (timestamps, ratios) are not speaker separators
+    transcript_text = DIGIT_COLON_PATTERN.sub(r'\1*colon*', transcript_text)
+    colon_splitted_list = [t.replace('*colon*', ':') for t in transcript_text.split(':')]
+
+    # Every chunk but the last ends with the name of the next speaker
+    segment_list = []
+    for t in colon_splitted_list[:-1]:
+        segment_list.extend(_split_last_turn(t))
+    segment_list.append(colon_splitted_list[-1])
+    segment_list = segment_list[1:]
+
+    speaker_list = segment_list[::2]
+    transcription_list = segment_list[1::2]
+
+    management_text = pages[1].lower().replace(' ', '')
+    speaker_type_list = []
+    for idx, speaker in enumerate(speaker_list):
+        if 'Moderator' in speaker:
+            speaker_list[idx] = 'Moderator'
+            speaker_type_list.append('Moderator')
+        elif speaker.lower().replace(' ', '') in management_text:
+            speaker_type_list.append('Management')
+        else:
+            speaker_type_list.append('Question')
+
     transcript_df = pd.DataFrame(data={
         'transcript_index': list(range(1, len(speaker_list) + 1)),
         'speaker': speaker_list,
-        'transcript': transcription_list
+        'transcript': transcription_list,
+        'speaker_type': speaker_type_list,
     })
-
-    management_text = pages[1].extract_text()
-
-    transcript_df['speaker_type'] = transcript_df['speaker'].apply(lambda x: 'Management' if x.lower().replace(' ', '') in management_text.lower().replace(' ', '') else 'Question')
-    transcript_df.loc[transcript_df['speaker'].apply(lambda x: 'Moderator' in x), 'speaker'] = 'Moderator'
-    transcript_df.loc[transcript_df['speaker'].apply(lambda x: 'Moderator' in x), 'speaker_type'] = 'Moderator'
     return transcript_df
 
 
-def extract_summary(transcript_df: pd.DataFrame) -> str:
-    # Filter the text discussed by management and extract the highlights, if any
-    first_question_tid = transcript_df[transcript_df['speaker_type'] == 'Question']['transcript_index'].min()
+def split_transcript(transcript_df: pd.DataFrame) -> tuple[list[str], list[str]]:
+    # Management remarks before the first analyst question, and every turn of the Q&A after it
+    question_df = transcript_df[transcript_df['speaker_type'] == 'Question']
+    if question_df.empty:
+        first_question_tid = transcript_df['transcript_index'].max() + 1
+    else:
+        first_question_tid = question_df['transcript_index'].min()
+
     management_df = transcript_df[transcript_df['transcript_index'] < first_question_tid]
     management_df = management_df[management_df['speaker_type'] == 'Management']
-    management_text = '\n'.join(transcript_df['transcript'].values.tolist())
-    management_context = f"This is the text from earnings transcript as told by management.\n\n{management_text}"
+    management_lines = management_df['transcript'].values.tolist()
 
-    # Filter the text discussed witihn Q&A and extract the highlights, if any
     qna_df = transcript_df[transcript_df['transcript_index'] >= first_question_tid]
-    qna_text = "\n".join((qna_df['speaker_type'] + ": " + qna_df['transcript']).values.tolist())
-    qna_context = f"This is the QnA text from earnings transcript between management and analysts.\n\n{qna_text}"
+    qna_lines = (qna_df['speaker_type'] + ": " + qna_df['transcript']).values.tolist()
 
-    query = "Extract and summarize the whole transcript. Write in at max 10 points."
-    prompt = f"{management_context}\n\n{qna_context}\n\n{query}"
-    summary = fetch_response(prompt=prompt).text
+    return management_lines, qna_lines
 
-    return summary
 
+# Instruction for each StockTranscriptSummary field
+SECTION_QUERIES = {
+    'summary': "Extract and summarize the whole transcript. Write in at max 10 points.",
+    'revenue_profit_highlight_management': "Extract and summarize the revenue/profit highlights if discussed anywhere. Write in at max 3 points.",
+    'revenue_profit_highlight_qna': "Extract and summarize the revenue/profit highlights from QnA if discussed anywhere. Write in at max 3 points.",
+    'management_commentary': "Extract and summarize the management commentary. Write in at max 5 points.",
+    'guidance_outlook_summary_management': "Extract and summarize the guidance/outlook if discussed anywhere. Write in at max 3 points.",
+    'guidance_outlook_summary_qna': "Extract and summarize the guidance/outlook from QnA if discussed anywhere. Write in at max 3 points.",
+    'qna_key_points': "Extract and summarize the key points from QnA. Write in at max 10 points.",
+}
 
-def extract_revenue_profit_highlights(transcript_df: pd.DataFrame) -> dict[str, str]:
-    # Filter the text discussed by management and extract the highlights, if any
-    first_question_tid = transcript_df[transcript_df['speaker_type'] == 'Question']['transcript_index'].min()
-    management_df = transcript_df[transcript_df['transcript_index'] < first_question_tid]
-    management_df = management_df[management_df['speaker_type'] == 'Management']
-    management_text = '\n'.join(transcript_df['transcript'].values.tolist())
-    management_context = f"This is the text from earnings transcript as told by management.\n\n{management_text}"
-    query = "Extract and summarize the revenue/profit highlights if discussed anywhere. Write in at max 3 points."
-    prompt = f"{management_context}\n\n{query}"
-    management_highlight = fetch_response(prompt=prompt).text
 
-    # Filter the text discussed witihn Q&A and extract the highlights, if any
-    qna_df = transcript_df[transcript_df['transcript_index'] >= first_question_tid]
-    qna_text = "\n".join((qna_df['speaker_type'] + ": " + qna_df['transcript']).values.tolist())
-    qna_context = f"This is the QnA text from earnings transcript between management and analysts.\n\n{qna_text}"
-    query = "Extract and summarize the revenue/profit highlights from QnA if discussed anywhere. Write in at max 3 points."
-    prompt = f"{management_context}\n\n{qna_context}\n\n{query}"
-    qna_highlight = fetch_response(prompt=prompt).text
+def _management_only(transcript_df: pd.DataFrame) -> list[Context]:
+    management_lines, _ = split_transcript(transcript_df)
+    return [(MANAGEMENT_HEADER, management_lines)]
+
+
+def _qna_only(transcript_df: pd.DataFrame) -> list[Context]:
+    _, qna_lines = split_transcript(transcript_df)
+    return [(QNA_HEADER, qna_lines)]
+
 
+def extract_summary(transcript_df: pd.DataFrame) -> str:
+    management_lines, qna_lines = split_transcript(transcript_df)
+    query = SECTION_QUERIES['summary']
+    return summarize([(MANAGEMENT_HEADER, management_lines), (QNA_HEADER, qna_lines)], query)
+
+
+def extract_revenue_profit_highlights_management(transcript_df: pd.DataFrame) -> str:
+    query = SECTION_QUERIES['revenue_profit_highlight_management']
+    return summarize(_management_only(transcript_df), query)
+
+
+def extract_revenue_profit_highlights_qna(transcript_df: pd.DataFrame) -> str:
+    query = SECTION_QUERIES['revenue_profit_highlight_qna']
+    return summarize(_qna_only(transcript_df), query)
+
+
+def extract_revenue_profit_highlights(transcript_df: pd.DataFrame) -> dict[str, str]:
     return {
-        'management': management_highlight,
-        'qna': qna_highlight
+        'management': extract_revenue_profit_highlights_management(transcript_df),
+        'qna': extract_revenue_profit_highlights_qna(transcript_df)
     }
 
 
 def extract_management_commentary(transcript_df: pd.DataFrame) -> str:
-    # Filter the text discussed by management and extract the highlights, if any
-    first_question_tid = transcript_df[transcript_df['speaker_type'] == 'Question']['transcript_index'].min()
-    management_df = transcript_df[transcript_df['transcript_index'] < first_question_tid]
-    management_df = management_df[management_df['speaker_type'] == 'Management']
-    management_text = '\n'.join(transcript_df['transcript'].values.tolist())
-    management_context = f"This is the text from earnings transcript as told by management.\n\n{management_text}"
-    query = "Extract and summarize the management commentary. Write in at max 5 points."
-    prompt = f"{management_context}\n\n{query}"
-    management_commentary = fetch_response(prompt=prompt).text
-    return management_commentary
+    query = SECTION_QUERIES['management_commentary']
+    return summarize(_management_only(transcript_df), query)
 
 
-def extract_guidance_outlook(transcript_df: pd.DataFrame) -> dict[str, str]:
-    # Filter the text discussed by management and extract the highlights, if any
-    first_question_tid = transcript_df[transcript_df['speaker_type'] == 'Question']['transcript_index'].min()
-    management_df = transcript_df[transcript_df['transcript_index'] < first_question_tid]
-    management_df = management_df[management_df['speaker_type'] == 'Management']
-    management_text = '\n'.join(transcript_df['transcript'].values.tolist())
-    management_context = f"This is the text from earnings transcript as told by management.\n\n{management_text}"
-    query = "Extract and summarize the guidance/outlook if discussed anywhere. Write in at max 3 points."
-    prompt = f"{management_context}\n\n{query}"
-    management_summary = fetch_response(prompt=prompt).text
+def extract_guidance_outlook_management(transcript_df: pd.DataFrame) -> str:
+    query = SECTION_QUERIES['guidance_outlook_summary_management']
+    return summarize(_management_only(transcript_df), query)
 
-    # Filter the text discussed witihn Q&A and extract the highlights, if any
-    qna_df = transcript_df[transcript_df['transcript_index'] >= first_question_tid]
-    qna_text = "\n".join((qna_df['speaker_type'] + ": " + qna_df['transcript']).values.tolist())
-    qna_context = f"This is the QnA text from earnings transcript between management and analysts.\n\n{qna_text}"
-    query = "Extract and summarize the guidance/outlook from QnA if discussed anywhere. Write in at max 3 points."
-    prompt = f"{management_context}\n\n{qna_context}\n\n{query}"
-    qna_summary = fetch_response(prompt=prompt).text
 
+def extract_guidance_outlook_qna(transcript_df: pd.DataFrame) -> str:
+    query = SECTION_QUERIES['guidance_outlook_summary_qna']
+    return summarize(_qna_only(transcript_df), query)
+
+
+def extract_guidance_outlook(transcript_df: pd.DataFrame) -> dict[str, str]:
     return {
-        'management': management_summary,
-        'qna': qna_summary
+        'management': extract_guidance_outlook_management(transcript_df),
+        'qna': extract_guidance_outlook_qna(transcript_df)
     }
 
 
 def extract_qna_key_points(transcript_df: pd.DataFrame) -> str:
-    # Filter the text discussed witihn Q&A and extract the highlights, if any
-    first_question_tid = transcript_df[transcript_df['speaker_type'] == 'Question']['transcript_index'].min()
-    qna_df = transcript_df[transcript_df['transcript_index'] >= first_question_tid]
-    qna_text = "\n".join((qna_df['speaker_type'] + ": " + qna_df['transcript']).values.tolist())
-    qna_context = f"This is the QnA text from earnings transcript between management and analysts.\n\n{qna_text}"
-    query = "Extract and summarize the key points from QnA. Write in at max 10 points."
-    prompt = f"{qna_context}\n\n{query}"
-    qna_summary = fetch_response(prompt=prompt).text
-    return qna_summary
+    query = SECTION_QUERIES['qna_key_points']
+    return summarize(_qna_only(transcript_df), query)
+
+
+# One model call per StockTranscriptSummary field
+SUMMARY_SECTIONS = {
+    'summary': extract_summary,
+    'revenue_profit_highlight_management': extract_revenue_profit_highlights_management,
+    'revenue_profit_highlight_qna': extract_revenue_profit_highlights_qna,
+    'management_commentary': extract_management_commentary,
+    'guidance_outlook_summary_management': extract_guidance_outlook_management,
+    'guidance_outlook_summary_qna': extract_guidance_outlook_qna,
+    'qna_key_points': extract_qna_key_points,
+}
+
+
+# Text each field is drawn from when all fields are filled in by one structured call
+SECTION_SCOPES = {
+    'summary': "the whole transcript",
+    'revenue_profit_highlight_management': "the management text",
+    'revenue_profit_highlight_qna': "the QnA text",
+    'management_commentary': "the management text",
+    'guidance_outlook_summary_management': "the management text",
+    'guidance_outlook_summary_qna': "the QnA text",
+    'qna_key_points': "the QnA text",
+}
+
+# Response schema of the structured call, one non-empty string per summary field
+SummarySections = create_model(
+    "SummarySections",
+    **{field: (str, Field(min_length=1, description=f"Using only {SECTION_SCOPES[field]}. {query}")) for field, query in SECTION_QUERIES.items()},
+)
+
+
+def build_structured_prompt(transcript_df: pd.DataFrame) -> str:
+    management_lines, qna_lines = split_transcript(transcript_df)
+    fields = "\n".join(f"- {field}: Using only {SECTION_SCOPES[field]}. {query}" for field, query in SECTION_QUERIES.items())
+    query = f"Reply with a JSON object that fills in every field below.\n\n{fields}"
+    return build_prompt([(MANAGEMENT_HEADER, management_lines), (QNA_HEADER, qna_lines)], query)
+
+
+def parse_structured_summary(text: Optional[str]) -> tuple[dict[str, str], dict[str, str]]:
+    # Valid fields, and the validation error of every other field so they can be retried one by one
+    try:
+        data = json.loads(text or "")
+    except json.JSONDecodeError as exc:
+        return {}, {field: f"Invalid JSON: {exc.msg}" for field in SECTION_QUERIES}
+    if not isinstance(data, dict):
+        return {}, {field: "Expected a JSON object" for field in SECTION_QUERIES}
+
+    try:
+        return SummarySections.model_validate(data).model_dump(), {}
+    except ValidationError as exc:
+        errors = {str(error["loc"][0]): error["msg"] for error in exc.errors() if error["loc"]}
+    return {field: data[field] for field in SECTION_QUERIES if field not in errors}, errors
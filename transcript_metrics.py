@@ -0,0 +1,156 @@
+import re
+import json
+import logging
+import pandas as pd
+from datetime import datetime
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal, Optional
+from pydantic import BaseModel, Field, ValidationError
+from sqlmodel import Session, select
+
+from models import StockTranscriptMetrics
+from transcript import split_transcript
+from llm_cache import estimate_tokens, fetch_text
+from prompts import MANAGEMENT_HEADER, QNA_HEADER, MAP_CONCURRENCY, PROMPT_CHUNK_TOKENS, PROMPT_TOKEN_BUDGET, build_prompt, chunk_lines
+
+logger = logging.getLogger(__name__)
+
+# Names the model is asked to reuse so the same metric lines up across quarters and tickers
+METRIC_NAMES = [
+    "revenue", "revenue_growth", "ebitda", "ebitda_margin", "ebit_margin", "gross_margin",
+    "profit_before_tax", "profit_after_tax", "profit_growth", "eps",
+    "net_interest_income", "net_interest_margin", "loan_growth", "deposit_growth", "casa_ratio",
+    "gross_npa", "net_npa", "credit_cost", "cost_to_income", "return_on_assets", "return_on_equity",
+    "same_store_growth", "store_count", "capex",
+]
+
+METRIC_KINDS = ["actual", "guidance"]
+
+UNIT_ALIASES = {
+    "percent": "%", "per cent": "%", "pct": "%",
+    "basis points": "bps", "bp": "bps",
+    "rs crore": "inr crore", "₹ crore": "inr crore", "crore": "inr crore", "crores": "inr crore", "cr": "inr crore",
+}
+
+# Units where the change between quarters is read in points, not as a percentage of the old value
+POINT_UNITS = {"%", "bps"}
+
+
+class TranscriptMetric(BaseModel):
+    metric: str = Field(min_length=1, description=f"snake_case name, one of {', '.join(METRIC_NAMES)} when it fits")
+    kind: Literal["actual", "guidance"] = Field(description="actual: reported for the quarter, guidance: a target or outlook")
+    value: float = Field(description="The number only, e.g. 12.5 for 12.5%")
+    unit: str = Field(description="e.g. %, bps, INR crore, x")
+    period: str = Field(description="Period the figure covers, e.g. Q2FY25, FY25, YoY")
+    quote: str = Field(description="The sentence the figure is taken from")
+
+
+# Response schema of the extraction call
+class TranscriptMetrics(BaseModel):
+    metrics: list[TranscriptMetric]
+
+
+METRICS_QUERY = (
+    "Extract every quantitative financial figure above as a JSON object with a list of metrics: reported results "
+    "(revenue, profit, margins and the like) as actual, and any targets, guidance or outlook figures as guidance. "
+    "For each actual metric give the figure for the quarter of the call first. Leave out figures without a number."
+)
+
+
+def normalize_metric(metric: dict) -> dict:
+    metric = dict(metric)
+    metric["metric"] = re.sub(r"[^a-z0-9]+", "_", metric["metric"].lower()).strip("_")
+    unit = metric["unit"].strip().lower()
+    metric["unit"] = UNIT_ALIASES.get(unit, unit)
+    return metric
+
+
+def parse_metrics(text: Optional[str]) -> list[dict]:
+    # Items that fail validation are dropped one by one; a reply that is not JSON at all raises
+    try:
+        data = json.loads(text or "")
+    except json.JSONDecodeError as exc:
+        raise ValueError(f"Invalid JSON: {exc.msg}")
+    items = data.get("metrics") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        raise ValueError("Expected a JSON object with a metrics list")
+
+    metrics = []
+    for item in items:
+        try:
+            metrics.append(normalize_metric(TranscriptMetric.model_validate(item).model_dump()))
+        except ValidationError as exc:
+            logger.warning("Dropped metric %s: %s", item, exc.errors()[0]["msg"])
+    return metrics
+
+
+def _dedupe(metrics: list[dict]) -> list[dict]:
+    # The first mention wins, management remarks come before the Q&A
+    seen, unique = set(), []
+    for metric in metrics:
+        key = (metric["metric"], metric["kind"], metric["unit"], metric["period"].lower())
+        if key not in seen:
+            seen.add(key)
+            unique.append(metric)
+    return unique
+
+
+def extract_metrics(transcript_df: pd.DataFrame, budget: int = PROMPT_TOKEN_BUDGET, chunk_tokens: int = PROMPT_CHUNK_TOKENS) -> list[dict]:
+    # One structured call per transcript, or one per chunk when the transcript is over budget
+    management_lines, qna_lines = split_transcript(transcript_df)
+    contexts = [(MANAGEMENT_HEADER, management_lines), (QNA_HEADER, qna_lines)]
+    prompt = build_prompt(contexts, METRICS_QUERY)
+    if estimate_tokens(prompt) <= budget:
+        prompts = [prompt]
+    else:
+        prompts = [
+            build_prompt([(header, chunk)], METRICS_QUERY)
+            for header, lines in contexts
+            for chunk in chunk_lines(lines, min(chunk_tokens, budget))
+        ]
+
+    with ThreadPoolExecutor(max_workers=max(1, MAP_CONCURRENCY), thread_name_prefix="metrics-map") as executor:
+        futures = [executor.submit(copy_context().run, fetch_text, prompt, response_schema=TranscriptMetrics) for prompt in prompts]
+        replies = [future.result() for future in futures]
+    return _dedupe([metric for reply in replies for metric in parse_metrics(reply)])
+
+
+def read_metrics(session: Session, pairs: list[tuple[str, str]]) -> dict[tuple[str, str], list[dict]]:
+    tickers = sorted({ticker for ticker, _ in pairs})
+    rows = session.exec(select(StockTranscriptMetrics).where(StockTranscriptMetrics.ticker.in_(tickers))).all()
+    wanted = set(pairs)
+    return {(row.ticker, row.quarter): json.loads(row.metrics) for row in rows if (row.ticker, row.quarter) in wanted}
+
+
+def save_metrics(session: Session, ticker: str, quarter: str, metrics: list[dict]):
+    session.merge(StockTranscriptMetrics(ticker=ticker, quarter=quarter, metrics=json.dumps(metrics), created_at=datetime.now()))
+    session.commit()
+
+
+def compare_metrics(
+    metrics_by_quarter: dict[tuple[str, str], list[dict]],
+    names: Optional[list[str]] = None,
+    kind: Optional[str] = None,
+) -> list[dict]:
+    # One row per ticker, metric, kind and unit with its value in each quarter and the change from the previous one
+    table = {}
+    for (ticker, quarter), metrics in sorted(metrics_by_quarter.items()):
+        for metric in metrics:
+            if (names and metric["metric"] not in names) or (kind and metric["kind"] != kind):
+                continue
+            key = (ticker, metric["metric"], metric["kind"], metric["unit"])
+            row = table.setdefault(key, {"ticker": ticker, "metric": metric["metric"], "kind": metric["kind"], "unit": metric["unit"], "quarters": {}})
+            # First figure per quarter, the one for the quarter of the call
+            row["quarters"].setdefault(quarter, {"value": metric["value"], "period": metric["period"], "quote": metric["quote"]})
+
+    for row in table.values():
+        previous = None
+        for quarter in sorted(row["quarters"]):
+            cell = row["quarters"][quarter]
+            if previous is not None:
+                cell["change"] = round(cell["value"] - previous, 6)
+                if row["unit"] not in POINT_UNITS and previous:
+                    cell["change_pct"] = round(100 * (cell["value"] - previous) / abs(previous), 2)
+            previous = cell["value"]
+    return sorted(table.values(), key=lambda row: (row["metric"], row["kind"], row["ticker"], row["unit"]))
@@ -0,0 +1,114 @@
+import os
+from typing import Optional
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from models import StockTranscript
+from embeddings import SegmentIndex, build_segment_index, content_hash, embed_query, get_segment_index
+from llm_cache import CHARS_PER_TOKEN, estimate_tokens, fetch_text
+from prompts import build_prompt
+
+# Speaker turns put into the prompt for one question
+ASK_TOP_K = int(os.getenv("ASK_TOP_K", "8"))
+
+# Moderator turns only introduce speakers, they are left out of the index
+INDEXED_SPEAKER_TYPES = ["Management", "Question"]
+
+ASK_HEADER = "These are excerpts from earnings call transcripts of {ticker}, tagged with the quarter of the call."
+ASK_QUERY = (
+    "Answer the question below using only the excerpts above. Mention the quarter for every figure quoted, "
+    "and say so if the excerpts do not answer it.\n\nQuestion: {question}"
+)
+
+
+def segment_text(record: dict) -> str:
+    return f"{record['speaker']}: {record['transcript']}"
+
+
+def _segments(records: list[dict]) -> tuple[list[int], list[str]]:
+    records = [r for r in records if r["speaker_type"] in INDEXED_SPEAKER_TYPES]
+    return [r["transcript_index"] for r in records], [segment_text(r) for r in records]
+
+
+def index_transcript(ticker: str, quarter: str, records: list[dict]) -> SegmentIndex:
+    # Called at ingestion so every speaker turn is embedded once
+    return build_segment_index(ticker, quarter, *_segments(records))
+
+
+def _indexed_rows(session: Session, ticker: str, quarter: str) -> list[StockTranscript]:
+    statement = select(StockTranscript).where(
+        StockTranscript.ticker == ticker,
+        StockTranscript.quarter == quarter,
+        StockTranscript.speaker_type.in_(INDEXED_SPEAKER_TYPES),
+    )
+    return session.exec(statement).all()
+
+
+def ensure_index(session: Session, ticker: str, quarter: str) -> Optional[SegmentIndex]:
+    # Transcripts stored before indexing existed, or re-ingested since, are embedded on first use.
+    # Compared by content hash, a re-ingested transcript can keep the same number of turns.
+    index = get_segment_index(ticker, quarter)
+    ids, texts = _segments([row.model_dump() for row in _indexed_rows(session, ticker, quarter)])
+    if not ids:
+        return None
+    if index is None or index.content_hash != content_hash(ids, texts):
+        index = build_segment_index(ticker, quarter, ids, texts)
+    return index
+
+
+def stored_quarters(session: Session, ticker: str) -> list[str]:
+    return sorted(session.exec(select(StockTranscript.quarter).where(StockTranscript.ticker == ticker).distinct()).all())
+
+
+def retrieve(session: Session, ticker: str, quarters: list[str], question: str, k: int = ASK_TOP_K) -> list[dict]:
+    # Top-k turns across all the quarters, best match first
+    query = embed_query(question)
+    hits = []
+    for quarter in quarters:
+        index = ensure_index(session, ticker, quarter)
+        if index is None:
+            continue
+        ids, scores = index.search(query, k)
+        hits.extend((float(score), quarter, int(idx)) for idx, score in zip(ids, scores))
+    hits = sorted(hits, key=lambda hit: -hit[0])[:k]
+
+    segments = []
+    for score, quarter, idx in hits:
+        row = session.get(StockTranscript, (ticker, quarter, idx))
+        if row is not None:
+            segments.append({**row.model_dump(), "score": round(score, 4)})
+    return segments
+
+
+def build_ask_prompt(ticker: str, segments: list[dict], question: str) -> str:
+    # Chronological order reads better than score order, and keeps each quarter together
+    ordered = sorted(segments, key=lambda s: (s["quarter"], s["transcript_index"]))
+    lines = [f"[{s['quarter']}] {s['speaker_type']} - {s['speaker']}: {s['transcript']}" for s in ordered]
+    return build_prompt([(ASK_HEADER.format(ticker=ticker), lines)], ASK_QUERY.format(question=question))
+
+
+def ask(session: Session, ticker: str, quarters: list[str], question: str, k: int = ASK_TOP_K) -> dict:
+    if not question.strip():
+        raise ValueError("Question is empty")
+    segments = retrieve(session, ticker, quarters, question, k)
+    if not segments:
+        raise LookupError(f"No transcript segments stored for {ticker} {', '.join(quarters)}".rstrip())
+
+    prompt = build_ask_prompt(ticker, segments, question)
+    answer = fetch_text(prompt=prompt)
+
+    # Size of the same question asked over the full transcripts, for comparison
+    transcript_chars = session.exec(
+        select(func.coalesce(func.sum(func.length(StockTranscript.transcript)), 0)).where(
+            StockTranscript.ticker == ticker, StockTranscript.quarter.in_(quarters)
+        )
+    ).one()
+    return {
+        "ticker": ticker,
+        "quarters": quarters,
+        "question": question,
+        "answer": answer,
+        "sources": [{key: s[key] for key in ("quarter", "transcript_index", "speaker", "speaker_type", "score")} for s in segments],
+        "prompt_tokens": estimate_tokens(prompt),
+        "transcript_tokens": -(-transcript_chars // CHARS_PER_TOKEN),
+    }
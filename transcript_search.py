@@ -0,0 +1,110 @@
+import re
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+
+SPEAKER_TYPES = ["Management", "Question", "Moderator"]
+
+SEARCH_MODES = ["all", "any", "phrase"]
+
+FTS_TABLE = "stocktranscript_fts"
+
+# External-content FTS5 table over stocktranscript: the text lives once, the index is kept in
+# sync by triggers so every insert path (including bulk_upsert) is covered.
+# stocktranscript has a composite primary key and no INTEGER PRIMARY KEY, so the index points at
+# implicit rowids that VACUUM may renumber; rebuild_transcript_search_index must run after a VACUUM.
+FTS_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        ticker UNINDEXED, quarter UNINDEXED, transcript_index UNINDEXED, speaker, speaker_type UNINDEXED, transcript,
+        content='stocktranscript', content_rowid='rowid', tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS stocktranscript_fts_insert AFTER INSERT ON stocktranscript BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, ticker, quarter, transcript_index, speaker, speaker_type, transcript)
+        VALUES (new.rowid, new.ticker, new.quarter, new.transcript_index, new.speaker, new.speaker_type, new.transcript);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stocktranscript_fts_delete AFTER DELETE ON stocktranscript BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, ticker, quarter, transcript_index, speaker, speaker_type, transcript)
+        VALUES ('delete', old.rowid, old.ticker, old.quarter, old.transcript_index, old.speaker, old.speaker_type, old.transcript);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS stocktranscript_fts_update AFTER UPDATE ON stocktranscript BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, ticker, quarter, transcript_index, speaker, speaker_type, transcript)
+        VALUES ('delete', old.rowid, old.ticker, old.quarter, old.transcript_index, old.speaker, old.speaker_type, old.transcript);
+        INSERT INTO {FTS_TABLE}(rowid, ticker, quarter, transcript_index, speaker, speaker_type, transcript)
+        VALUES (new.rowid, new.ticker, new.quarter, new.transcript_index, new.speaker, new.speaker_type, new.transcript);
+    END""",
+]
+
+
+def create_transcript_search_index(engine: Engine):
+    # Idempotent. Rebuilt on every startup: that indexes rows stored before the index existed and
+    # re-maps rowids after a VACUUM run against the database file while the app was down
+    with engine.begin() as conn:
+        for statement in FTS_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def rebuild_transcript_search_index(engine: Engine):
+    # Re-reads every stocktranscript row, required after VACUUM (see FTS_SCHEMA)
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def vacuum_database(engine: Engine):
+    # VACUUM may renumber stocktranscript rowids, the search index is rebuilt right after
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+    rebuild_transcript_search_index(engine)
+
+
+def to_fts_query(query: str, mode: str = "all") -> str:
+    # Plain words are quoted so user input never reaches the FTS5 query syntax
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        raise ValueError("Search query has no searchable terms")
+    if mode == "phrase":
+        return '"' + " ".join(terms) + '"'
+    if mode == "any":
+        return " OR ".join(f'"{term}"' for term in terms)
+    if mode == "all":
+        return " ".join(f'"{term}"' for term in terms)
+    raise ValueError(f"Unsupported search mode {mode!r}, expected one of {SEARCH_MODES}")
+
+
+def search_transcripts(
+    session: Session,
+    query: str,
+    mode: str = "all",
+    ticker: Optional[str] = None,
+    quarter: Optional[str] = None,
+    speaker_type: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> list[dict]:
+    # BM25-ranked matches, best first, with the matching terms highlighted in a snippet
+    if speaker_type is not None and speaker_type not in SPEAKER_TYPES:
+        raise ValueError(f"Unsupported speaker_type {speaker_type!r}, expected one of {SPEAKER_TYPES}")
+
+    filters = ""
+    params = {"query": to_fts_query(query, mode), "limit": limit, "offset": offset}
+    for column, value in (("ticker", ticker), ("quarter", quarter), ("speaker_type", speaker_type)):
+        if value is not None:
+            filters += f" AND {column} = :{column}"
+            params[column] = value
+
+    statement = text(f"""
+        SELECT ticker, quarter, transcript_index, speaker, speaker_type,
+               snippet({FTS_TABLE}, 5, '<b>', '</b>', '…', 24) AS snippet,
+               bm25({FTS_TABLE}) AS score
+        FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH :query{filters}
+        ORDER BY score
+        LIMIT :limit OFFSET :offset
+    """)
+    try:
+        rows = session.execute(statement, params).mappings().all()
+    except OperationalError as exc:
+        raise ValueError(f"Invalid search query {query!r}: {exc.orig}")
+    return [dict(row) for row in rows]
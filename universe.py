@@ -0,0 +1,102 @@
+import os
+import time
+import threading
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import Optional
+
+NIFTY_500_CSV = "MW-NIFTY-500-27-Aug-2025.csv"
+SYMBOL_COLUMN = "SYMBOL \n"
+NAME_COLUMNS = ["COMPANY NAME", "COMPANY", "NAME"]
+
+# Minimum seconds between two checks of the CSV mtime, keeps searches off the disk
+RELOAD_CHECK_INTERVAL = 5.0
+
+# Ranks for matches, lower is better
+RANK_EXACT, RANK_SYMBOL_PREFIX, RANK_NAME_PREFIX, RANK_SYMBOL_SUBSTRING, RANK_NAME_SUBSTRING = range(5)
+
+
+@dataclass(frozen=True)
+class TickerIndex:
+    symbols: tuple[str, ...]
+    names: tuple[str, ...]
+    symbol_keys: tuple[str, ...] = field(repr=False)
+    name_keys: tuple[str, ...] = field(repr=False)
+    mtime: float = 0.0
+
+    @classmethod
+    def from_symbols(cls, symbols: list[str], names: Optional[list[str]] = None, mtime: float = 0.0) -> "TickerIndex":
+        names = names or [""] * len(symbols)
+        return cls(
+            symbols=tuple(symbols),
+            names=tuple(names),
+            symbol_keys=tuple(s.lower() for s in symbols),
+            name_keys=tuple(n.lower() for n in names),
+            mtime=mtime,
+        )
+
+    def search(self, query: str, limit: Optional[int] = None) -> list[str]:
+        # Exact symbol first, then symbol prefix, name (word) prefix, symbol substring and name substring
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        ranked = []
+        for idx, (symbol_key, name_key) in enumerate(zip(self.symbol_keys, self.name_keys)):
+            if symbol_key == query:
+                rank = RANK_EXACT
+            elif symbol_key.startswith(query):
+                rank = RANK_SYMBOL_PREFIX
+            elif name_key.startswith(query) or f" {query}" in name_key:
+                rank = RANK_NAME_PREFIX
+            elif query in symbol_key:
+                rank = RANK_SYMBOL_SUBSTRING
+            elif query in name_key:
+                rank = RANK_NAME_SUBSTRING
+            else:
+                continue
+            ranked.append((rank, len(symbol_key), symbol_key, idx))
+
+        ranked.sort()
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [self.symbols[idx] for *_, idx in ranked]
+
+
+_index: Optional[TickerIndex] = None
+_last_checked = 0.0
+_lock = threading.Lock()
+
+
+def load_ticker_index(filepath: str = NIFTY_500_CSV) -> TickerIndex:
+    mtime = os.path.getmtime(filepath)
+    df = pd.read_csv(filepath)
+    # The first row is the index itself, not a constituent
+    df = df.iloc[1:]
+    symbols = df[SYMBOL_COLUMN].astype(str).str.strip().tolist()
+
+    names = None
+    name_column = next((col for col in df.columns if col.strip().upper() in NAME_COLUMNS), None)
+    if name_column is not None:
+        names = df[name_column].fillna("").astype(str).str.strip().tolist()
+
+    return TickerIndex.from_symbols(symbols, names, mtime=mtime)
+
+
+def get_ticker_index(filepath: str = NIFTY_500_CSV) -> TickerIndex:
+    # Returns the in-memory index, reloading it only when the CSV mtime has changed
+    global _index, _last_checked
+
+    now = time.monotonic()
+    if _index is not None and now - _last_checked < RELOAD_CHECK_INTERVAL:
+        return _index
+
+    with _lock:
+        if _index is None or os.path.getmtime(filepath) != _index.mtime:
+            _index = load_ticker_index(filepath)
+        _last_checked = now
+    return _index
+
+
+def get_nifty_500_stocks():
+    return list(get_ticker_index().symbols)